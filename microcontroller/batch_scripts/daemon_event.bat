@@ -0,0 +1,5 @@
+REM Same as mcu_event.bat, through a running RECORD daemon (python -m record_lib.daemon serve)
+echo %time% - SENDING COMMAND "%2" TO DEVICE: "%1" >> "GUI\event log\%1_eventlog.log" 2>&1
+python -m record_lib.client --device %1 %2 >> "Log Files\%1_output.log" 2>&1
+echo %time% - EVENT OF TYPE "%3" , "%2" TERMINATED BY APPLICATION >> "GUI\event log\%1_eventlog.log" 2>&1
+EXIT /B
\ No newline at end of file
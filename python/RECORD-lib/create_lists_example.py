@@ -70,6 +70,22 @@ tlist_fdrs , tlist_lvls = mytrials.create_trial_list(avail_fdrs=[1,2,3,4])
 print(tlist_fdrs)
 print(tlist_lvls)
 
+# Shuffled lists can put the same feeder or cost level on many trials in a
+# row. "create_constrained_trial_list" takes the same parameters plus limits
+# on the order: here no feeder twice in a row, no level more than twice in a
+# row, every block of 8 trials balanced, and feeder 1 never at level 3. Give
+# the subject's seed and the session number to get a different but
+# reproducible order every session.
+tlist_fdrs , tlist_lvls = mytrials.create_constrained_trial_list(avail_fdrs=[1,2,3,4],
+                                                                 max_run_fdrs=1,
+                                                                 max_run_lvls=2,
+                                                                 block=8,
+                                                                 avoid=[(1,3)],
+                                                                 seed=1234,
+                                                                 session=0)
+print(tlist_fdrs)
+print(tlist_lvls)
+
 # You can implement a wait that prints asterisks to the console to symbolise
 # seconds. It's useful if you want to do this for a command line interface,
 # but you can absolutely implement a different kind of delay. Simply give this
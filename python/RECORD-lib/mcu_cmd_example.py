@@ -6,7 +6,6 @@ Created on Tue Sep 20 14:39:16 2022
 """
 
 from record_lib import RECORD
-import time
 
 # Initialize the RECORD class, we'll use this to call methods that will
 # control the microcontroller in some way. We'll call this object "MCU".
@@ -21,20 +20,11 @@ session.open()      # Open the serial interface
 
 MCU.send_cmd('K', enforce_delay=False)
 
-response = ""
-eol = "\r\n\n"
-now = time.time()
-byte = b''
-while not eol in response:
-    if (time.time() - now >= 1):
-        print("[Error]: No bytes found in the serial buffer after the specified timeout.")
-        break
-    # Reading all bytes available bytes till EOL
-    byte = session.read()
-    response += byte.decode()
-
-print(response)
-session.flushOutput()
+# Read the microcontroller's response. Everything waiting in the serial
+# buffer is read at once and split into messages ending in "\r\n\n".
+response, ts = MCU.fetch_response(timeout=1)
+
+print(response, "received at", ts)
 
 print("Closing serial port.")
 session.close()
\ No newline at end of file
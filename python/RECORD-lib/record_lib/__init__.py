@@ -1,4 +1,39 @@
 # __init__.py
 
+import importlib
+
 from record_lib.record import RECORD
-from record_lib.trials import TRIALS
\ No newline at end of file
+from record_lib.trials import TRIALS
+from record_lib.async_record import AsyncRECORD
+from record_lib.group import RECORDGroup
+from record_lib.simulator import RECORDSimulator
+from record_lib.clocksync import ClockSync
+from record_lib.response import McuResponse
+from record_lib.config import ConfigSession
+from record_lib.reconnect import ResilientRECORD
+from record_lib.discovery import find_devices, find_device
+from record_lib.shadow import DeviceState
+from record_lib.watchdog import Watchdog, McuStalledError
+from record_lib.cmdqueue import CommandQueue, CommandDroppedError
+from record_lib.ttlcapture import TTLCapture
+from record_lib.zones import ZoneTracker
+from record_lib.zones import load_occupancy
+
+# Modules that are also programs (python -m record_lib.daemon, .client,
+# .journal, .replay, .logparse, .montecarlo, and .benchmark through
+# calibration) are imported on first use: a module already imported when
+# runpy runs it is run twice, with a warning on stderr that would end up in
+# the logs the batch scripts keep.
+_LAZY = {'RECORDDaemon'     : 'daemon',
+         'RECORDClient'     : 'client',
+         'Journal'          : 'journal',
+         'read_journal'     : 'journal',
+         'Replayer'         : 'replay',
+         'parse_log'        : 'logparse',
+         'SessionSimulator' : 'montecarlo',
+         'DelayCalibrator'  : 'calibration'}
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module('record_lib.' + _LAZY[name]), name)
+    raise AttributeError("module 'record_lib' has no attribute " + repr(name))
\ No newline at end of file
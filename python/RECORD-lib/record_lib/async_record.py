@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+An asyncio flavour of the RECORD class. Instead of writing a command and then
+sleeping for a fixed amount of time, every command returns an awaitable that
+resolves as soon as the microcontroller's "X: ...\\r\\n\\n" response arrives,
+so one event loop can drive the serial port alongside any other I/O.
+"""
+
+import asyncio
+import collections
+import datetime
+import serial
+
+from record_lib.frames import FrameReader
+from record_lib.record import RECORD, BUSY_AFTER_RESPONSE
+from record_lib.response import parse
+
+class AsyncRECORD:
+    def __init__(self, **kwargs):
+        self.verbose = kwargs.get('verbose', 0)
+        # Seconds to wait for a response on top of the time the
+        # microcontroller needs to execute a command.
+        self.timeout = kwargs.get('timeout', 1)
+        # TTL length configured on the microcontroller, in seconds.
+        self.ttl_length = kwargs.get('ttl_length', 0.1)
+        self.session = None
+        self._frames = None
+        self._pending = collections.defaultdict(collections.deque)
+        self._reader_task = None
+        self._cmd_lock = None
+        self.unsolicited = None
+
+    def createSS(self, **kwargs):
+        # Create a serial session tailored to the MSP430-FR2355 microcontroller
+        # running the RECORD firmware. Takes the same parameters as
+        # RECORD.createSS, but the session is opened and closed through the
+        # "open" and "close" coroutines of this class.
+
+        # Microcontroller information
+        self.ttlin_state = "Unknown"
+        self.ttlout_state = False
+
+        # Ports given as URLs, such as "recordsim://" for the simulator, use
+        # pyserial's URL handlers.
+        port = kwargs.get("com_port",'COM4')
+        if '://' in port:
+            self.session = serial.serial_for_url(port, do_not_open=True)
+        else:
+            self.session = serial.Serial()
+            self.session.port = port
+
+        self.session.baudrate = kwargs.get("baud_rate",9600)
+        self.session.bytesize = kwargs.get("data_bits",8)
+        self.session.parity   = kwargs.get("parity",'N')
+        self.session.stopbits = kwargs.get("stop_bits",1)
+        self.session.xonxoff  = kwargs.get("flow_ctrl",0)
+        # The read timeout only bounds how long the reader waits in the
+        # executor before checking whether it should keep running, it is not
+        # a response timeout.
+        self.session.timeout  = kwargs.get("poll_interval", 0.05)
+
+        return self.session
+
+    async def open(self):
+        # Opens the serial session and starts the background task that reads
+        # response frames from the microcontroller.
+        loop = asyncio.get_running_loop()
+        if not self.session.is_open:
+            await loop.run_in_executor(None, self.session.open)
+        self._frames = FrameReader(self.session)
+        self._cmd_lock = asyncio.Lock()
+        self.unsolicited = asyncio.Queue()
+        self._reader_task = asyncio.create_task(self._reader())
+        return self.session
+
+    async def close(self):
+        # Stops the reader task, cancels anything still waiting for a
+        # response and closes the serial session.
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        for waiters in self._pending.values():
+            for future in waiters:
+                future.cancel()
+        self._pending.clear()
+        if self.session.is_open:
+            self.session.close()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _read_available(self):
+        # Blocking read executed in the default executor. Reads everything
+        # waiting in the input buffer, or waits up to the poll interval for
+        # at least one byte.
+        return self.session.read(max(1, self.session.in_waiting))
+
+    async def _reader(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            data = await loop.run_in_executor(None, self._read_available)
+            if not data:
+                continue
+            # Split off every complete frame, any partial frame is kept by
+            # the frame reader for the next read.
+            self._frames.feed(data)
+            while self._frames.frames:
+                self._dispatch(*self._frames.frames.popleft())
+
+    def _dispatch(self, frame, ts):
+        # The firmware echoes the command character as the first byte of every
+        # response, so the oldest command waiting on that character gets the
+        # frame. Frames nobody is waiting for (button presses, external TTLs)
+        # are put in the "unsolicited" queue.
+        response = frame.decode(errors='replace').replace('\r', '').replace('\n', '')
+        if self.verbose: print("  ", response)
+        key = frame[:1]
+        waiters = self._pending.get(key)
+        if not waiters:
+            waiters = self._pending.get(None)
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result((response, ts))
+                return
+        self.unsolicited.put_nowait((response, ts))
+
+    async def command(self, cmd, echo=None, timeout=None):
+        # Sends a command and waits for its response frame.
+        # Arguments:
+        #    - cmd: The command to be sent, as a string or bytes.
+        #    - echo: The character the microcontroller will echo at the start
+        #      of its response. Defaults to the first character of the
+        #      command. Use False to accept the next frame of any kind.
+        #    - timeout: Seconds to wait for the response. Defaults to the
+        #      timeout given when this object was created.
+        # Returns the response message, the time the command was sent, and the
+        # time the response arrived. Raises asyncio.TimeoutError if no
+        # response arrives in time.
+        if isinstance(cmd, str):
+            cmd = bytes(cmd, 'utf-8')
+        if echo is None:
+            echo = cmd[:1]
+        elif echo is False:
+            echo = None
+        elif isinstance(echo, str):
+            echo = bytes(echo, 'utf-8')
+        if timeout is None:
+            timeout = self.timeout
+
+        loop = asyncio.get_running_loop()
+        # The firmware only services one command at a time and drops any
+        # bytes it receives while busy, so hold the lock until the response
+        # comes back (and until the ACK signal is over for commands that
+        # respond before sending it).
+        async with self._cmd_lock:
+            future = loop.create_future()
+            self._pending[echo].append(future)
+            try:
+                # A serial write can block (e.g. a full output buffer), so
+                # it runs in the executor like the reads.
+                await loop.run_in_executor(None, self.session.write, cmd)
+                ts = datetime.datetime.now()
+                resp, ack = await asyncio.wait_for(future, timeout)
+            finally:
+                if future in self._pending[echo]:
+                    self._pending[echo].remove(future)
+            if echo is not None and echo in BUSY_AFTER_RESPONSE:
+                await asyncio.sleep(self.ttl_length)
+
+        return resp, ts, ack
+
+    async def feeder_light(self,fdr,lvl,
+                           ttl_length=0.1,
+                           timeout=None):
+        # Turns on one feeder light, or several if lists are given for "fdr"
+        # and "lvl". See RECORD.feeder_light.
+        command = RECORD.feeder_command(fdr, lvl)
+
+        return await self.command(command, timeout=self._timeout(timeout, ttl_length))
+
+    async def valve_activate(self,vlv,
+                             ttl_length=0.1,
+                             rly_length=0.5,
+                             timeout=None):
+        # Opens the valve given by "vlv" (1 through 4) for the relay active
+        # time configured on the microcontroller.
+        command = RECORD.valve_command(vlv)
+
+        return await self.command(command, timeout=self._timeout(timeout, ttl_length + rly_length))
+
+    async def all_inactive(self, ttl_length=0.1, timeout=None):
+        # Resets the microcontroller to its idle state.
+        return await self.command(b'R', timeout=self._timeout(timeout, ttl_length))
+
+    async def all_active(self, ttl_length=0.1, timeout=None):
+        # Turns all cost lights on at level 3, for diagnostics.
+        return await self.command(b'A', timeout=self._timeout(timeout, ttl_length))
+
+    async def indicator_toggle(self, ttl_length=0.1, timeout=None):
+        # Toggles the "trial in progress" indicator light.
+        return await self.command(b'K', timeout=self._timeout(timeout, ttl_length))
+
+    async def timer_start(self, ttl_length=0.1, timeout=None):
+        # Starts the microcontroller's internal timer.
+        return await self.command(b'Q', timeout=self._timeout(timeout, ttl_length))
+
+    async def timer_fetch(self, ttl_length=0.1, timeout=None):
+        # Requests the current time from the microcontroller's timer.
+        return await self.command(b'W', timeout=self._timeout(timeout, ttl_length))
+
+    async def timer_stop(self, ttl_length=0.1, timeout=None):
+        # Stops and clears the microcontroller's internal timer.
+        return await self.command(b'E', timeout=self._timeout(timeout, ttl_length))
+
+    async def output_ttl(self, ttl_length=0.1, timeout=None):
+        # Sends out an independent TTL for synchronization with external
+        # hardware.
+        return await self.command(b'T', timeout=self._timeout(timeout, ttl_length))
+
+    async def toggle_ttlin(self, ttl_length=0.1, timeout=None):
+        # Toggles incoming TTL servicing. The new state is kept in
+        # "ttlin_state".
+        resp, ts, ack = await self.command(b'Y', timeout=self._timeout(timeout, ttl_length))
+        if "on" in resp:
+            self.ttlin_state = True
+        elif "off" in resp:
+            self.ttlin_state = False
+
+        return resp, ts, ack
+
+    async def request_ttl_state(self, timeout=None):
+        # Requests the TTL state. Returns True for HIGH, False for LOW or None
+        # if the response cannot be interpreted, along with the time the
+        # command was sent and the response arrived.
+        resp, ts, ack = await self.command(b't', timeout=self._timeout(timeout, 0))
+        resp = parse(resp)
+        if resp.kind != 'ttl_state':
+            return None, ts, ack
+        self.ttlout_state = resp.value
+
+        return self.ttlout_state, ts, ack
+
+    async def send_cmd(self, cmd, echo=None, timeout=None):
+        # Sends any command to the microcontroller and waits for its
+        # response. See "command".
+        return await self.command(cmd, echo=echo, timeout=timeout)
+
+    def _timeout(self, timeout, device_time):
+        # Per-command timeout: the time the microcontroller needs to execute
+        # the command plus the response timeout, unless one was given.
+        if timeout is None:
+            return device_time + self.timeout
+        return timeout
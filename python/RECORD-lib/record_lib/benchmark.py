@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Serial latency benchmark. Every RECORD command method is called many times and
+two latencies are measured for each call: from the command being written to
+the first byte of the response arriving, and to the response being complete
+(its "\\r\\n\\n" terminator arriving). Results are summarized as percentiles
+and histograms next to the fixed delays the methods currently enforce, and
+can be saved as a CSV file of raw samples and a JSON summary. A JSON summary
+from an earlier run can be used as a baseline to catch regressions.
+
+Runs against a real microcontroller or the simulator, for example:
+    python -m record_lib.benchmark --port COM4 --iterations 100 --json bench.json
+    python -m record_lib.benchmark --port recordsim:// --baseline bench.json
+"""
+
+import argparse
+import csv
+import json
+import time
+
+import numpy as np
+
+from record_lib.record import RECORD, BUSY_AFTER_RESPONSE
+
+# Delay (seconds) each method enforces after writing its command with the
+# default TTL length of 0.1 s, as hard-coded in RECORD.
+CURRENT_DELAYS = {'feeder_light'      : 0.1 + 0.13,
+                  'valve_activate'    : 0.1 + 0.5 + 0.12,
+                  'all_inactive'      : 0.1 + 0.12,
+                  'all_active'        : 0.1 + 0.02,
+                  'indicator_toggle'  : 0.1 + 0.1,
+                  'timer_start'       : 0.1 + 0.1,
+                  'timer_fetch'       : 0.1,
+                  'timer_stop'        : 0.1 + 0.12,
+                  'output_ttl'        : 0.1,
+                  'toggle_ttlin'      : 0.1 + 0.12,
+                  'request_ttl_state' : None}
+
+# Every benchmarked method: (characters its response can start with, function
+# sending the command).
+# The command methods are called with enforce_delay=False so only the write
+# happens in the call. toggle_ttlin and request_ttl_state read the response
+# themselves, so their command is sent with send_cmd instead.
+CASES = {'feeder_light'      : (b'#', lambda mcu, i: mcu.feeder_light(i % 4 + 1, i % 4, enforce_delay=False)),
+         'valve_activate'    : (b'FGHJ', lambda mcu, i: mcu.valve_activate(i % 4 + 1, enforce_delay=False)),
+         'all_inactive'      : (b'R', lambda mcu, i: mcu.all_inactive(enforce_delay=False)),
+         'all_active'        : (b'A', lambda mcu, i: mcu.all_active(enforce_delay=False)),
+         'indicator_toggle'  : (b'K', lambda mcu, i: mcu.indicator_toggle(enforce_delay=False)),
+         'timer_start'       : (b'Q', lambda mcu, i: mcu.timer_start(enforce_delay=False)),
+         'timer_fetch'       : (b'W', lambda mcu, i: mcu.timer_fetch(enforce_delay=False)),
+         'timer_stop'        : (b'E', lambda mcu, i: mcu.timer_stop(enforce_delay=False)),
+         'output_ttl'        : (b'T', lambda mcu, i: mcu.output_ttl(enforce_delay=False)),
+         'toggle_ttlin'      : (b'Y', lambda mcu, i: mcu.send_cmd('Y', enforce_delay=False)),
+         'request_ttl_state' : (b't', lambda mcu, i: mcu.send_cmd('t', enforce_delay=False))}
+
+PERCENTILES = (50, 90, 95, 99)
+
+class Benchmark:
+    def __init__(self, mcu, **kwargs):
+        # Arguments:
+        #    - mcu: A RECORD object with an open serial session. Its
+        #      background reader must not be running, the benchmark reads the
+        #      port itself.
+        #    - iterations: Calls per method. Default 50.
+        #    - timeout: Seconds to wait for every response. Default 2.
+        #    - ttl_length: The TTL length configured on the microcontroller,
+        #      in seconds. Default 0.1.
+        #    - settle: Extra seconds to wait between calls. Default 0.01.
+        self.mcu = mcu
+        self.verbose = kwargs.get('verbose', 0)
+        self.iterations = kwargs.get('iterations', 50)
+        self.timeout = kwargs.get('timeout', 2)
+        self.ttl_length = kwargs.get('ttl_length', 0.1)
+        self.settle = kwargs.get('settle', 0.01)
+        # Method name -> list of (first byte, complete) latencies in seconds,
+        # NaN when no response arrived.
+        self.samples = {}
+
+    def measure(self, name):
+        # Calls one method once and returns its (first byte, complete)
+        # latencies in seconds.
+        echo, send = CASES[name]
+        session = self.mcu.session
+        eol = b"\r\n\n"
+        i = len(self.samples.get(name, ()))
+
+        session.reset_input_buffer()
+        # Responses read here are not followed by the shadow model.
+        self.mcu.state.clear()
+        start = time.perf_counter()
+        send(self.mcu, i)
+        first = complete = float('nan')
+        buffer = bytearray()
+        while time.perf_counter() - start < self.timeout:
+            data = session.read(max(1, session.in_waiting))
+            now = time.perf_counter()
+            if not data:
+                continue
+            if not buffer:
+                first = now - start
+            buffer += data
+            end = buffer.find(eol)
+            if end >= 0:
+                # Only the command's own response counts, anything else (a
+                # button press, for example) is skipped.
+                if buffer[:1] in echo:
+                    complete = now - start
+                    break
+                del buffer[:end + len(eol)]
+                first = now - start if buffer else float('nan')
+        if self.verbose: print("  ", name, bytes(buffer).decode(errors='replace').strip())
+
+        # Let the microcontroller finish before the next call.
+        wait = self.settle
+        if echo in BUSY_AFTER_RESPONSE:
+            wait += self.ttl_length
+        time.sleep(wait)
+
+        return first, complete
+
+    def run(self, methods=None):
+        # Benchmarks every method in "methods" (all of them by default),
+        # leaving the microcontroller reset afterwards. Returns the summary.
+        if methods is None:
+            methods = list(CASES)
+        for name in methods:
+            if self.verbose: print("Benchmarking", name)
+            samples = self.samples.setdefault(name, [])
+            for i in range(self.iterations):
+                samples.append(self.measure(name))
+            if name == 'timer_start':
+                # Keep the timer stopped between methods.
+                self.measure('timer_stop')
+        self.mcu.all_inactive()
+
+        return self.summary()
+
+    def summary(self, bins=20):
+        # Returns a dictionary with, for every method, the number of samples
+        # and timeouts, latency percentiles (milliseconds), a histogram of
+        # completion latencies, the delay the method currently enforces and
+        # how long the microcontroller stays busy after responding ('A', 'Q'
+        # and 'Y' respond before sending their ACK signal).
+        summary = {}
+        for name, samples in self.samples.items():
+            data = np.array(samples, dtype=float).reshape(-1, 2) * 1000
+            valid = ~np.isnan(data[:, 1])
+            entry = {'samples'  : len(data),
+                     'timeouts' : int((~valid).sum()),
+                     'current_delay_ms' : None if CURRENT_DELAYS.get(name) is None else CURRENT_DELAYS[name] * 1000,
+                     'busy_after_ms' : self.ttl_length * 1000 if CASES[name][0] in BUSY_AFTER_RESPONSE else 0}
+            for i, key in enumerate(('first_byte', 'complete')):
+                values = data[valid, i]
+                if len(values) == 0:
+                    entry[key] = None
+                    continue
+                entry[key] = {'min'  : float(values.min()),
+                              'mean' : float(values.mean()),
+                              'max'  : float(values.max())}
+                for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                    entry[key]['p'+str(p)] = float(v)
+            if valid.any():
+                counts, edges = np.histogram(data[valid, 1], bins=bins)
+                entry['histogram'] = {'edges_ms': edges.tolist(), 'counts': counts.tolist()}
+            summary[name] = entry
+
+        return summary
+
+    def save_csv(self, path):
+        # Writes every sample as a row: method, iteration, latencies in ms.
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['method', 'iteration', 'first_byte_ms', 'complete_ms'])
+            for name, samples in self.samples.items():
+                for i, (first, complete) in enumerate(samples):
+                    writer.writerow([name, i, first * 1000, complete * 1000])
+
+    def save_json(self, path):
+        # Writes the summary.
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def compare(self, baseline, tolerance=0.2, percentile='p95'):
+        # Compares completion latencies against a baseline summary (or the
+        # path to a JSON summary). Returns a dictionary with the methods whose
+        # "percentile" grew by more than "tolerance" (a fraction) or that
+        # timed out more often, mapped to (baseline, current) values.
+        if isinstance(baseline, str):
+            with open(baseline) as f:
+                baseline = json.load(f)
+        current = self.summary()
+        regressions = {}
+        for name, entry in current.items():
+            old = baseline.get(name)
+            if old is None:
+                continue
+            if entry['timeouts'] > old['timeouts']:
+                regressions[name] = ('timeouts', old['timeouts'], entry['timeouts'])
+            elif entry['complete'] and old['complete']:
+                before = old['complete'][percentile]
+                after = entry['complete'][percentile]
+                if after > before * (1 + tolerance):
+                    regressions[name] = (percentile, before, after)
+
+        return regressions
+
+    def report(self, width=40):
+        # Returns the summary as printable text, with a histogram of the
+        # completion latencies of every method.
+        lines = []
+        for name, entry in self.summary().items():
+            lines.append(name + " (" + str(entry['samples']) + " samples, " + str(entry['timeouts']) + " timeouts)")
+            for key in ('first_byte', 'complete'):
+                stats = entry[key]
+                if stats is None:
+                    lines.append("   " + key + ": no responses")
+                    continue
+                lines.append("   " + key.ljust(10) + " " + "  ".join(p + " " + format(stats[p], '.1f') for p in ['min'] + ['p'+str(p) for p in PERCENTILES] + ['max']) + " ms")
+            if entry['current_delay_ms'] is not None:
+                lines.append("   current delay " + format(entry['current_delay_ms'], '.1f') + " ms")
+            if entry['busy_after_ms']:
+                lines.append("   busy for " + format(entry['busy_after_ms'], '.1f') + " ms after responding")
+            histogram = entry.get('histogram')
+            if histogram:
+                top = max(histogram['counts'])
+                for count, edge in zip(histogram['counts'], histogram['edges_ms']):
+                    lines.append("   " + format(edge, '8.1f') + " ms |" + "#" * int(round(width * count / top)))
+
+        return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure RECORD command latencies.")
+    parser.add_argument('--port', default="recordsim://", help="Serial port or URL, e.g. COM4 or recordsim://")
+    parser.add_argument('--baud-rate', type=int, default=9600)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--ttl-length', type=float, default=0.1, help="TTL length configured on the microcontroller, in seconds")
+    parser.add_argument('--methods', nargs='*', choices=list(CASES), help="Methods to benchmark, all by default")
+    parser.add_argument('--csv', help="Save every sample to this CSV file")
+    parser.add_argument('--json', help="Save the summary to this JSON file")
+    parser.add_argument('--baseline', help="JSON summary of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    mcu = RECORD()
+    session = mcu.createSS(com_port=args.port, baud_rate=args.baud_rate, timeout=0.05)
+    session.open()
+    bench = Benchmark(mcu, iterations=args.iterations, ttl_length=args.ttl_length)
+    try:
+        bench.run(args.methods)
+    finally:
+        session.close()
+
+    print(bench.report())
+    if args.csv:
+        bench.save_csv(args.csv)
+    if args.json:
+        bench.save_json(args.json)
+    if args.baseline:
+        regressions = bench.compare(args.baseline, args.tolerance)
+        for name, (key, before, after) in regressions.items():
+            print("[Regression]:", name, key, before, "->", after)
+        if regressions:
+            raise SystemExit(1)
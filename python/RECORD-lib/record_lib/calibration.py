@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Learned command delays. When called with enforce_delay=True, RECORD's command
+methods sleep long enough for the microcontroller to execute the command
+before returning. By default those sleeps are fixed constants. A
+DelayCalibrator measures how long every command really takes on the connected
+microcontroller, keeps a rolling window of measurements per command and
+hands RECORD a high percentile of that window plus a safety margin instead.
+Measurements are saved per device ID, so the next session starts from the
+last known values.
+
+    calibrator = DelayCalibrator.for_device(mcu)   # Loads saved delays, if any
+    calibrator.calibrate(mcu)                      # Measures every command
+    calibrator.save()
+    mcu.delays = calibrator                        # enforce_delay now uses them
+"""
+
+import collections
+import json
+import os
+
+import numpy as np
+
+from record_lib.benchmark import Benchmark
+from record_lib.record import BUSY_AFTER_RESPONSE
+
+# RECORD methods with a learned delay, and the character their response
+# starts with.
+COMMANDS = {'feeder_light'     : b'#',
+            'valve_activate'   : b'F',
+            'all_inactive'     : b'R',
+            'all_active'       : b'A',
+            'indicator_toggle' : b'K',
+            'timer_start'      : b'Q',
+            'timer_fetch'      : b'W',
+            'timer_stop'       : b'E',
+            'output_ttl'       : b'T'}
+
+class DelayCalibrator:
+    def __init__(self, **kwargs):
+        # Arguments:
+        #    - device_id: The ID of the microcontroller the delays belong to.
+        #    - path: The JSON file the delays are saved to. Defaults to
+        #      "delays_<device_id>.json" in ~/.record_lib.
+        #    - window: Measurements kept per command. Default 50.
+        #    - percentile: Percentile of the measurements used as the delay.
+        #      Default 99.
+        #    - margin: Seconds added to that percentile. Default 0.01.
+        #    - ttl_length: The TTL length configured on the microcontroller, in
+        #      seconds. Default 0.1.
+        self.verbose = kwargs.get('verbose', 0)
+        self.device_id = kwargs.get('device_id')
+        self.path = kwargs.get('path')
+        self.window = kwargs.get('window', 50)
+        self.percentile = kwargs.get('percentile', 99)
+        self.margin = kwargs.get('margin', 0.01)
+        self.ttl_length = kwargs.get('ttl_length', 0.1)
+        self.measurements = {}  # Command method -> deque of seconds
+
+    @classmethod
+    def for_device(cls, mcu, **kwargs):
+        # Creates a calibrator for the microcontroller behind "mcu", using the
+        # device ID and TTL length it reports for '?', and loads the delays
+        # saved for that device, if any.
+        info = mcu.request_info()
+        kwargs.setdefault('device_id', info.get('device_id'))
+        if 'ttl_length' in info:
+            kwargs.setdefault('ttl_length', info['ttl_length'] / 1000)
+        calibrator = cls(**kwargs)
+        if os.path.exists(calibrator._path()):
+            calibrator.load()
+
+        return calibrator
+
+    def observe(self, name, seconds):
+        # Adds a measurement (in seconds) of how long command method "name"
+        # kept the microcontroller busy.
+        if name not in self.measurements:
+            self.measurements[name] = collections.deque(maxlen=self.window)
+        self.measurements[name].append(seconds)
+
+    def delay(self, name, default=None):
+        # Returns the learned delay for command method "name", or "default"
+        # if it has not been measured.
+        measurements = self.measurements.get(name)
+        if not measurements:
+            return default
+
+        return float(np.percentile(measurements, self.percentile)) + self.margin
+
+    def calibrate(self, mcu, iterations=5, methods=None):
+        # Measures every command method (or the ones in "methods")
+        # "iterations" times on the microcontroller behind "mcu" and leaves
+        # it reset. The delay measured is the time from writing the command
+        # until the microcontroller is ready for the next one: its response
+        # is complete and, for 'A', 'Q', 'Y', 'g' and 'r', its ACK signal is
+        # over. Returns the learned delays.
+        if methods is None:
+            methods = list(COMMANDS)
+        # The benchmark reads the port itself.
+        reader = mcu._reader is not None
+        if reader:
+            mcu.stop_reader()
+        try:
+            bench = Benchmark(mcu, iterations=iterations, ttl_length=self.ttl_length, verbose=self.verbose)
+            for name in methods:
+                busy = self.ttl_length if COMMANDS[name] in BUSY_AFTER_RESPONSE else 0
+                for i in range(iterations):
+                    first, complete = bench.measure(name)
+                    if complete == complete:   # Not NaN (no response)
+                        self.observe(name, complete + busy)
+                if name == 'timer_start':
+                    bench.measure('timer_stop')
+            bench.measure('all_inactive')
+        finally:
+            if reader:
+                mcu.start_reader()
+
+        delays = self.delays()
+        if self.verbose: print("   Learned delays:", delays)
+
+        return delays
+
+    def delays(self):
+        # Returns the learned delay of every measured command method.
+        return {name: self.delay(name) for name in self.measurements}
+
+    def _path(self):
+        if self.path is not None:
+            return self.path
+        return os.path.join(os.path.expanduser("~"), ".record_lib",
+                            "delays_" + str(self.device_id) + ".json")
+
+    def save(self, path=None):
+        # Saves the measurements and learned delays as JSON.
+        path = path or self._path()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'device_id'    : self.device_id,
+                       'ttl_length'   : self.ttl_length,
+                       'delays'       : self.delays(),
+                       'measurements' : {name: list(m) for name, m in self.measurements.items()}},
+                      f, indent=2)
+
+        return path
+
+    def load(self, path=None):
+        # Loads measurements saved by "save", so they keep being used (and
+        # updated) in this session.
+        path = path or self._path()
+        with open(path) as f:
+            saved = json.load(f)
+        if self.device_id is None:
+            self.device_id = saved.get('device_id')
+        for name, measurements in saved.get('measurements', {}).items():
+            for seconds in measurements:
+                self.observe(name, seconds)
+
+        return self.delays()
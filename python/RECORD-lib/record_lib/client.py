@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Client of RECORDDaemon (see daemon.py), using nothing but the standard
+library. From the command line, every command is sent to the device and its
+response line printed; the exit status is 1 if any of them failed. Nothing
+else is printed, so the output can go to the logs the batch scripts keep
+(see microcontroller/batch_scripts/daemon_event.bat).
+
+    python -m record_lib.client --device FR2355_Dev "#F1L2"
+    python -m record_lib.client .devices
+"""
+
+import argparse
+import json
+import socket
+
+DEFAULT_ADDRESS = ('127.0.0.1', 5555)
+
+class RECORDClient:
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=5):
+        # Connection to a RECORDDaemon at "address", (host, port) or the path
+        # of a Unix socket. Kept open between requests.
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        self._file = self.sock.makefile('rb')
+
+    def request(self, line):
+        # Sends one request line and returns the response line.
+        self.sock.sendall(line.encode() + b'\n')
+        reply = self._file.readline()
+        if not reply:
+            raise ConnectionError("The daemon closed the connection.")
+
+        return reply.decode(errors='replace').rstrip('\n')
+
+    def send(self, command, device='-'):
+        # Sends a firmware command. Returns the response, the time it was
+        # sent and the time its response started arriving (nanoseconds since
+        # the epoch), or None and the error if it failed.
+        reply = self.request(device + " " + command)
+        if not reply.startswith("OK "):
+            print("[Error]:", reply[4:])
+            return None, reply[4:], None
+        sent, ack, response = reply[3:].split(' ', 2)
+
+        return response, int(sent), int(ack)
+
+    def query(self, what, device='-'):
+        # Sends a dot request ('info', 'state', 'events', 'devices', 'ping')
+        # and returns its result, or None if it failed.
+        reply = self.request(device + " ." + what)
+        if not reply.startswith("OK "):
+            print("[Error]:", reply[4:])
+            return None
+
+        return json.loads(reply[3:])
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def send_commands(address, device, commands):
+    # Sends every command (or dot request) to "device" and prints every
+    # response line. Returns True if all of them succeeded.
+    failed = False
+    with RECORDClient(address) as client:
+        for command in commands:
+            reply = client.request(device + " " + command)
+            print(reply)
+            failed |= not reply.startswith("OK ")
+
+    return not failed
+
+def add_address_arguments(parser):
+    parser.add_argument('--port', type=int, default=DEFAULT_ADDRESS[1], help="TCP port on localhost")
+    parser.add_argument('--unix', help="Path of a Unix socket to use instead of TCP")
+
+def address_of(args):
+    return args.unix if args.unix else ('127.0.0.1', args.port)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send commands to microcontrollers served by a RECORD daemon.")
+    add_address_arguments(parser)
+    parser.add_argument('--device', default='-', help="Device name, the first device by default")
+    parser.add_argument('commands', nargs='+', help="Firmware commands, or .info, .state, .events, .devices")
+    args = parser.parse_args()
+
+    if not send_commands(address_of(args), args.device, args.commands):
+        raise SystemExit(1)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Relates the microcontroller's timer to host time. The firmware reports its
+timer as "sc.ms", where "ms" counts 0 through 998 before rolling over into
+"sc" and "sc" is a 16-bit counter, so the timer wraps every 65536 * 999 ms
+(about 18.2 hours). ClockSync samples the timer with 'W', unwraps rollovers
+into a continuous tick count and fits host time against it with a Theil-Sen
+(median of pairwise slopes) estimator, which is unaffected by the occasional
+sample delayed by USB latency. The fit gives the offset between both clocks
+and the microcontroller's drift, so timestamps reported by the
+microcontroller can be turned into host datetimes with mcu_to_host.
+"""
+
+import collections
+import datetime
+import threading
+
+import numpy as np
+
+# Ticks (milliseconds) in one "second" of the firmware timer, and the number
+# of ticks after which the 16-bit seconds counter wraps.
+TICKS_PER_SECOND = 999
+WRAP_TICKS = 65536 * TICKS_PER_SECOND
+
+class ClockSync:
+    def __init__(self, mcu, **kwargs):
+        # Arguments:
+        #    - mcu: A RECORD object with an open serial session, whose timer
+        #      has been started with timer_start.
+        #    - window: The number of most recent samples used for the fit.
+        #      Default 100.
+        #    - interval: Seconds between samples taken by the background
+        #      thread. Default 30.
+        #    - timeout: Seconds to wait for every 'W' response. Default 1.
+        #    - ttl_length: The TTL length configured on the microcontroller,
+        #      in seconds. Default 0.1.
+        self.mcu = mcu
+        self.verbose = kwargs.get('verbose', 0)
+        self.interval = kwargs.get('interval', 30)
+        self.timeout = kwargs.get('timeout', 1)
+        self.ttl_length = kwargs.get('ttl_length', 0.1)
+        # (host time in seconds since the epoch, unwrapped ticks, round trip)
+        self.samples = collections.deque(maxlen=kwargs.get('window', 100))
+        self._fit = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def ticks(sc, ms):
+        # The firmware timer as a single tick count.
+        return int(sc) * TICKS_PER_SECOND + int(ms)
+
+    def unwrap(self, sc, ms, reference=None):
+        # Turns a timer reading into a continuous tick count by adding
+        # however many 16-bit rollovers bring it closest to "reference"
+        # (the latest sample by default).
+        raw = self.ticks(sc, ms)
+        if reference is None:
+            if not self.samples:
+                return raw
+            reference = self.samples[-1][1]
+        wraps = round((reference - raw) / WRAP_TICKS)
+
+        return raw + wraps * WRAP_TICKS
+
+    def sample(self):
+        # Requests the timer once and adds the reading to the samples.
+        # The reading is paired with the midpoint between sending 'W' and
+        # the response starting to arrive, which is when the firmware took
+        # it give or take half the round trip.
+        # Returns a (host time, ticks, round trip) tuple, or None if there was
+        # no valid response.
+        resp, sent, ack = self.mcu.pipeline(['W'], self.timeout, self.ttl_length, parsed=True)[0]
+        if resp is None or resp.kind != 'timer':
+            print("[Error]: Could not read the microcontroller's timer.")
+            return None
+        sent = sent.timestamp()
+        rtt = ack.timestamp() - sent
+        with self._lock:
+            sample = (sent + rtt / 2, self.unwrap(resp.sc, resp.ms), rtt)
+            self.samples.append(sample)
+            self._fit = None
+
+        if self.verbose: print("   Clock sample:", sample)
+
+        return sample
+
+    def calibrate(self, n=10):
+        # Takes "n" samples back to back, enough for a first estimate.
+        for i in range(n):
+            self.sample()
+
+        return self.fit()
+
+    def start(self, interval=None):
+        # Keeps sampling every "interval" seconds from a background thread,
+        # so drift is tracked over long sessions. The thread shares the serial
+        # session through RECORD.pipeline, which holds the command lock: 'W'
+        # is only written once a command method's delay is over, and
+        # fetch_response waits while the 'W' response is matched. Commands
+        # sent with enforce_delay=False are not waited for, so keep the delay
+        # on while sampling in the background.
+        if interval is not None:
+            self.interval = interval
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="RECORD-clocksync")
+        self._thread.start()
+
+        return self._thread
+
+    def stop(self):
+        # Stops the background thread.
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                # The session went away, keep what was fitted so far.
+                print("[Error]: Clock synchronization stopped,", e)
+                break
+            self._stop.wait(self.interval)
+
+    def reset(self):
+        # Drops every sample. Use after the timer has been stopped ('E'),
+        # since that clears it.
+        with self._lock:
+            self.samples.clear()
+            self._fit = None
+
+    def fit(self):
+        # Returns (t0, intercept, slope) such that a tick count maps to host
+        # time t0 + intercept + slope * ticks (seconds since the epoch). With
+        # a single sample the nominal rate of one tick per millisecond is
+        # used. Returns None if there are no samples.
+        with self._lock:
+            if self._fit is not None:
+                return self._fit
+            if not self.samples:
+                return None
+            data = np.array(self.samples)
+            t0 = data[0, 0]
+            host = data[:, 0] - t0
+            ticks = data[:, 1]
+            i, j = np.triu_indices(len(ticks), 1)
+            dticks = ticks[j] - ticks[i]
+            valid = dticks != 0
+            if valid.any():
+                slope = np.median((host[j] - host[i])[valid] / dticks[valid])
+            else:
+                slope = 1e-3
+            intercept = np.median(host - slope * ticks)
+            self._fit = (float(t0), float(intercept), float(slope))
+
+            return self._fit
+
+    @property
+    def drift_ppm(self):
+        # How much faster (positive) or slower the microcontroller's ticks are
+        # than host milliseconds, in parts per million.
+        fit = self.fit()
+        if fit is None:
+            return None
+        return (1e-3 / fit[2] - 1) * 1e6
+
+    def mcu_to_host(self, sc, ms):
+        # Converts a timer reading reported by the microcontroller (e.g. the
+        # "12.345" in "K: trial indication on at 12.345") into a host
+        # datetime. Readings are unwrapped against the latest sample, so
+        # they must be within about 9 hours of it.
+        fit = self.fit()
+        if fit is None:
+            raise ValueError("No clock samples available, call sample or calibrate first.")
+        t0, intercept, slope = fit
+
+        return datetime.datetime.fromtimestamp(t0 + intercept + slope * self.unwrap(sc, ms))
+
+    def host_to_mcu(self, t):
+        # Converts a host datetime into the (sc, ms) reading the
+        # microcontroller's timer had at that moment.
+        fit = self.fit()
+        if fit is None:
+            raise ValueError("No clock samples available, call sample or calibrate first.")
+        t0, intercept, slope = fit
+        ticks = int(round((t.timestamp() - t0 - intercept) / slope)) % WRAP_TICKS
+
+        return divmod(ticks, TICKS_PER_SECOND)
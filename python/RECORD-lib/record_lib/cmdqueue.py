@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Per-device command queue. Every command RECORD sends is put in the queue of
+its device and written to the serial port, whole and in a single write, by a
+writer thread. Commands sent from different threads (a trial script, a
+background Watchdog or ClockSync, a KeyboardInterrupt handler) therefore
+never interleave their bytes, and an exception raised in the sending thread,
+such as Ctrl+C, interrupts the wait for a command but never the command
+itself (a half-written "#F1L2F3L1 " would take the next command as part of
+the LED string).
+
+Commands are written in order of priority, first come first served within a
+priority. SAFETY commands ('R', and 'T' turning the output TTL off, see
+RECORD.safe_state) jump ahead of everything pending, so they reach the wire
+as soon as the command being written is done. The exception is a
+ConfigSession, which holds the queue while the configuration menu is open:
+any command written between its keys would be read as a menu key, so
+commands from other threads, safety ones included, wait until the menu is
+closed (at most the session's timeout per prompt).
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+SAFETY = 0
+COMMAND = 1
+
+# Commands always sent with SAFETY priority, whichever method sends them.
+SAFETY_COMMANDS = (b'R',)
+
+class CommandDroppedError(Exception):
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+    # Prints the error value
+        return(repr(self.value))
+
+class _Entry:
+    __slots__ = ('data', 'priority', 'owner', 'queued', 'sent', 'error', 'done')
+
+    def __init__(self, data, priority, owner):
+        self.data = data
+        self.priority = priority
+        self.owner = owner          # Thread that sent the command
+        self.queued = time.perf_counter()
+        self.sent = None            # Time the write finished
+        self.error = None           # Exception raised by the write
+        self.done = threading.Event()
+
+class CommandQueue:
+    def __init__(self, mcu):
+        # Arguments:
+        #    - mcu: The RECORD object whose session the commands are written
+        #      to. The session is looked up for every command, so the queue
+        #      keeps working after createSS opens a new one.
+        self.mcu = mcu
+        self.max_wait = {}      # Priority -> longest seconds a command waited
+        self._heap = []         # (priority, count, entry)
+        self._count = itertools.count()
+        self._cond = threading.Condition()
+        self._holder = None     # Thread holding the queue, see "hold"
+        self._depth = 0
+        self._thread = None
+
+    def put(self, data, priority=COMMAND):
+        # Queues "data" (bytes) and returns without waiting for it to be
+        # written. Commands in SAFETY_COMMANDS always get SAFETY priority.
+        if data in SAFETY_COMMANDS:
+            priority = SAFETY
+        entry = _Entry(data, priority, threading.get_ident())
+        with self._cond:
+            heapq.heappush(self._heap, (priority, next(self._count), entry))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="RECORD-commands")
+                self._thread.start()
+            self._cond.notify_all()
+
+        return entry
+
+    def send(self, data, priority=COMMAND):
+        # Queues "data" and waits until it is written. Returns the time the
+        # write finished (on the clock of RECORD's message timestamps), or
+        # raises the exception the write raised, or CommandDroppedError if
+        # the command was dropped by "drop" first.
+        entry = self.put(data, priority)
+        # Waited on in short steps so Ctrl+C is not held up (on Windows a
+        # wait without timeout cannot be interrupted).
+        while not entry.done.wait(0.05):
+            pass
+        if entry.error is not None:
+            raise entry.error
+
+        return entry.sent
+
+    def drop(self, priority=COMMAND):
+        # Drops every command waiting with "priority" or lower (a higher
+        # number). Their senders get a CommandDroppedError. Returns the
+        # number of commands dropped.
+        with self._cond:
+            keep = [item for item in self._heap if item[0] < priority]
+            dropped = [item[2] for item in self._heap if item[0] >= priority]
+            self._heap = keep
+            heapq.heapify(self._heap)
+        for entry in dropped:
+            entry.error = CommandDroppedError(entry.data)
+            entry.done.set()
+
+        return len(dropped)
+
+    def hold(self):
+        # Only writes commands sent by this thread until "release" is
+        # called. Waits for any other thread holding the queue. Can be
+        # nested.
+        me = threading.get_ident()
+        with self._cond:
+            while self._holder not in (None, me):
+                self._cond.wait()
+            self._holder = me
+            self._depth += 1
+
+    def release(self):
+        with self._cond:
+            self._depth -= 1
+            if self._depth == 0:
+                self._holder = None
+                self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _next(self):
+        # The next command to write, taken out of the heap, or None.
+        if self._holder is None:
+            return heapq.heappop(self._heap)[2] if self._heap else None
+        mine = [item for item in self._heap if item[2].owner == self._holder]
+        if not mine:
+            return None
+        item = min(mine)
+        self._heap.remove(item)
+        heapq.heapify(self._heap)
+
+        return item[2]
+
+    def _run(self):
+        # Ends after 5 idle seconds, "put" starts it again.
+        while True:
+            with self._cond:
+                entry = self._next()
+                while entry is None:
+                    if not self._cond.wait(5) and not self._heap:
+                        self._thread = None
+                        return
+                    entry = self._next()
+            try:
+                self.mcu.session.write(entry.data)
+                entry.sent = self.mcu._now()
+            except Exception as e:
+                entry.error = e
+            wait = time.perf_counter() - entry.queued
+            if wait > self.max_wait.get(entry.priority, 0):
+                self.max_wait[entry.priority] = wait
+            entry.done.set()
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Scripted use of the firmware's configuration menu ('$'). The firmware prints
+a prompt ending in ">" or "> " every time it waits for a key and only reads
+keys sent after the prompt, so every key is sent as soon as its prompt has
+arrived instead of after a fixed pause, and the "$: ..." message closing the
+menu is checked to confirm the change was applied.
+
+Every menu entry changes a single setting, so a profile with all CCR values,
+relay active time, TTL length and TTL mode is applied as one menu entry per
+setting. apply_profile compares the profile with what the microcontroller
+reports for '?' first and only enters the menu for settings that differ.
+
+Profiles are JSON files in the format returned by RECORD.request_info:
+    {"ccr": {"1": [7700, 7700, 7700, 7700],
+             "2": [3500, 3500, 3500, 3500],
+             "3": [250, 250, 250, 250]},
+     "relay_ontime": 500,
+     "ttl_length": 100,
+     "ttl_mode": "TOGGLE"}
+Any of the keys can be left out.
+"""
+
+import json
+import time
+
+TTL_MODES = {'TOGGLE': 1, 'PULSE': 2, 'OFF': 3}
+
+class ConfigSession:
+    def __init__(self, mcu, **kwargs):
+        # Arguments:
+        #    - mcu: A RECORD object with an open serial session.
+        #    - timeout: Seconds to wait for every prompt. Default 3.
+        #    - menu: Whether the firmware shows the A/B/C/D menu when entering
+        #      configuration mode (firmware v2.1.1 and later). Default True.
+        self.mcu = mcu
+        self.verbose = kwargs.get('verbose', 0)
+        self.timeout = kwargs.get('timeout', 3)
+        self.menu = kwargs.get('menu', True)
+        self.transcript = ''    # Everything the microcontroller sent in the last menu entry
+        self._buffer = bytearray()
+        self._restart_reader = False
+        self._depth = 0
+        self._in_menu = False
+
+    def __enter__(self):
+        # Takes over the serial session: commands from other threads wait
+        # (in the command queue too, see cmdqueue.py), and the background
+        # reader is paused, since prompts are not complete messages. Can be
+        # nested.
+        self.mcu._cmd_lock.acquire()
+        self.mcu.queue.hold()
+        self._depth += 1
+        if self._depth == 1:
+            self._restart_reader = self.mcu._reader is not None
+            if self._restart_reader:
+                self.mcu.stop_reader()
+            self._buffer = bytearray(self.mcu._frames.pending())
+            self.mcu._frames.clear_pending()
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        try:
+            if self._depth == 0 and exc[0] is not None and self._in_menu:
+                self._leave_menu()
+        finally:
+            if self._depth == 0 and self._restart_reader:
+                self.mcu.start_reader()
+            self.mcu.queue.release()
+            self.mcu._cmd_lock.release()
+
+    def _leave_menu(self):
+        # Gets out of a menu left open by an exception (e.g. Ctrl+C between
+        # two keys) before other commands are written into it. The prompt
+        # being printed is read first so the watchdog sees which one it is.
+        from record_lib.watchdog import Watchdog
+        self._in_menu = False
+        session = self.mcu.session
+        start = last = time.time()
+        while time.time() - last < 0.1 and time.time() - start < self.timeout:
+            if session.in_waiting:
+                self._buffer += session.read(session.in_waiting)
+                last = time.time()
+            else:
+                time.sleep(0.005)
+        # Only the open prompt, the menu text before it is not a message.
+        prompt = bytes(self._buffer).rpartition(b'\r\n\n')[2]
+        self.mcu._frames.feed(prompt)
+        self._buffer.clear()
+        Watchdog(self.mcu, verbose=self.verbose).check()
+
+    def _send(self, keys):
+        if self.verbose: print("   >", repr(keys))
+        self.mcu._write(bytes(keys, 'utf-8'))
+
+    def _expect(self, *endings):
+        # Reads until what was received ends with one of "endings" (a prompt)
+        # or a "$: ..." message closing the menu is complete. Returns the
+        # text received, or None after the timeout.
+        session = self.mcu.session
+        endings = [bytes(e, 'utf-8') for e in endings]
+        start = time.time()
+        while time.time() - start < self.timeout:
+            closed = self._buffer.find(b'$:')
+            if closed >= 0 and self._buffer.find(b'\r\n\n', closed) >= 0:
+                break
+            if any(self._buffer.endswith(e) for e in endings):
+                break
+            data = session.read(max(1, session.in_waiting))
+            if data:
+                self._buffer += data
+        else:
+            self._log()
+            return None
+
+        return self._log()
+
+    def _log(self):
+        text = self._buffer.decode(errors='replace')
+        self.transcript += text
+        self._buffer.clear()
+        if self.verbose: print("  ", text.replace('\r', '').replace('\n', ' '))
+        return text
+
+    def _enter(self, item):
+        # Enters configuration mode and selects a menu item.
+        self.transcript = ''
+        self._in_menu = True
+        self._send('$')
+        if self.menu:
+            if self._expect('>') is None:
+                return False
+            self._send(item)
+        return True
+
+    def _finish(self, text, *success):
+        # Checks the message closing the menu.
+        self._in_menu = False
+        if text is None:
+            print("[Error]: The microcontroller stopped responding in configuration mode.")
+            return False
+        for line in text.split('\r\n'):
+            line = line.strip()
+            if line.startswith('$:'):
+                if any(s in line for s in success):
+                    return True
+                print("[Error]:", line)
+                return False
+        print("[Error]: Configuration not confirmed by the microcontroller.")
+        return False
+
+    @staticmethod
+    def _value(val):
+        # Values shorter than 4 characters are finished with Enter.
+        val = str(val)
+        return val if len(val) >= 4 else val + '\r'
+
+    def feeder(self, fdr, lvl, val, test_new=True):
+        # Sets the CCR value of feeder "fdr" (1-4) at level "lvl" (1-3) to
+        # "val" (0-8000). With "test_new", every feeder is then lit at that
+        # level. Returns True if the microcontroller confirmed the change.
+        with self:
+            if not self._enter('A'):
+                return self._finish(None)
+            for key in (str(lvl), str(fdr)):
+                if self._expect('> ') is None:
+                    return self._finish(None)
+                self._send(key)
+            if self._expect('> ') is None:
+                return self._finish(None)
+            self._send(self._value(val))
+            text = self._expect('> ')
+            if text is not None and '$:' not in text:
+                self._send('y' if test_new else 'n')
+                text = self._expect()
+
+            return self._finish(text, "Configuration applied!", "New settings applied!")
+
+    def relay_ontime(self, val):
+        # Sets how long valves stay open, in milliseconds (0-9999).
+        with self:
+            if not self._enter('B'):
+                return self._finish(None)
+            if self._expect('> ') is None:
+                return self._finish(None)
+            self._send(self._value(val))
+
+            return self._finish(self._expect(), "Configuration applied!")
+
+    def ttl_length(self, val):
+        # Sets the length of TTL pulses, in milliseconds (0-9999).
+        with self:
+            if not self._enter('C'):
+                return self._finish(None)
+            if self._expect('> ') is None:
+                return self._finish(None)
+            self._send(self._value(val))
+
+            return self._finish(self._expect(), "Configuration applied!")
+
+    def ttl_mode(self, mode):
+        # Sets the output TTL operation mode: 1 (or 'TOGGLE'), 2 ('PULSE') or
+        # 3 ('OFF').
+        with self:
+            mode = TTL_MODES.get(str(mode).upper(), mode)
+            if not self._enter('D'):
+                return self._finish(None)
+            if self._expect('>') is None:
+                return self._finish(None)
+            self._send(str(mode))
+            text = self._expect()
+            if text is not None and "Error: Invalid input" in text:
+                print("[Error]: Invalid TTL mode", mode)
+                return False
+
+            applied = self._finish(text, "TTL output operation mode applied")
+            if applied:
+                # The mode change also leaves the output TTL low.
+                self.mcu.state.ttl_mode = _mode_name('ttl_mode', mode)
+                self.mcu.state.ttl_out = False
+            
+            return applied
+
+    def apply_profile(self, profile, only_changed=True, verify=True):
+        # Applies every setting in "profile" (a dictionary or the path to a
+        # JSON file, see the module description). Settings the
+        # microcontroller already has are skipped unless "only_changed" is
+        # False. With "verify", the settings are read back afterwards.
+        # Returns a dictionary of the settings that could not be applied (or
+        # read back differently), mapped to the value wanted. An empty
+        # dictionary means the whole profile is in place.
+        if isinstance(profile, str):
+            profile = load_profile(profile)
+        current = self.mcu.request_info() if only_changed or verify else {}
+        failed = {}
+        with self:
+            for lvl, values in profile.get('ccr', {}).items():
+                for i, val in enumerate(values):
+                    if val is None:
+                        continue
+                    if only_changed and _ccr(current, lvl, i) == val:
+                        continue
+                    if not self.feeder(i + 1, lvl, val, test_new=False):
+                        failed[('ccr', str(lvl), i + 1)] = val
+            for key, setter in (('relay_ontime', self.relay_ontime),
+                                ('ttl_length', self.ttl_length),
+                                ('ttl_mode', self.ttl_mode)):
+                if key not in profile:
+                    continue
+                if only_changed and str(current.get(key)).upper() == str(_mode_name(key, profile[key])).upper():
+                    continue
+                if not setter(profile[key]):
+                    failed[key] = profile[key]
+
+        if verify:
+            current = self.mcu.request_info()
+            for lvl, values in profile.get('ccr', {}).items():
+                for i, val in enumerate(values):
+                    if val is not None and _ccr(current, lvl, i) != val:
+                        failed[('ccr', str(lvl), i + 1)] = val
+            for key in ('relay_ontime', 'ttl_length', 'ttl_mode'):
+                if key in profile and str(current.get(key)).upper() != str(_mode_name(key, profile[key])).upper():
+                    failed[key] = profile[key]
+
+        return failed
+
+def _ccr(info, lvl, i):
+    try:
+        return info['ccr'][str(lvl)][i]
+    except (KeyError, IndexError):
+        return None
+
+def _mode_name(key, value):
+    # The TTL mode as the firmware reports it for '?'.
+    if key == 'ttl_mode':
+        for name, number in TTL_MODES.items():
+            if str(value) == str(number):
+                return name
+    return value
+
+def load_profile(path):
+    # Loads a profile from a JSON file.
+    with open(path) as f:
+        return json.load(f)
+
+def save_profile(mcu, path):
+    # Saves the microcontroller's current settings as a profile that can be
+    # applied to it (or another microcontroller) later.
+    info = mcu.request_info()
+    profile = {key: info[key] for key in ('ccr', 'relay_ontime', 'ttl_length', 'ttl_mode') if key in info}
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2)
+
+    return profile
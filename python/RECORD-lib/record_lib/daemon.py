@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Long-running owner of RECORD serial ports. Opening a serial session for every
+event (as the batch scripts and McuEvent.m do through plink) costs hundreds of
+milliseconds per command; RECORDDaemon opens every port once and takes
+commands over a local socket instead, so any program (MATLAB, Bonsai, a shell
+script) gets the latency of the serial link alone. Commands from different
+clients are sent one at a time through RECORD.pipeline, which also times the
+acknowledgement of each one.
+
+Protocol: one request per line, one response line per request, any number of
+requests per connection.
+    <device> <command>      Sends a firmware command, e.g. "FR2355_Dev #F1L2"
+                            or "- K" ("-" is the first device). A space is
+                            added after LED commands. Answered with
+                            "OK <sent_ns> <ack_ns> <response>", both times in
+                            nanoseconds since the epoch.
+    <device> .info          Device information (see RECORD.request_info).
+    <device> .state         The shadow model of the device (see shadow.py).
+    <device> .events        Messages no command asked for, such as button
+                            presses, received since the last ".events".
+    - .devices              Every device and its port.
+    - .ping                 Checks the daemon is up.
+The dot requests are answered with "OK <json>". Errors are answered with
+"ERR <reason>". The configuration menus ('$', '%') and '?' are not available
+as commands.
+
+    python -m record_lib.daemon serve --device FR2355_Dev=COM4
+    python -m record_lib.client --device FR2355_Dev "#F1L2"
+
+RECORDClient and the client command line are in client.py ("python -m
+record_lib.daemon send" does the same).
+"""
+
+import argparse
+import json
+import socket
+import socketserver
+import threading
+import time
+
+from record_lib.client import DEFAULT_ADDRESS, send_commands, add_address_arguments, address_of
+from record_lib.reconnect import ResilientRECORD
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        if self.connection.family != getattr(socket, 'AF_UNIX', None):
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        for line in self.rfile:
+            reply = self.server.daemon.request(line.decode(errors='replace').rstrip('\r\n'))
+            self.wfile.write(reply.encode() + b'\n')
+            self.wfile.flush()
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+class RECORDDaemon:
+    def __init__(self, devices, address=DEFAULT_ADDRESS, **kwargs):
+        # Arguments:
+        #    - devices: Dictionary of device names to ports, e.g.
+        #      {'FR2355_Dev': 'COM4'}. A name of None is replaced by the
+        #      device ID the microcontroller reports.
+        #    - address: (host, port) to listen on over TCP, or the path of a
+        #      Unix socket. Default ('127.0.0.1', 5555).
+        #    - timeout: Seconds to wait for every response. Default 2.
+        #    - Any other argument is passed on to RECORD.createSS.
+        self.verbose = kwargs.pop('verbose', 0)
+        self.timeout = kwargs.pop('timeout', 2)
+        self.address = address
+        self.ss_kwargs = kwargs
+        self.devices = {}       # Name -> ResilientRECORD
+        self.ttl_length = {}    # Name -> seconds
+        self._order = []
+        self._server = None
+        self._thread = None
+        for name, port in devices.items():
+            self.add_device(port, name)
+
+    def add_device(self, port, name=None):
+        # Opens the port and starts serving the microcontroller on it.
+        # Returns the name it is served under.
+        mcu = ResilientRECORD(com_port=port, verbose=self.verbose, **self.ss_kwargs)
+        mcu.open()
+        info = mcu.request_info()
+        if name is None:
+            name = info.get('device_id', port)
+        self.devices[name] = mcu
+        self.ttl_length[name] = info.get('ttl_length', 100) / 1000
+        self._order.append(name)
+        if self.verbose: print("   Serving", name, "on", port)
+
+        return name
+
+    def request(self, line):
+        # Handles one request line and returns the response line.
+        name, _, command = line.partition(' ')
+        if name == '-' and self._order:
+            name = self._order[0]
+        if command == '.ping':
+            return "OK " + json.dumps(time.time_ns())
+        if command == '.devices':
+            return "OK " + json.dumps({n: mcu.ss_kwargs['com_port'] for n, mcu in self.devices.items()})
+        mcu = self.devices.get(name)
+        if mcu is None:
+            return "ERR unknown device " + name
+        if not command:
+            return "ERR no command"
+        try:
+            if command == '.info':
+                return "OK " + json.dumps(mcu.request_info())
+            if command == '.state':
+                state = mcu.state
+                return "OK " + json.dumps({key: getattr(state, key) for key in
+                                           ('ttl_out', 'ttl_mode', 'exttl', 'indicator', 'lights', 'timer')})
+            if command == '.events':
+                return "OK " + json.dumps(self._events(mcu))
+            if command[0] in '$%?.':
+                return "ERR command not available: " + command
+            if command[0] == '#' and command[-1] not in ' \r':
+                command += ' '
+            response, sent, ack = mcu.pipeline([command], timeout=self.timeout,
+                                               ttl_length=self.ttl_length[name])[0]
+        except Exception as e:
+            return "ERR " + str(e).replace('\n', ' ')
+        sent_ns = int(sent.timestamp() * 1e9)
+        if response == "No response message available...":
+            return "ERR timeout " + str(sent_ns)
+
+        return "OK " + str(sent_ns) + " " + str(int(ack.timestamp() * 1e9)) + " " + response
+
+    def _events(self, mcu):
+        # Takes every message waiting that no command asked for.
+        events = []
+        with mcu._cmd_lock:
+            while True:
+                frame = mcu._read_frame(0)
+                if frame is None:
+                    break
+                events.append([frame[0].decode(errors='replace').strip(), int(frame[1].timestamp() * 1e9)])
+
+        return events
+
+    def _make_server(self):
+        if isinstance(self.address, str):
+            server = _UnixServer(self.address, _Handler)
+        else:
+            server = _TCPServer(self.address, _Handler)
+        server.daemon = self
+
+        return server
+
+    def serve_forever(self):
+        # Serves requests until "shutdown" is called (or Ctrl+C).
+        self._server = self._make_server()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def start(self):
+        # Serves requests from a background thread.
+        self._server = self._make_server()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="RECORD-daemon")
+        self._thread.start()
+
+        return self
+
+    def shutdown(self):
+        # Stops serving and closes every port, along with its journal.
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for mcu in self.devices.values():
+            mcu.close_quietly()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve RECORD microcontrollers over a local socket, or send them commands.")
+    add_address_arguments(parser)
+    actions = parser.add_subparsers(dest='action', required=True)
+    serve = actions.add_parser('serve', help="Open the serial ports and serve them")
+    serve.add_argument('--device', action='append', required=True,
+                       help="[NAME=]PORT, e.g. FR2355_Dev=COM4. Repeat for more devices")
+    serve.add_argument('--baud-rate', type=int, default=9600)
+    serve.add_argument('--verbose', action='store_true')
+    send = actions.add_parser('send', help="Send commands to a served device")
+    send.add_argument('--device', default='-', help="Device name, the first device by default")
+    send.add_argument('commands', nargs='+', help="Firmware commands, or .info, .state, .events, .devices")
+    args = parser.parse_args()
+
+    if args.action == 'serve':
+        devices = {}
+        for device in args.device:
+            name, _, port = device.rpartition('=')
+            devices[name or None] = port
+        daemon = RECORDDaemon(devices, address_of(args), baud_rate=args.baud_rate,
+                              timeout=2, verbose=int(args.verbose))
+        print("Serving", ", ".join(daemon.devices), "on", address_of(args))
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.shutdown()
+    elif not send_commands(address_of(args), args.device, args.commands):
+        raise SystemExit(1)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Finds RECORD microcontrollers among the serial ports of the computer. Every
+port is opened and sent '?', and the ports answering with the RECORD device
+information banner ("Device ID: ...") are reported along with that
+information. Ports are probed at the same time, so the search takes about as
+long as probing one port.
+
+Probing writes "?" and Enter to every port it opens, so pass "ports" to limit
+the search when other serial devices are connected.
+"""
+
+import concurrent.futures
+
+import serial
+import serial.tools.list_ports
+
+from record_lib.record import RECORD
+
+def list_ports():
+    # Returns the names of every serial port on the computer, e.g. ['COM3',
+    # 'COM4'] or ['/dev/ttyACM0'].
+    return [port.device for port in serial.tools.list_ports.comports()]
+
+def probe(port, timeout=2, **kwargs):
+    # Asks the device on "port" for its information. Returns the information
+    # as a dictionary (see RECORD.request_info) if it is a RECORD
+    # microcontroller, otherwise None. Extra arguments are passed on to
+    # RECORD.createSS (baud_rate, ...).
+    mcu = RECORD()
+    kwargs.setdefault('timeout', 0.1)
+    kwargs.setdefault('journal', False)
+    session = mcu.createSS(com_port=port, **kwargs)
+    try:
+        session.open()
+    except (serial.SerialException, OSError, ValueError):
+        # Port in use, missing or not a serial device.
+        return None
+    try:
+        session.reset_input_buffer()
+        info = mcu.request_info(timeout)
+    except (serial.SerialException, OSError):
+        return None
+    finally:
+        session.close()
+
+    if 'device_id' not in info:
+        return None
+    return info
+
+def find_devices(ports=None, timeout=2, **kwargs):
+    # Probes every serial port (or the ones in "ports") at the same time.
+    # Returns a dictionary with the information of every RECORD
+    # microcontroller found, keyed by port name.
+    if ports is None:
+        ports = list_ports()
+    if not ports:
+        return {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(ports)) as pool:
+        futures = {port: pool.submit(probe, port, timeout, **kwargs) for port in ports}
+        found = {port: future.result() for port, future in futures.items()}
+
+    return {port: info for port, info in found.items() if info is not None}
+
+def find_device(device_id, ports=None, timeout=2, **kwargs):
+    # Returns the port of the RECORD microcontroller with the given device ID
+    # (e.g. "FR2355_Dev"), or None if it is not connected.
+    for port, info in find_devices(ports, timeout, **kwargs).items():
+        if info['device_id'] == device_id:
+            return port
+
+    return None
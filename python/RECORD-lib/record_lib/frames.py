@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Buffered reading of microcontroller response frames. The RECORD firmware ends
+every message with "\\r\\n\\n", so instead of reading the serial port one byte
+at a time, everything waiting in the input buffer is read at once and split on
+that terminator. Bytes belonging to an incomplete frame are kept for the next
+read instead of being thrown away.
+"""
+
+import collections
+import datetime
+import time
+
+class FrameReader:
+    def __init__(self, session, eol=b"\r\n\n", on_frame=None):
+        # Arguments:
+        #    - session: An open (or soon to be opened) serial session.
+        #    - eol: The terminator that ends every frame.
+        #    - on_frame: Function called with (bytes, timestamp) for every
+        #      frame completed, before it is queued. Frames for which it
+        #      returns True are not queued.
+        self.session = session
+        self.eol = eol
+        self.on_frame = on_frame
+        self.frames = collections.deque()   # Complete frames not yet handed out
+        self._buffer = bytearray()          # Bytes of the frame being received
+        self._start = None                  # Arrival time of its first byte
+
+    def feed(self, data, ts=None):
+        # Adds received bytes to the buffer and queues every frame they
+        # complete. Each frame is queued as a (bytes, timestamp) tuple, where
+        # the timestamp is the time its first byte was received. Returns the
+        # number of complete frames now waiting.
+        if ts is None:
+            ts = datetime.datetime.now()
+        if not self._buffer:
+            self._start = ts
+        # Only search the new bytes (plus enough old ones to catch a
+        # terminator split between reads) so long messages stay linear.
+        search_from = max(0, len(self._buffer) - len(self.eol) + 1)
+        self._buffer += data
+        while True:
+            end = self._buffer.find(self.eol, search_from)
+            if end < 0:
+                break
+            frame = (bytes(self._buffer[:end]), self._start)
+            if self.on_frame is None or not self.on_frame(*frame):
+                self.frames.append(frame)
+            del self._buffer[:end + len(self.eol)]
+            # Anything left over arrived in this same read.
+            self._start = ts
+            search_from = 0
+
+        return len(self.frames)
+
+    def poll(self):
+        # Reads everything currently waiting in the serial input buffer
+        # without blocking. Returns the number of complete frames waiting.
+        waiting = self.session.in_waiting
+        if waiting:
+            self.feed(self.session.read(waiting))
+
+        return len(self.frames)
+
+    def read_frame(self, timeout=1):
+        # Returns the next complete frame as a (bytes, timestamp) tuple, or
+        # None if no complete frame arrives within "timeout" seconds. Waiting
+        # for the first byte of a read is bounded by the session's own read
+        # timeout, so keep that no longer than the timeouts used here.
+        start = time.time()
+        while not self.frames:
+            if time.time() - start >= timeout:
+                return None
+            # Block for the first byte, then take everything else that is
+            # already waiting in one call.
+            data = self.session.read(max(1, self.session.in_waiting))
+            if data:
+                self.feed(data)
+
+        return self.frames.popleft()
+
+    def read_frames(self, timeout=1):
+        # Generator yielding complete frames as they arrive, until no new
+        # frame has been completed for "timeout" seconds.
+        while True:
+            frame = self.read_frame(timeout)
+            if frame is None:
+                return
+            yield frame
+
+    def pending(self):
+        # Returns any bytes received that do not make up a complete frame yet.
+        return bytes(self._buffer)
+
+    def clear_pending(self):
+        # Drops the partial frame, keeping complete frames queued.
+        self._buffer.clear()
+        self._start = None
+
+    def clear(self):
+        # Drops every queued frame and partial frame.
+        self.frames.clear()
+        self._buffer.clear()
+        self._start = None
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Drives several RECORD microcontrollers (one per arena) from one process.
+Every command is issued to all of the selected arenas at the same time from a
+thread pool, so broadcasting to N arenas takes about as long as sending to
+one. Responses and acknowledgement times are collected per device.
+"""
+
+import concurrent.futures
+
+from record_lib.record import RECORD
+
+class RECORDGroup:
+    def __init__(self, **kwargs):
+        self.verbose = kwargs.get('verbose', 0)
+        self.devices = {}       # Device name -> RECORD object
+        self.sessions = {}      # Device name -> serial session
+        self._pool = None
+
+    def add(self, name, **kwargs):
+        # Adds a microcontroller to the group.
+        # Arguments:
+        #    - name: A name to refer to this device by, for example the arena
+        #      it controls or its PuTTY session name ("FR2355_2").
+        #    - kwargs: Serial session parameters, passed to RECORD.createSS
+        #      (com_port, baud_rate, timeout, ...).
+        # Returns the RECORD object for the device.
+        mcu = RECORD(verbose=self.verbose)
+        self.sessions[name] = mcu.createSS(**kwargs)
+        self.devices[name] = mcu
+
+        return mcu
+
+    def open(self, start_reader=True):
+        # Opens every serial session and, by default, starts each device's
+        # background reader so acknowledgement times are taken on arrival.
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, len(self.devices)),
+            thread_name_prefix="RECORDGroup")
+
+        def _open(mcu):
+            if not mcu.session.is_open:
+                mcu.session.open()
+            if start_reader:
+                mcu.start_reader()
+
+        return self.call_each(_open)
+
+    def close(self):
+        # Stops every reader and closes every serial session, along with
+        # the journal createSS made for it.
+        def _close(mcu):
+            mcu.stop_reader()
+            mcu.session.close()
+
+        results = self.call_each(_close)
+        # Also when the group was never opened or is closed twice.
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+        return results
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def call_each(self, func, devices=None):
+        # Calls func(mcu) for every selected device at the same time.
+        # Arguments:
+        #    - func: A function taking a RECORD object.
+        #    - devices: The names of the devices to use, all of them by
+        #      default.
+        # Returns a dictionary with the result for each device name. If the
+        # call raised an exception for a device, the exception is returned as
+        # that device's result instead.
+        if devices is None:
+            devices = list(self.devices)
+
+        return self._run({name: (func, self.devices[name]) for name in devices})
+
+    def call(self, method, *args, devices=None, **kwargs):
+        # Calls the same RECORD method with the same arguments on every
+        # selected device, e.g. group.call('toggle_ttlin').
+        return self.call_each(lambda mcu: getattr(mcu, method)(*args, **kwargs), devices)
+
+    def command(self, cmd, devices=None, timeout=1):
+        # Sends a command to every selected device and waits for each
+        # response.
+        # Arguments:
+        #    - cmd: The command, the same for every device, or a dictionary
+        #      with a different command for each device name.
+        #    - devices: The names of the devices to use, all of them (or all
+        #      the keys of "cmd") by default.
+        #    - timeout: The seconds to wait for each response.
+        # Returns a dictionary with a (response, sent, ack) tuple for each
+        # device name, see RECORD.pipeline.
+        if not isinstance(cmd, dict):
+            if devices is None:
+                devices = list(self.devices)
+            cmd = dict.fromkeys(devices, cmd)
+        elif devices is not None:
+            cmd = {name: cmd[name] for name in devices}
+
+        jobs = {}
+        for name, c in cmd.items():
+            jobs[name] = (lambda mcu, c=c: mcu.pipeline([c], timeout)[0], self.devices[name])
+
+        return self._run(jobs)
+
+    def _run(self, jobs):
+        # Runs func(mcu) for every (func, mcu) pair in "jobs" on the thread
+        # pool and collects the results by device name.
+        pool = self._pool
+        if pool is None:
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(jobs)))
+
+        futures = {name: pool.submit(func, mcu) for name, (func, mcu) in jobs.items()}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                if self.verbose: print("[Error]:", name, e)
+                results[name] = e
+
+        if pool is not self._pool:
+            pool.shutdown()
+
+        return results
+
+    def feeder_light(self, fdr, lvl, devices=None, timeout=1):
+        # Turns on feeder lights. "fdr" and "lvl" are either used for every
+        # device, or dictionaries with the feeder(s) and level(s) for each
+        # device name, for example fdr={'arena1': 2, 'arena2': [1, 3]} and
+        # lvl={'arena1': 3, 'arena2': [1, 1]}.
+        if isinstance(fdr, dict):
+            cmd = {name: RECORD.feeder_command(fdr[name], lvl[name]) for name in fdr}
+            return self.command(cmd, devices, timeout)
+
+        return self.command(RECORD.feeder_command(fdr, lvl), devices, timeout)
+
+    def valve_activate(self, vlv, devices=None, rly_length=0.5, timeout=1):
+        # Opens valve "vlv" (or one valve per device if a dictionary is
+        # given). Waits for the relay active time on top of the timeout.
+        if isinstance(vlv, dict):
+            cmd = {name: RECORD.valve_command(vlv[name]) for name in vlv}
+            return self.command(cmd, devices, timeout + rly_length)
+
+        return self.command(RECORD.valve_command(vlv), devices, timeout + rly_length)
+
+    def all_inactive(self, devices=None, timeout=1):
+        # Resets every selected device to its idle state.
+        return self.command(b'R', devices, timeout)
+
+    def all_active(self, devices=None, timeout=1):
+        # Turns all cost lights on at level 3 on every selected device.
+        return self.command(b'A', devices, timeout)
+
+    def indicator_toggle(self, devices=None, timeout=1):
+        # Toggles the trial indicator light on every selected device.
+        return self.command(b'K', devices, timeout)
+
+    def timer_start(self, devices=None, timeout=1):
+        # Starts the internal timer on every selected device.
+        return self.command(b'Q', devices, timeout)
+
+    def timer_fetch(self, devices=None, timeout=1):
+        # Requests the timer value from every selected device.
+        return self.command(b'W', devices, timeout)
+
+    def timer_stop(self, devices=None, timeout=1):
+        # Stops the internal timer on every selected device.
+        return self.command(b'E', devices, timeout)
+
+    def output_ttl(self, devices=None, timeout=1):
+        # Sends a TTL out from every selected device.
+        return self.command(b'T', devices, timeout)
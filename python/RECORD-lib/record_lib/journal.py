@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Binary journal of the serial traffic of a RECORD session. Every write to and
+read from the serial port is appended to memory as a fixed-size record
+(direction, host time in nanoseconds, first byte, and the offset and length
+of the bytes in a separate payload buffer), which costs about as much as a
+list append. A background thread writes both buffers to disk every
+"flush_interval" seconds, so nothing is printed or written from the thread
+sending commands. A journal is made of two files:
+    <path>.idx    16-byte header followed by RECORD_SIZE-byte records
+    <path>.dat    The bytes of every record, one after the other
+
+RECORD.createSS journals every session by default, to
+~/.record_lib/journals. Load a journal afterwards with read_journal:
+
+    records, payload = read_journal("~/.record_lib/journals/record_...")
+    sent = records[records['direction'] == SENT]
+    np.diff(sent['host_ns']) / 1e6      # Milliseconds between commands
+
+or print it with "python -m record_lib.journal <path>".
+"""
+
+import argparse
+import atexit
+import datetime
+import os
+import struct
+import threading
+import time
+import weakref
+
+import numpy as np
+
+SENT = 0
+RECEIVED = 1
+
+MAGIC = b'RECJRNL\x00'
+VERSION = 1
+_HEADER = struct.Struct('<8sII')            # Magic, version, record size
+_RECORD = struct.Struct('<qQIBB2x')          # host_ns, offset, length, direction, command
+RECORD_SIZE = _RECORD.size
+RECORD_DTYPE = np.dtype([('host_ns', '<i8'), ('offset', '<u8'), ('length', '<u4'),
+                         ('direction', 'u1'), ('command', 'u1'), ('_pad', 'V2')])
+
+# Open journals, flushed when the interpreter exits.
+_open_journals = weakref.WeakSet()
+
+class Journal:
+    def __init__(self, path=None, **kwargs):
+        # Arguments:
+        #    - path: The journal files without extension. Defaults to
+        #      "record_<date>_<time>_<pid>" in ~/.record_lib/journals.
+        #    - flush_interval: Seconds between writes to disk. Default 0.5.
+        if path is None:
+            path = os.path.join(os.path.expanduser("~"), ".record_lib", "journals",
+                                datetime.datetime.now().strftime("record_%Y%m%d_%H%M%S_")
+                                + str(os.getpid()))
+        self.path = os.path.expanduser(path)
+        self.flush_interval = kwargs.get('flush_interval', 0.5)
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._idx = open(self.path + '.idx', 'wb')
+        self._dat = open(self.path + '.dat', 'wb')
+        self._idx.write(_HEADER.pack(MAGIC, VERSION, RECORD_SIZE))
+        self._records = bytearray()
+        self._payload = bytearray()
+        self._offset = 0            # Payload bytes logged so far
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._run, daemon=True, name="RECORD-journal")
+        self._writer.start()
+        _open_journals.add(self)
+
+    def log(self, direction, data, host_ns=None):
+        # Appends bytes sent (direction SENT) or received (RECEIVED). Empty
+        # reads are not logged.
+        if not data:
+            return
+        if host_ns is None:
+            host_ns = time.time_ns()
+        with self._lock:
+            self._records += _RECORD.pack(host_ns, self._offset, len(data), direction, data[0])
+            self._payload += data
+            self._offset += len(data)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        # Writes everything logged so far to disk.
+        with self._file_lock:
+            with self._lock:
+                records, self._records = self._records, bytearray()
+                payload, self._payload = self._payload, bytearray()
+            if self._idx.closed:
+                return
+            # Payload first, so every record on disk has its bytes.
+            self._dat.write(payload)
+            self._dat.flush()
+            self._idx.write(records)
+            self._idx.flush()
+
+    def close(self):
+        # Stops the writer thread and closes the files.
+        if self.closed:
+            return
+        self._stop.set()
+        self._writer.join()
+        self.flush()
+        with self._file_lock:
+            self._idx.close()
+            self._dat.close()
+        _open_journals.discard(self)
+
+    @property
+    def closed(self):
+        return self._idx.closed
+
+@atexit.register
+def _flush_all():
+    for journal in list(_open_journals):
+        try:
+            journal.flush()
+        except Exception:
+            pass
+
+class JournaledSerial:
+    # Wraps a serial session, logging every write and read to a Journal.
+    # Everything else is passed through to the session. With "owned", the
+    # journal was made for this session and is closed along with it.
+    def __init__(self, session, journal, owned=False):
+        object.__setattr__(self, '_session', session)
+        object.__setattr__(self, 'journal', journal)
+        object.__setattr__(self, 'owned', owned)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._session, name, value)
+
+    def __enter__(self):
+        self._session.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self._session.__exit__(*exc)
+        finally:
+            self._release()
+
+    def write(self, data):
+        self.journal.log(SENT, data)
+        return self._session.write(data)
+
+    def read(self, size=1):
+        data = self._session.read(size)
+        self.journal.log(RECEIVED, data)
+        return data
+
+    def read_until(self, *args, **kwargs):
+        data = self._session.read_until(*args, **kwargs)
+        self.journal.log(RECEIVED, data)
+        return data
+
+    def readline(self, *args, **kwargs):
+        data = self._session.readline(*args, **kwargs)
+        self.journal.log(RECEIVED, data)
+        return data
+
+    def close(self):
+        # Closes the port, and the journal if it is owned (its thread and
+        # files), also when closing the port fails.
+        try:
+            self._session.close()
+        finally:
+            self._release()
+
+    def close_port(self):
+        # Closes the port but keeps the journal open, for a new session
+        # logging to the same journal (e.g. after reconnecting).
+        self._session.close()
+        self.journal.flush()
+
+    def _release(self):
+        if self.owned:
+            self.journal.close()
+        else:
+            self.journal.flush()
+
+def read_journal(path):
+    # Loads the journal at "path" (without extension). Returns a tuple with
+    # a structured NumPy array of the records (fields "host_ns", "offset",
+    # "length", "direction" and "command") and the payload as a NumPy uint8
+    # array, so the bytes of record i are
+    # payload[records['offset'][i]:records['offset'][i] + records['length'][i]].
+    path = os.path.expanduser(path)
+    with open(path + '.idx', 'rb') as f:
+        magic, version, size = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(path + ".idx is not a RECORD journal.")
+    if size != RECORD_SIZE:
+        raise ValueError("Unsupported journal record size: " + str(size))
+    records = np.fromfile(path + '.idx', dtype=RECORD_DTYPE, offset=_HEADER.size)
+    payload = np.fromfile(path + '.dat', dtype=np.uint8)
+    # A journal still being written can end with a record whose bytes are
+    # not on disk yet.
+    complete = records['offset'] + records['length'] <= len(payload)
+
+    return records[complete], payload
+
+def payload_of(records, payload, i):
+    # Returns the bytes of record i.
+    start = int(records['offset'][i])
+    return payload[start:start + int(records['length'][i])].tobytes()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print a RECORD serial journal.")
+    parser.add_argument("path", help="Journal files without extension")
+    args = parser.parse_args()
+
+    records, payload = read_journal(args.path)
+    if len(records):
+        t0 = records['host_ns'][0]
+    for i in range(len(records)):
+        print("%12.3f ms  %s  %r" % ((records['host_ns'][i] - t0) / 1e6,
+                                     '>' if records['direction'][i] == SENT else '<',
+                                     payload_of(records, payload, i)))
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Columnar parser for the serial logs written by the batch scripts through
+plink (FR2355_Dev_output.log, FR2355_Dev_out.out) and by the MATLAB app
+(FR2355_Dev_eventlog.log). The file is read in chunks into a NumPy byte
+array and every line is classified from a few of its bytes gathered for all
+lines at once, instead of running a regular expression per line, so logs of
+hundreds of megabytes load at memory speed. Every firmware message ("K: trial
+indication on at 12.345") and every command the MATLAB app logged as sent
+becomes one row of a structured array with LOG_DTYPE fields:
+    offset      Byte offset of the line in the file
+    direction   journal.SENT (command logged as sent) or journal.RECEIVED
+    command     Command character, e.g. b'K'; b' ' for button presses and
+                external TTLs
+    kind        Index into response.KINDS, -1 for sent commands
+    value       1/0 for on/off and HIGH/LOW, the relay number for relays,
+                -1 otherwise
+    sc, ms      The firmware's "sc.ms" timer reading, -1 if not reported
+    host        Latest host time written in the log before the line (the
+                header of a batch script run, or the time of a MATLAB app
+                event), NaT if none
+    text_offset, text_length
+                Byte offset and length in the file of the whole command
+                logged as sent (e.g. "#F3L0"), 0 for messages; see
+                sent_commands
+
+    events = parse_log("FR2355_Dev_output.log")
+    events[events['kind'] == KINDS.index('relay')]
+    sent_commands("FR2355_Dev_eventlog.log", events)   # [b'#F3L0', b'K', ...]
+    df = to_dataframe(events)       # Needs pandas
+
+or print a summary with "python -m record_lib.logparse <log> [--csv out.csv]".
+"""
+
+import argparse
+import datetime
+import os
+
+import numpy as np
+
+from record_lib.journal import SENT, RECEIVED
+from record_lib.response import KINDS
+
+LOG_DTYPE = np.dtype([('offset', '<i8'), ('direction', 'u1'), ('command', 'S1'),
+                      ('kind', 'i1'), ('value', '<i2'), ('sc', '<i4'), ('ms', '<i4'),
+                      ('host', '<M8[ms]'), ('text_offset', '<i8'), ('text_length', '<u2')])
+
+# Kind of message by its first byte. Messages starting with a space are told
+# apart by the word after it.
+_KIND_OF = np.full(256, KINDS.index('other'), dtype=np.int8)
+for _c, _kind in (('#', 'feeder'), ('R', 'reset'), ('K', 'indicator'), ('A', 'all_on'),
+                  ('g', 'green'), ('r', 'red'), ('Q', 'timer_start'), ('W', 'timer'),
+                  ('E', 'timer_stop'), ('T', 'ttl'), ('t', 'ttl_state'), ('Y', 'exttl'),
+                  ('?', 'info'), ('$', 'config'), ('%', 'calibration'), ('F', 'relay'),
+                  ('G', 'relay'), ('H', 'relay'), ('J', 'relay')):
+    _KIND_OF[ord(_c)] = KINDS.index(_kind)
+_RELAY = np.full(256, -1, dtype=np.int16)
+_RELAY[[ord('F'), ord('G'), ord('H'), ord('J')]] = [1, 2, 3, 4]
+_SPACE_KINDS = ((b' External TTL', 'external_ttl'), (b' Button', 'button'),
+                (b' Entering', 'menu'))
+_SENDING = b'SENDING COMMAND "'
+_PAD = 64
+_MONTHS = {m: i + 1 for i, m in enumerate(('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                                          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'))}
+
+def _at(buf, pos, k=0):
+    # Bytes at positions pos + k (a 2-D array for a range of k). "buf" is
+    # padded with _PAD zeros on both sides, so reads a little past either
+    # end of it give 0.
+    pos = np.asarray(pos)
+    pos = pos[:, None] + k if np.ndim(k) else pos + k
+
+    return buf.take(pos, mode='clip')
+
+def _startswith(buf, starts, prefix):
+    # Whether the lines starting at "starts" start with "prefix".
+    window = _at(buf, starts, np.arange(len(prefix)))
+    return (window == np.frombuffer(prefix, dtype=np.uint8)).all(axis=1)
+
+def _digits(c):
+    return (c >= 48) & (c <= 57)
+
+def _number_before(buf, ends, width=6):
+    # The number made of the digits right before positions "ends"
+    # (exclusive), and how many digits it has (0 if none).
+    c = _at(buf, np.asarray(ends) - 1, -np.arange(width))
+    run = np.cumprod(_digits(c), axis=1).astype(bool)
+    value = ((c.astype(np.int64) - 48) * run * 10 ** np.arange(width)).sum(axis=1)
+
+    return value, run.sum(axis=1)
+
+def _number_at(buf, starts, width):
+    # The fixed-width number at positions "starts", -1 if not all digits.
+    c = _at(buf, starts, np.arange(width))
+    value = ((c.astype(np.int64) - 48) * 10 ** np.arange(width - 1, -1, -1)).sum(axis=1)
+
+    return np.where(_digits(c).all(axis=1), value, -1)
+
+def _date(line):
+    # Date of a "19-Apr-22" (batch scripts) or "20-06-22" (MATLAB app)
+    # line, or None.
+    parts = line.strip().split(b'-')
+    if len(parts) != 3 or not (parts[0].isdigit() and parts[2].isdigit()):
+        return None
+    month = _MONTHS.get(parts[1].decode(errors='replace'))
+    if month is None and parts[1].isdigit():
+        month = int(parts[1])
+    try:
+        return np.datetime64(datetime.date(2000 + int(parts[2]), month, int(parts[0])), 'ms')
+    except (TypeError, ValueError):
+        return None
+
+def _parse_chunk(buf, base, state):
+    # Rows for every line of "buf", which holds whole lines starting at byte
+    # "base" of the file. "state" carries the last date and host time over
+    # to the next chunk.
+    size = len(buf)
+    starts = np.r_[0, np.flatnonzero(buf == 10) + 1]
+    starts = starts[starts < size] + _PAD
+    ends = np.r_[starts[1:] - 1, _PAD + size - (size > 0 and buf[-1] == 10)]
+    buf = np.concatenate((np.zeros(_PAD, dtype=np.uint8), buf, np.zeros(_PAD, dtype=np.uint8)))
+    # Without the line's "\r" and trailing spaces.
+    for i in range(3):
+        last = _at(buf, ends - 1)
+        ends = np.where(((last == 13) | (last == 32)) & (ends > starts), ends - 1, ends)
+    c0, c1, c2 = _at(buf, starts), _at(buf, starts, 1), _at(buf, starts, 2)
+
+    # Dates, a few lines per run; parsed one by one.
+    is_date = (c2 == ord('-')) & ((ends - starts == 8) | (ends - starts == 9))
+    dates = np.full(len(starts), np.datetime64('NaT'), dtype='<M8[ms]')
+    for i in np.flatnonzero(is_date):
+        date = _date(bytes(buf[starts[i]:ends[i]]))
+        if date is None:
+            is_date[i] = False
+        else:
+            dates[i] = date
+    # Times of day "14:57:03.66" (header of a batch script run, or every
+    # line of a MATLAB app event log).
+    is_time = (c2 == ord(':')) & (_at(buf, starts, 5) == ord(':')) & (_at(buf, starts, 8) == ord('.'))
+    lines = np.flatnonzero(is_time)
+    at = starts[lines]
+    hours, minutes, seconds = (_number_at(buf, at + k, 2) for k in (0, 3, 6))
+    fraction, places = _number_before(buf, at + 9 + np.where(_digits(_at(buf, at, 11)), 3, 2), 3)
+    is_time[lines] = (hours >= 0) & (minutes >= 0) & (seconds >= 0) & (places > 0)
+    of_day = np.zeros(len(starts), dtype='<m8[ms]')
+    of_day[lines] = (((hours * 60 + minutes) * 60 + seconds) * 1000
+                     + fraction * 10 ** (3 - np.maximum(places, 1))).astype('<m8[ms]')
+    # A time is on the date right after it (batch scripts) or else on the
+    # last one before it (MATLAB app).
+    index = np.arange(len(starts))
+    last_date = np.maximum.accumulate(np.where(is_date, index, -1))
+    day = np.where(last_date >= 0, dates[np.maximum(last_date, 0)], state['date'])
+    following = np.r_[is_date[1:], False]
+    day = np.where(following, np.r_[dates[1:], np.datetime64('NaT')], day)
+    host = np.where(is_time, day + of_day, np.datetime64('NaT'))
+    last_time = np.maximum.accumulate(np.where(is_time, index, -1))
+    host = np.where(last_time >= 0, host[np.maximum(last_time, 0)], state['host'])
+    if is_date.any():
+        state['date'] = dates[np.flatnonzero(is_date)[-1]]
+    if len(host):
+        state['host'] = host[-1]
+
+    # Commands the MATLAB app logged as sent: '14:57:03.66 - SENDING
+    # COMMAND "#F3L0" TO DEVICE'.
+    sending = np.zeros(len(starts), dtype=bool)
+    command_at = np.zeros(len(starts), dtype=np.int64)
+    for k in (14, 15):
+        lines = np.flatnonzero(is_time & ~sending)
+        found = lines[_startswith(buf, starts[lines] + k, _SENDING)]
+        sending[found] = True
+        command_at[found] = starts[found] + k + len(_SENDING)
+
+    # Firmware messages: "X: ...", "#F1L2: ...", or " Button 1 pushed...".
+    message = (c1 == ord(':')) & (c2 == ord(' ')) & ~_digits(c0)
+    kind = _KIND_OF[c0]
+    # "#F1L2F3L1: feeder configured" or "#F1L2F [ERROR]: LED command ...".
+    led = np.flatnonzero(c0 == ord('#'))
+    if len(led):
+        window = _at(buf, starts[led], np.arange(1, 40))
+        colon = (window == ord(':')) & (np.roll(window, -1, axis=1) == ord(' '))
+        message[led] |= colon.any(axis=1)
+        kind[led] = np.where((window == ord('[')).any(axis=1), KINDS.index('led_error'), kind[led])
+    space = np.flatnonzero(c0 == ord(' '))
+    for prefix, name in _SPACE_KINDS:
+        found = space[_startswith(buf, starts[space], prefix)]
+        message[found] = True
+        kind[found] = KINDS.index(name)
+    lines = np.flatnonzero(message & (_at(buf, starts, 3) == ord('I')))
+    kind[lines[_startswith(buf, starts[lines] + 3, b'I cannot recognize')]] = KINDS.index('unrecognized')
+
+    # The timer reading " at sc.ms" ending the message.
+    ms, ms_digits = _number_before(buf, ends)
+    point = ends - ms_digits - 1
+    sc, sc_digits = _number_before(buf, point)
+    text_end = point - sc_digits - 4
+    stamped = (message & (ms_digits > 0) & (_at(buf, point) == ord('.')) & (sc_digits > 0)
+               & _startswith(buf, text_end, b' at '))
+    text_end = np.where(stamped, text_end, ends)
+    last = _at(buf, text_end - 1)
+    value = np.full(len(starts), -1, dtype=np.int16)
+    on_off = (c0 == ord('K')) | (c0 == ord('Y'))
+    value = np.where(on_off & (last == ord('n')), 1, np.where(on_off & (last == ord('f')), 0, value))
+    high_low = c0 == ord('t')
+    value = np.where(high_low & (last == ord('H')), 1, np.where(high_low & (last == ord('W')), 0, value))
+    value = np.where(kind == KINDS.index('relay'), _RELAY[c0], value)
+    button = kind == KINDS.index('button')
+    value = np.where(button, _number_at(buf, starts + len(b' Button '), 1), value)
+
+    rows = message | sending
+    out = np.zeros(rows.sum(), dtype=LOG_DTYPE)
+    out['offset'] = base + starts[rows] - _PAD
+    out['direction'] = np.where(sending[rows], SENT, RECEIVED)
+    first = np.where(sending, _at(buf, command_at), c0)
+    out['command'] = first[rows].view('S1')
+    out['kind'] = np.where(sending, -1, kind)[rows]
+    out['value'] = np.where(sending, -1, value)[rows]
+    out['sc'] = np.where(stamped, sc, -1)[rows]
+    out['ms'] = np.where(stamped, ms, -1)[rows]
+    out['host'] = host[rows]
+    # The command text ends at its closing quote.
+    quote = _at(buf, command_at, np.arange(_PAD)) == ord('"')
+    length = np.clip(np.where(quote.any(axis=1), quote.argmax(axis=1), ends - command_at), 0, None)
+    out['text_offset'] = np.where(sending, base + command_at - _PAD, 0)[rows]
+    out['text_length'] = np.where(sending, length, 0)[rows]
+
+    return out
+
+def parse_log(path, chunk_size=64 * 2**20):
+    # Parses the log at "path" into a structured array with LOG_DTYPE
+    # fields, one row per firmware message or command sent, in file order.
+    # The file is read "chunk_size" bytes at a time.
+    state = {'date': np.datetime64('NaT', 'ms'), 'host': np.datetime64('NaT', 'ms')}
+    parts = []
+    carry = b''
+    base = 0
+    with open(os.path.expanduser(path), 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            at_end = not data
+            data = carry + data
+            if not data:
+                break
+            if at_end:
+                cut = len(data)
+            else:
+                # Whole lines only. A time line ending them is held back with
+                # the next chunk, since it is dated by the line after it.
+                end = data.rfind(b'\n') + 1
+                start = data.rfind(b'\n', 0, end - 1) + 1
+                cut = start if _is_time(data[start:end]) else end
+                if cut <= 0:
+                    carry = data
+                    continue
+            buf = np.frombuffer(data, dtype=np.uint8, count=cut)
+            parts.append(_parse_chunk(buf, base, state))
+            base += cut
+            carry = data[cut:]
+            if at_end:
+                break
+
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=LOG_DTYPE)
+
+def _is_time(line):
+    # Whether "line" starts with a time of day such as "14:57:03.66", as
+    # checked for every line in _parse_chunk.
+    return line[2:3] == b':' and line[5:6] == b':' and line[8:9] == b'.'
+
+def sent_commands(path, events):
+    # The whole text of every command logged as sent among the rows of
+    # parse_log, read back from the log at "path", as a list of bytes.
+    sent = events[events['direction'] == SENT]
+    if not len(sent):
+        return []
+    buf = np.memmap(os.path.expanduser(path), dtype=np.uint8, mode='r')
+    
+    return [buf[start:start + length].tobytes() for start, length in zip(sent['text_offset'], sent['text_length'])]
+
+def to_dataframe(events):
+    # The rows of parse_log as a pandas DataFrame, with the command as text
+    # and the kind as a categorical column of names ("sent" for commands
+    # logged as sent). Needs pandas.
+    import pandas as pd
+    names = np.array(list(KINDS) + ['sent'])
+    df = pd.DataFrame({name: events[name] for name in LOG_DTYPE.names})
+    df['command'] = events['command'].astype('U1')
+    df['kind'] = pd.Categorical.from_codes(np.where(events['kind'] < 0, len(KINDS), events['kind']),
+                                           categories=names)
+
+    return df
+
+def save_csv(events, filename):
+    # Saves the rows of parse_log to "filename".csv.
+    with open(filename + ".csv", 'w', encoding='UTF8', newline='') as file:
+        file.write("offset,direction,command,kind,value,sc,ms,host,text_offset,text_length\n")
+        for row in events:
+            file.write("%d,%s,%s,%s,%d,%d,%d,%s,%d,%d\n" % (
+                row['offset'], 'sent' if row['direction'] == SENT else 'received',
+                row['command'].decode(errors='replace'),
+                'sent' if row['kind'] < 0 else KINDS[row['kind']], row['value'],
+                row['sc'], row['ms'], '' if np.isnat(row['host']) else row['host'],
+                row['text_offset'], row['text_length']))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse a RECORD serial log into an event table.")
+    parser.add_argument("path", help="Log file written by plink or the MATLAB app")
+    parser.add_argument("--csv", help="Save the events to this CSV file (without extension)")
+    args = parser.parse_args()
+
+    events = parse_log(args.path)
+    print(len(events), "events,", (events['direction'] == SENT).sum(), "sent")
+    kinds, counts = np.unique(events['kind'], return_counts=True)
+    for k, n in zip(kinds, counts):
+        print("  %-14s %d" % ('sent' if k < 0 else KINDS[k], n))
+    if args.csv:
+        save_csv(events, args.csv)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Monte-Carlo simulation of trial sessions, to choose the probabilities and
+intervals of a protocol before running it on a cohort. The session
+parameters come from a TRIALS object (create_trial_session), and the rat's
+decisions from a model of the probability of approaching an offer at every
+cost level. Sessions are simulated in batches of NumPy arrays, spread over a
+pool of processes (so a script running it needs the
+'if __name__ == "__main__":' guard on Windows), and give:
+    - the distribution of session durations,
+    - the distribution of trials and approaches per feeder/cost level cell,
+    - the power of a Cochran-Armitage trend test for approach rates falling
+      (or rising) with cost level, per session or per group of sessions.
+
+    if __name__ == "__main__":
+        mytrials = TRIALS()
+        mytrials.create_trial_session(tz=pytz.utc, trials=60, P_lvls=[0.1, 0.3, 0.3, 0.3])
+        sim = SessionSimulator(mytrials, approach=[0.95, 0.8, 0.6, 0.4], session_sd=0.5)
+        result = sim.run(1000000, seed=1)
+        print(result.summary())
+"""
+
+import concurrent.futures
+import os
+import statistics
+
+import numpy as np
+
+from record_lib.trials import check_probs
+
+class SessionSimulator:
+    def __init__(self, mytrials, **kwargs):
+        # Arguments:
+        #    - mytrials: A TRIALS object after "create_trial_session". Its
+        #      trials, avail_lvls, avail_fdrs, P_lvls, P_fdrs, T_intertrial,
+        #      T_decision and T_feeding can be overridden by passing them here.
+        #    - approach: (List) Probability of approaching the offer at each
+        #      cost level, position-sensitive like P_lvls. Default 0.5 for
+        #      every level (no effect of cost).
+        #    - session_sd: Standard deviation, in log-odds, of a random shift
+        #      of every session's approach probabilities (day-to-day
+        #      variability of the rat). Default 0.
+        #    - model: Function taking the cost level and feeder indices of
+        #      every trial (arrays of shape (sessions, trials)) and a numpy
+        #      Generator, and returning the probability of approaching each
+        #      offer. Replaces "approach" and "session_sd". It has to be
+        #      defined at the top level of a module to run in other processes.
+        #    - overhead: Seconds every trial takes besides the intervals: the
+        #      1 second wait after the TTL and the 2 second baseline of
+        #      "sample_trial_with_output", plus serial communication.
+        #      Default 3.
+        #    - alpha: Significance level of the trend test. Default 0.05.
+        #    - pool: Number of sessions pooled into every trend test, e.g. the
+        #      sessions of a cohort. Default 1.
+        self.verbose = kwargs.get('verbose', 0)
+        self.trials = mytrials
+        self.list_kwargs = {key: kwargs[key] for key in ('trials', 'avail_lvls', 'avail_fdrs', 'P_lvls', 'P_fdrs')
+                            if key in kwargs}
+        self.n_trials = kwargs.get('trials', mytrials.trials)
+        self.levels = list(kwargs.get('avail_lvls', mytrials.avail_lvls))
+        self.feeders = list(kwargs.get('avail_fdrs', mytrials.avail_fdrs))
+        self.T_intertrial = kwargs.get('T_intertrial', mytrials.T_intertrial)
+        self.T_decision = kwargs.get('T_decision', mytrials.T_decision)
+        self.T_feeding = kwargs.get('T_feeding', mytrials.T_feeding)
+        self.approach = np.asarray(kwargs.get('approach', [0.5] * len(self.levels)), dtype=float)
+        self.session_sd = kwargs.get('session_sd', 0)
+        self.model = kwargs.get('model', None)
+        self.overhead = kwargs.get('overhead', 3)
+        self.alpha = kwargs.get('alpha', 0.05)
+        self.pool = kwargs.get('pool', 1)
+        
+        # Parameters the trial lists cannot be made from would otherwise only
+        # fail in the worker processes.
+        if not check_probs(self.levels, kwargs.get('P_lvls', mytrials.P_lvls),
+                           self.feeders, kwargs.get('P_fdrs', mytrials.P_fdrs)):
+            raise ValueError("Invalid trial parameters, see the message above.")
+        if int(self.n_trials) < 1:
+            raise ValueError("Sessions need at least one trial.")
+        if self.model is None and len(self.approach) != len(self.levels):
+            raise ValueError("approach needs one probability per cost level.")
+
+    def run(self, sessions, **kwargs):
+        # Simulates "sessions" sessions and returns a SimulationResult.
+        # Arguments:
+        #    - seed: Seed for the trial lists and decisions, so a simulation
+        #      can be repeated. Default None.
+        #    - workers: Number of processes. 0 or 1 simulates in this
+        #      process. Default the number of CPUs.
+        #    - chunk: Sessions simulated at once by every task. Default 20000.
+        workers = kwargs.get('workers', os.cpu_count())
+        chunk = kwargs.get('chunk', 20000)
+        sizes = [min(chunk, sessions - start) for start in range(0, sessions, chunk)]
+        seeds = np.random.SeedSequence(kwargs.get('seed', None)).spawn(len(sizes))
+        tasks = [(self, size, seed) for size, seed in zip(sizes, seeds)]
+        if not workers or workers <= 1 or len(tasks) == 1:
+            parts = [_simulate(*task) for task in tasks]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                parts = list(executor.map(_simulate, *zip(*tasks)))
+        if self.verbose: print("Simulated", sessions, "sessions in", len(tasks), "tasks.")
+
+        return SimulationResult(self, *(np.concatenate(arrays) for arrays in zip(*parts)))
+
+    def _decide(self, lvls, fdrs, rng):
+        # Whether the rat approaches every offer.
+        if self.model is not None:
+            p = np.asarray(self.model(lvls, fdrs, rng), dtype=float)
+        else:
+            p = np.broadcast_to(self.approach[lvls], lvls.shape)
+            if self.session_sd:
+                odds = np.log(np.clip(p, 1e-9, 1 - 1e-9) / np.clip(1 - p, 1e-9, 1))
+                shift = rng.normal(0, self.session_sd, (len(lvls), 1))
+                p = 1 / (1 + np.exp(-(odds + shift)))
+
+        return rng.random(lvls.shape) < p
+
+def _simulate(sim, sessions, seed):
+    # Simulates one batch of sessions. Returns the duration of every session
+    # and its trials and approaches per (feeder, level) cell.
+    lists_seed, decision_seed = seed.spawn(2)
+    fdrs, lvls = sim.trials.create_trial_lists(sessions=sessions, seed=lists_seed, **sim.list_kwargs)
+    # Values to positions in avail_fdrs and avail_lvls.
+    fdrs = _index(fdrs, sim.feeders)
+    lvls = _index(lvls, sim.levels)
+    approached = sim._decide(lvls, fdrs, np.random.default_rng(decision_seed))
+
+    per_trial = sim.T_intertrial + sim.T_decision + sim.overhead
+    durations = sim.n_trials * per_trial + approached.sum(axis=1) * sim.T_feeding
+    cells = len(sim.feeders) * len(sim.levels)
+    cell = (np.arange(sessions)[:, None] * cells + fdrs * len(sim.levels) + lvls).ravel()
+    shape = (sessions, len(sim.feeders), len(sim.levels))
+    counts = np.bincount(cell, minlength=sessions * cells).reshape(shape).astype(np.int32)
+    approaches = np.bincount(cell, weights=approached.ravel(), minlength=sessions * cells).reshape(shape).astype(np.int32)
+
+    return durations.astype(float), counts, approaches
+
+def _index(values, items):
+    # Positions of "values" in the list "items".
+    items = np.asarray(items)
+    order = np.argsort(items, kind='stable')
+
+    return order[np.searchsorted(items, values, sorter=order)]
+
+class SimulationResult:
+    def __init__(self, sim, durations, counts, approaches):
+        # Arrays, one entry per simulated session:
+        #    - durations: Session duration, in seconds.
+        #    - counts: Trials per cell, shape (sessions, feeders, levels),
+        #      in the order of avail_fdrs and avail_lvls.
+        #    - approaches: Approached offers per cell, same shape.
+        self.sim = sim
+        self.durations = durations
+        self.counts = counts
+        self.approaches = approaches
+
+    def __len__(self):
+        return len(self.durations)
+
+    def duration_percentiles(self, q=(5, 50, 95)):
+        return np.percentile(self.durations, q)
+
+    def cell_percentiles(self, q=(5, 50, 95)):
+        # Percentiles of the trials per cell, shape (len(q), feeders, levels).
+        return np.percentile(self.counts, q, axis=0)
+
+    def shortfall(self, minimum):
+        # Fraction of sessions with fewer than "minimum" trials in each cell,
+        # shape (feeders, levels).
+        return (self.counts < minimum).mean(axis=0)
+
+    def trend_z(self, pool=None):
+        # Cochran-Armitage trend statistic of approaches against cost level
+        # (scored by the values in avail_lvls) for every group of "pool"
+        # consecutive sessions. Groups where every offer or no offer was
+        # approached give 0.
+        pool = self.sim.pool if pool is None else pool
+        groups = len(self) // pool
+        n = self.counts[:groups * pool].sum(axis=1).reshape(groups, pool, -1).sum(axis=1).astype(float)
+        r = self.approaches[:groups * pool].sum(axis=1).reshape(groups, pool, -1).sum(axis=1).astype(float)
+        x = np.asarray(self.sim.levels, dtype=float)
+        N = n.sum(axis=1)
+        p = r.sum(axis=1) / N
+        t = (x * (r - n * p[:, None])).sum(axis=1)
+        var = p * (1 - p) * ((n * x ** 2).sum(axis=1) - (n * x).sum(axis=1) ** 2 / N)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(var > 0, t / np.sqrt(var), 0)
+
+        return z
+
+    def power(self, pool=None, alpha=None):
+        # Fraction of groups of "pool" sessions in which the two-sided trend
+        # test rejects "approach does not depend on cost" at level "alpha".
+        alpha = self.sim.alpha if alpha is None else alpha
+        critical = statistics.NormalDist().inv_cdf(1 - alpha / 2)
+
+        return float((np.abs(self.trend_z(pool)) > critical).mean())
+
+    def summary(self):
+        # Text summary of the simulation.
+        low, mid, high = self.duration_percentiles() / 60
+        cells = self.cell_percentiles()
+        lines = ["%d sessions of %d trials" % (len(self), self.sim.n_trials),
+                 "Duration (min): median %.1f, 5-95%% %.1f-%.1f" % (mid, low, high),
+                 "Median trials per cell (5th-95th percentile), feeders by levels " + str(self.sim.levels) + ":"]
+        for i, feeder in enumerate(self.sim.feeders):
+            lines.append("  %-6s" % feeder + "".join("%6d (%d-%d)" % (cells[1, i, j], cells[0, i, j], cells[2, i, j])
+                                                  for j in range(len(self.sim.levels))))
+        lines.append("Trend test power (alpha %g, %d session(s) per test): %.3f"
+                     % (self.sim.alpha, self.sim.pool, self.power()))
+
+        return "\n".join(lines)
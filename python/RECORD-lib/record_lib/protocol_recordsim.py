@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+pyserial URL handler for the RECORD simulator. Importing record_lib registers
+this package with pyserial, after which a session on
+"recordsim://[?option=value[&...]]" talks to a RECORDSimulator instead of a
+real microcontroller. Options are passed on to RECORDSimulator, for example
+"recordsim://?jitter=0.002&seed=1&device_id=FR2355_1". The simulator uses the
+session's baud rate unless "baud_rate" is given ("baud_rate=0" makes transfers
+instantaneous).
+"""
+
+import threading
+import time
+import urllib.parse
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError, to_bytes
+
+from record_lib.simulator import RECORDSimulator
+
+# Options given as numbers in the URL.
+_NUMERIC = {'ttl_length': int, 'relay_ontime': int, 'baud_rate': int,
+            'jitter': float, 'seed': int, 'verbose': int, 'drop_when_busy': int}
+
+class Serial(SerialBase):
+    BAUDRATES = (1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200)
+
+    def __init__(self, *args, **kwargs):
+        self.simulator = None
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        # Starts a new simulated microcontroller for this session.
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        options = self.from_url(self._port)
+        options.setdefault('baud_rate', self._baudrate)
+        self._buffer.clear()
+        self.simulator = RECORDSimulator(**options)
+        self.simulator.attach(self._receive)
+        self.simulator.start()
+        self.is_open = True
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            self.simulator.stop()
+            with self._cond:
+                self._cond.notify_all()
+
+    def from_url(self, url):
+        # Returns the RECORDSimulator options given in the URL.
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme != "recordsim":
+            raise SerialException(
+                'expected a string in the form "recordsim://[?option=value[&...]]": '
+                'not starting with recordsim:// ({!r})'.format(parts.scheme))
+        options = {}
+        try:
+            for option, values in urllib.parse.parse_qs(parts.query, True).items():
+                options[option] = _NUMERIC.get(option, str)(values[0])
+        except ValueError as e:
+            raise SerialException(
+                'expected a string in the form "recordsim://[?option=value[&...]]": {}'.format(e))
+
+        return options
+
+    def _reconfigure_port(self):
+        # The simulator takes the baud rate when it is started, nothing else
+        # can be configured.
+        pass
+
+    def _receive(self, data):
+        # Called from the simulator thread with bytes sent to the host.
+        with self._cond:
+            self._buffer += data
+            self._cond.notify_all()
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return len(self._buffer)
+
+    def read(self, size=1):
+        # Reads up to "size" bytes, waiting at most the session timeout.
+        if not self.is_open:
+            raise PortNotOpenError()
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self._cond:
+            while len(self._buffer) < size and self.is_open:
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+
+        return data
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self.simulator.receive(to_bytes(data))
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self._cond:
+            self._buffer.clear()
+
+    def reset_output_buffer(self):
+        # Bytes are handed to the simulator as soon as they are written.
+        if not self.is_open:
+            raise PortNotOpenError()
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    def _update_break_state(self):
+        pass
+
+    def _update_rts_state(self):
+        pass
+
+    def _update_dtr_state(self):
+        pass
+
+    @property
+    def cts(self):
+        return True
+
+    @property
+    def dsr(self):
+        return True
+
+    @property
+    def ri(self):
+        return False
+
+    @property
+    def cd(self):
+        return True
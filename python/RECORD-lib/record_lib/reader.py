@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Background reader for a RECORD serial session. A dedicated thread drains the
+serial port continuously, splits the incoming bytes into response frames and
+stamps each frame with time.perf_counter_ns() taken when its first byte
+arrived. Frames are put in a thread-safe queue, so acknowledgement times stay
+accurate no matter what the thread issuing commands is doing at the time.
+"""
+
+import datetime
+import queue
+import threading
+import time
+
+from record_lib.frames import FrameReader
+
+class SerialReader(threading.Thread):
+    def __init__(self, session, eol=b"\r\n\n", on_frame=None):
+        # Arguments:
+        #    - session: An open serial session. Its read timeout bounds how
+        #      long the thread takes to notice that it has been stopped.
+        #    - eol: The terminator that ends every frame.
+        #    - on_frame: Function called from the thread with every frame as
+        #      it is completed, see frames.FrameReader.
+        super().__init__(daemon=True, name="RECORD-reader")
+        self.session = session
+        self.frames = queue.Queue()
+        self.error = None
+        self._parser = FrameReader(session, eol=eol, on_frame=on_frame)
+        self._running = threading.Event()
+        self._running.set()
+        # Pair of wall-clock and performance counter readings taken at the
+        # same moment, used to turn frame timestamps into datetimes.
+        self._wall_ns = time.time_ns()
+        self._perf_ns = time.perf_counter_ns()
+
+    def run(self):
+        while self._running.is_set():
+            try:
+                # Blocks until the first byte arrives (or the read timeout
+                # elapses), then takes everything else already waiting.
+                data = self.session.read(max(1, self.session.in_waiting))
+            except Exception as e:
+                # The port was closed or the device went away, keep the
+                # reason and stop reading.
+                if self._running.is_set():
+                    self.error = e
+                break
+            if not data:
+                continue
+            self._parser.feed(data, time.perf_counter_ns())
+            while self._parser.frames:
+                self.frames.put(self._parser.frames.popleft())
+        self._running.clear()
+
+    def feed(self, data):
+        # Hands bytes read before the thread was started over to the parser.
+        self._parser.feed(data, time.perf_counter_ns())
+
+    def get(self, timeout=1):
+        # Returns the next frame as a (bytes, perf_counter_ns) tuple, or None
+        # if no frame arrives within "timeout" seconds.
+        try:
+            return self.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self, timeout=None):
+        # Stops the thread. Returns once it has finished its current read.
+        self._running.clear()
+        if self.is_alive():
+            self.join(timeout)
+
+    def to_datetime(self, t_ns):
+        # Converts a time.perf_counter_ns() reading into a datetime.
+        return datetime.datetime.fromtimestamp((self._wall_ns + t_ns - self._perf_ns) / 1e9)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+A RECORD session that survives the USB link dropping. ResilientRECORD wraps a
+RECORD object and calls its command methods as usual, but when a call fails
+because the port went away it reopens the port (finding it again by device
+ID if its name changed), resets the microcontroller with 'R' and puts back
+the state the experiment had set up: lit feeders, the trial indicator,
+external TTL servicing, the output TTL level and the running timer, as
+followed by RECORD's shadow model ("state", see shadow.py) up to the last
+message received. The command that failed is then sent again, so the
+experiment carries on after a cable glitch instead of aborting.
+
+    mcu = ResilientRECORD(device_id="FR2355_Dev")
+    mcu.open()
+    mcu.feeder_light(2, 3)
+    ...
+    mcu.close()
+
+Reconnections are reported through "events" and the "on_event" callback.
+"""
+
+import copy
+import datetime
+import time
+
+import serial
+
+from record_lib.discovery import find_device
+from record_lib.record import RECORD
+
+class ResilientRECORD:
+    def __init__(self, **kwargs):
+        # Arguments:
+        #    - com_port: The port to use. Optional if "device_id" is given.
+        #    - device_id: The device ID of the microcontroller, used to find
+        #      its port at start and again after reconnecting.
+        #    - reader: Start RECORD's background reader. Default True.
+        #    - backoff: Seconds to wait before the first reconnection
+        #      attempt, doubled after every failed attempt. Default 0.2.
+        #    - max_backoff: Longest wait between attempts. Default 2.
+        #    - give_up: Seconds after which reconnecting is abandoned and the
+        #      error raised. Default 60.
+        #    - on_event: Function called with every event dictionary.
+        #    - Any other argument is passed on to RECORD.createSS.
+        self.verbose = kwargs.pop('verbose', 0)
+        self.device_id = kwargs.pop('device_id', None)
+        self.reader = kwargs.pop('reader', True)
+        self.backoff = kwargs.pop('backoff', 0.2)
+        self.max_backoff = kwargs.pop('max_backoff', 2)
+        self.give_up = kwargs.pop('give_up', 60)
+        self.on_event = kwargs.pop('on_event', None)
+        self.ss_kwargs = kwargs
+        self.mcu = RECORD(verbose=self.verbose)
+        self.session = None
+        self.events = []
+        # Copy of the shadow model taken when the link went down, restored
+        # after reconnecting.
+        self.saved = None
+
+    def open(self):
+        # Finds the port if needed and opens the session.
+        port = self.ss_kwargs.get('com_port')
+        if port is None:
+            if self.device_id is None:
+                raise ValueError("Either 'com_port' or 'device_id' is needed.")
+            port = find_device(self.device_id)
+            if port is None:
+                raise serial.SerialException("Device '"+self.device_id+"' not found.")
+            self.ss_kwargs['com_port'] = port
+        self._open()
+        # Learn the TTL levels and modes that "state" cannot follow from
+        # messages, so they can be put back after reconnecting.
+        self.mcu.reconcile()
+
+        return self.session
+
+    def _open(self):
+        self.session = self.mcu.createSS(**self.ss_kwargs)
+        self.session.open()
+        if self.reader:
+            self.mcu.start_reader()
+
+    def close(self, keep_journal=False):
+        # Closes the port, and the session's journal unless "keep_journal"
+        # (while reconnecting, so the new session goes on logging to it).
+        self.mcu.stop_reader()
+        if self.session is not None:
+            if keep_journal and hasattr(self.session, 'close_port'):
+                self.session.close_port()
+            else:
+                self.session.close()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        # Every other RECORD attribute; methods are wrapped by "call".
+        attr = getattr(self.mcu, name)
+        if not callable(attr):
+            return attr
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def _event(self, event, **details):
+        details.update(time=datetime.datetime.now(), event=event)
+        self.events.append(details)
+        if self.verbose: print("  ", details)
+        if self.on_event is not None:
+            self.on_event(details)
+
+    def _healthy(self):
+        # Whether the port is still usable.
+        if self.session is None or not self.session.is_open:
+            return False
+        if self.mcu._reader is not None and not self.mcu._reader.is_alive():
+            return False
+        try:
+            self.session.in_waiting
+        except (serial.SerialException, OSError):
+            return False
+        return True
+
+    def call(self, name, *args, **kwargs):
+        # Calls RECORD method "name". If the port has gone away, reconnects,
+        # restores the state and sends the call again. A call whose response
+        # never arrived has not changed "state", so it is not applied twice.
+        try:
+            result = getattr(self.mcu, name)(*args, **kwargs)
+            failed = isinstance(result, tuple) and len(result) > 0 and result[0] == -1
+        except Exception as e:
+            if self._healthy():
+                raise
+            failed = True
+            if self.verbose: print("[Error]:", name, e)
+        if not failed or self._healthy():
+            return result
+
+        self.reconnect(reason=name)
+        return getattr(self.mcu, name)(*args, **kwargs)
+
+    def reconnect(self, reason=None):
+        # Reopens the port with exponential backoff, resets the
+        # microcontroller and replays the state. Raises
+        # serial.SerialException if it cannot reconnect within "give_up"
+        # seconds.
+        down = time.time()
+        # createSS starts a new model, and messages of the new session
+        # update it.
+        self.saved = copy.deepcopy(self.mcu.state)
+        self._event('disconnected', reason=reason)
+        self.close_quietly(keep_journal=True)
+        wait = self.backoff
+        while True:
+            time.sleep(wait)
+            try:
+                if self.device_id is not None:
+                    # The port name can change when the board is plugged
+                    # back in.
+                    port = find_device(self.device_id, timeout=1)
+                    if port is not None:
+                        self.ss_kwargs['com_port'] = port
+                self._open()
+                break
+            except (serial.SerialException, OSError) as e:
+                self.close_quietly(keep_journal=True)
+                if time.time() - down > self.give_up:
+                    self._event('gave_up', error=str(e))
+                    raise
+                wait = min(wait * 2, self.max_backoff)
+
+        self.restore(self.saved)
+        self._event('reconnected', port=self.ss_kwargs['com_port'], downtime=time.time() - down)
+
+    def close_quietly(self, keep_journal=False):
+        try:
+            self.close(keep_journal)
+        except Exception:
+            pass
+
+    def restore(self, state=None):
+        # Resets the microcontroller and puts back the state in "state" (a
+        # shadow.DeviceState, by default the one saved when the link went
+        # down). Whatever it does not know (None) is left as the
+        # microcontroller has it.
+        mcu = self.mcu
+        if state is None:
+            state = self.saved if self.saved is not None else mcu.state
+        commands = ['R']
+        lit = [(f, l) for f, l in enumerate(state.lights, 1) if l]
+        if lit:
+            commands.append(RECORD.feeder_command([f for f, l in lit], [l for f, l in lit]))
+        if state.indicator:
+            commands.append('K')
+        mcu.pipeline(commands)
+
+        info = mcu.request_info()
+        if state.exttl is not None and 'exttl' in info and info['exttl'] != state.exttl:
+            mcu.pipeline(['Y'])
+        # Only a TOGGLE mode output stays high, a PULSE is over already.
+        if state.ttl_out is not None and info.get('ttl_mode', state.ttl_mode) == 'TOGGLE':
+            resp = mcu.pipeline(['t'], parsed=True)[0][0]
+            if resp is not None and resp.value != state.ttl_out:
+                mcu.pipeline(['T'])
+        if state.timer:
+            # A timer that is running keeps changing between two readings.
+            first = mcu.pipeline(['W'], parsed=True)[0][0]
+            time.sleep(0.01)
+            second = mcu.pipeline(['W'], parsed=True)[0][0]
+            if first is not None and second is not None and first.ticks == second.ticks:
+                mcu.pipeline(['Q'])
+                self._event('timer_restarted', was_at=(first.sc, first.ms))
@@ -9,12 +9,49 @@ RECORD-lib
 """
 
 import serial
+import threading
 import time
 import datetime
 
+from record_lib.frames import FrameReader
+from record_lib.reader import SerialReader
+from record_lib.response import parse, parse_info
+from record_lib.config import ConfigSession
+from record_lib.shadow import DeviceState
+from record_lib.cmdqueue import CommandQueue, SAFETY
+
+# Make URL handlers in this package (e.g. "recordsim://") available to
+# serial.serial_for_url.
+if 'record_lib' not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append('record_lib')
+
+# Commands whose response is sent before the ACK signal, so the
+# microcontroller is still busy for the TTL length after responding.
+BUSY_AFTER_RESPONSE = b'AQYgr'
+
 class RECORD:
     def __init__(self, **kwargs):
         self.verbose = kwargs.get('verbose', 0)
+        self._reader = None
+        # Held by "pipeline", by the command methods until their delay is
+        # over and while a response is fetched, so commands sent from
+        # different threads (e.g. a background ClockSync) do not interleave
+        # and responses are not taken by the wrong thread.
+        self._cmd_lock = threading.RLock()
+        # Learned command delays (a calibration.DelayCalibrator) used instead
+        # of the fixed ones when enforce_delay is True.
+        self.delays = None
+        # Journal of the serial traffic, kept across sessions created with
+        # createSS (e.g. after reconnecting).
+        self.journal = None
+        # Shadow model of the microcontroller's state, updated from every
+        # message received.
+        self.state = DeviceState()
+        # Every command is written by the queue's writer thread, one whole
+        # command at a time and safety commands first (see cmdqueue.py).
+        self.queue = CommandQueue(self)
+        # Functions called with every message received, see add_listener.
+        self._listeners = []
     
     def createSS(self, **kwargs):
         # Create a serial session tailored to the MSP430-FR2355 microcontroller
@@ -26,24 +63,71 @@ class RECORD:
         # Default values are based on microcontroller settings defined in
         # firmware.
         
-        # Microcontroller information
-        self.ttlin_state = "Unknown"
-        self.ttlout_state = False
+        # Microcontroller information, unknown until it reports it.
+        self.state.clear()
         
         # Make the serial session object and introduce the parameters given by
-        # kwargs or introduce default values.
-        self.session = serial.Serial()
+        # kwargs or introduce default values. Ports given as URLs, such as
+        # "recordsim://" for the simulator, use pyserial's URL handlers.
+        port = kwargs.get("com_port",'COM4')
+        if '://' in port:
+            self.session = serial.serial_for_url(port, do_not_open=True)
+        else:
+            self.session = serial.Serial()
+            self.session.port = port
         
         self.session.baudrate = kwargs.get("baud_rate",9600)
-        self.session.port     = kwargs.get("com_port",'COM4')
         self.session.bytesize = kwargs.get("data_bits",8)
         self.session.parity   = kwargs.get("parity",'N')
         self.session.stopbits = kwargs.get("stop_bits",1)
         self.session.xonxoff  = kwargs.get("flow_ctrl",0)
         self.session.timeout  = kwargs.get("timeout", 1)
         
+        # Log every byte sent and received to a binary journal (see
+        # journal.py). "journal" is True (the default location), the path of
+        # the journal files, a Journal object, or False to turn it off. A
+        # journal created here is closed when the session is closed; one
+        # given as an object is left for the caller to close.
+        journal = kwargs.get("journal", True)
+        if journal:
+            # Imported here, journal.py is also a program (see __init__.py).
+            from record_lib.journal import Journal, JournaledSerial
+            if isinstance(journal, Journal):
+                self.journal = journal
+            elif self.journal is None or self.journal.closed:
+                self.journal = Journal(None if journal is True else journal)
+            self.session = JournaledSerial(self.session, self.journal,
+                                           owned=not isinstance(journal, Journal))
+        
+        # Buffered reader that splits incoming bytes into response messages.
+        self._frames = FrameReader(self.session, on_frame=self._on_frame)
+        
         return self.session
     
+    @staticmethod
+    def feeder_command(fdr, lvl):
+        # Builds the LED command for one feeder, or for several if lists are
+        # given for "fdr" and "lvl", e.g. b'#F1L2 ' or b'#F1L2F3L1 '.
+        if isinstance(fdr, list) and isinstance(lvl, list):
+            command = r'#'
+            for x, y in zip(fdr,lvl):
+                command += fr"F{str(x)}L{str(y)}"
+            command += r' '
+        else:
+            command = '#F'+str(fdr)+'L'+str(lvl)+' '
+        
+        return bytes(command, 'utf-8')
+    
+    @staticmethod
+    def valve_command(vlv):
+        # Returns the command that activates valve "vlv" (1 through 4).
+        switch = {
+            1:b'F',
+            2:b'G',
+            3:b'H',
+            4:b'J'}
+        return switch.get(vlv,b' ')
+    
     def feeder_light(self,fdr,lvl,
                      ttl_length=0.1,
                      enforce_delay=True):
@@ -64,22 +148,11 @@ class RECORD:
         # Returns 0 and the time when the command was sent if no exceptions
         # occur, otherwise returns -1.
         
-        if isinstance(fdr, list) and isinstance(lvl, list):
-            command = r'#'
-            for x, y in zip(fdr,lvl):
-                command += fr"F{str(x)}L{str(y)}"
-            command += r' '
-        else:
-            command = '#F'+str(fdr)+'L'+str(lvl)+' '
-        
-        command = bytes(command, 'utf-8')
+        command = self.feeder_command(fdr, lvl)
         
+        ts = datetime.datetime.now()
         try:
-            self.session.write(command)
-            ts = datetime.datetime.now()
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length + 0.13)
+            ts = self._send(command, self._delay('feeder_light', ttl_length + 0.13), enforce_delay)
             
             return 0, ts
         except:
@@ -107,19 +180,11 @@ class RECORD:
         # Returns 0 and the time when the command was sent if no exceptions
         # occur, otherwise returns -1.
         
-        switch = {
-            1:b'F',
-            2:b'G',
-            3:b'H',
-            4:b'J'}
-        command = switch.get(vlv,b' ')
+        command = self.valve_command(vlv)
         
+        ts = datetime.datetime.now()
         try:
-            self.session.write(command)
-            ts = datetime.datetime.now()
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length + rly_length + 0.12)
+            ts = self._send(command, self._delay('valve_activate', ttl_length + rly_length + 0.12), enforce_delay)
             
             return 0, ts
         except:
@@ -140,12 +205,9 @@ class RECORD:
         # Returns 0 and the time when the command was sent if no exceptions
         # occur, otherwise returns -1.
         
+        ts = datetime.datetime.now()
         try:
-            self.session.write(b'R')
-            ts = datetime.datetime.now()
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length + 0.12)
+            ts = self._send(b'R', self._delay('all_inactive', ttl_length + 0.12), enforce_delay)
                 
             return 0, ts
         except:
@@ -170,12 +232,9 @@ class RECORD:
         # Returns 0 and the time when the command was sent if no exceptions
         # occur, otherwise returns -1.
         
+        ts = datetime.datetime.now()
         try:
-            self.session.write(b'A')
-            ts = datetime.datetime.now()
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length + 0.02)
+            ts = self._send(b'A', self._delay('all_active', ttl_length + 0.02), enforce_delay)
                 
             return 0, ts
         except:
@@ -198,12 +257,9 @@ class RECORD:
         # Returns 0 and the time when the command was sent if no exceptions
         # occur, otherwise returns -1.
         
+        ts = datetime.datetime.now()
         try:
-            self.session.write(b'K')
-            ts = datetime.datetime.now()
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length + 0.1)
+            ts = self._send(b'K', self._delay('indicator_toggle', ttl_length + 0.1), enforce_delay)
                 
             return 0, ts
         except:
@@ -227,12 +283,9 @@ class RECORD:
         # Returns 0 and the time when the command was sent if no exceptions
         # occur, otherwise returns -1.
         
+        ts = datetime.datetime.now()
         try:
-            self.session.write(b'Q')
-            ts = datetime.datetime.now()
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length+0.1)
+            ts = self._send(b'Q', self._delay('timer_start', ttl_length+0.1), enforce_delay)
                 
             return 0, ts
         except:
@@ -255,12 +308,9 @@ class RECORD:
         # Returns 0 and the time when the command was sent if no exceptions
         # occur, otherwise returns -1.
         
+        ts = datetime.datetime.now()
         try:
-            self.session.write(b'W')
-            ts = datetime.datetime.now()
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length)
+            ts = self._send(b'W', self._delay('timer_fetch', ttl_length), enforce_delay)
                 
             return 0, ts
         except:
@@ -283,12 +333,9 @@ class RECORD:
         # Returns 0 and the time when the command was sent if no exceptions
         # occur, otherwise returns -1.
         
+        ts = datetime.datetime.now()
         try:
-            self.session.write(b'E')
-            ts = datetime.datetime.now()
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length+0.12)
+            ts = self._send(b'E', self._delay('timer_stop', ttl_length+0.12), enforce_delay)
                 
             return 0, ts
         except:
@@ -309,12 +356,9 @@ class RECORD:
         # Returns 0 and the time when the command was sent if no exceptions
         # occur, otherwise returns -1.
         
+        ts = datetime.datetime.now()
         try:
-            self.session.write(b'T')
-            ts = datetime.datetime.now()
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length)
+            ts = self._send(b'T', self._delay('output_ttl', ttl_length), enforce_delay)
                 
             return 0, ts
         except:
@@ -327,7 +371,9 @@ class RECORD:
         # servicing on the microcontroller. Incoming TTLs are turned off by
         # default, so the first call to this method will always allow incoming
         # TTLs after the micrcontroller is booted up the first time. This
-        # command is acknowledged with the ACK signal.
+        # command is acknowledged with the ACK signal. The response, which
+        # reports the new state and updates "state", is read here, and as
+        # soon as it arrives instead of after a fixed delay.
         # Arguments:
         #    - ttl_length: The length of the TTL signal sent by the
         #      microcontroller. This can be checked by sending it a '?'. 0.1 is
@@ -335,23 +381,19 @@ class RECORD:
         #    - enforce_delay: Enforces a delay after sending the command to the
         #      microcontroller. This delay is long enough to execute the
         #      command and send a TTL.
-        # Returns 0 and the time when the command was sent if no exceptions
-        # occur, otherwise returns -1.
+        # Returns the new state (True if incoming TTLs are serviced) and the
+        # time when the command was sent if no exceptions occur, otherwise
+        # returns -1.
         
+        ts = datetime.datetime.now()
         try:
-            self.session.write(b'Y')
-            ts = datetime.datetime.now()
-            time.sleep(ttl_length+0.12)
-            resp = self.fetch_response()
-            print(resp)
-            if "on" in resp:
-                self.ttlin_state = True
-            elif "off" in resp:
-                self.ttlin_state = False
-            
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length)
+            with self._cmd_lock:
+                # The ACK signal follows the response, so it is waited for
+                # with enforce_delay.
+                resp, ts, ack = self._pipeline([b'Y'], ttl_length+1,
+                                               ttl_length if enforce_delay else 0, True)[0]
+            if resp is None or resp.kind != 'exttl':
+                print("[Error]: External TTL servicing state not reported.")
                 
             return self.ttlin_state, ts
         except:
@@ -360,15 +402,16 @@ class RECORD:
     def buffer_command(self, command, 
                        ttl_length=0.1,
                        enforce_delay=True):
+        ts = datetime.datetime.now()
         try:
-            self.session.write(bytes(f'*{command} '))
-            ts = datetime.datetime.now()
-            resp = self.fetch_response()
-            print(resp)
-            
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length)
+            with self._cmd_lock:
+                ts = self._write(bytes(f'*{command} '))
+                resp = self.fetch_response()
+                print(resp)
+                
+                if enforce_delay:
+                    # Wait for TTL signal and for the microcontroller to execute command.
+                    time.sleep(ttl_length)
                 
             return self.ttlin_state, ts
         except:
@@ -396,75 +439,349 @@ class RECORD:
         
         cmd = bytes(cmd, 'utf-8')
         
+        ts = datetime.datetime.now()
         try:
-            self.session.write(cmd)
-            ts = datetime.datetime.now()
-            if enforce_delay:
-                # Wait for TTL signal and for the microcontroller to execute command.
-                time.sleep(ttl_length)
+            ts = self._send(cmd, ttl_length, enforce_delay)
                 
             return 0, ts
         except:
             return -1, ts
     
+    def pipeline(self, commands, timeout=1, ttl_length=0.1, parsed=False, priority=None):
+        # Sends a sequence of commands back to back and collects the response
+        # to each one. The microcontroller echoes the command character at
+        # the start of every response (for example "R: ..." or "K: ..."), so
+        # each incoming message is matched to the command waiting on that
+        # character. The next command is written the moment the previous
+        # response is complete, which is when the microcontroller goes back
+        # to waiting for input, instead of after a fixed delay (except for
+        # 'A', 'Q', 'Y', 'g' and 'r', which respond before sending their ACK
+        # signal and are given "ttl_length" more seconds). Commands are
+        # not written all at once because the microcontroller only holds one
+        # received character at a time and ignores anything sent while it is
+        # still executing a command.
+        # Arguments:
+        #    - commands: A list of commands as strings or bytes, for example
+        #      ['R', 'Q', 'K'] or ['R', '#F1L2 '].
+        #    - timeout: The seconds to wait for each response.
+        #    - ttl_length: The TTL length configured on the microcontroller,
+        #      in seconds.
+        #    - parsed: Return each response as an McuResponse (None if it did
+        #      not arrive) instead of text.
+        #    - priority: The command queue priority to write the commands
+        #      with, see cmdqueue.py. Default COMMAND.
+        # Returns a list with one (response, sent, ack) tuple per command: the
+        # response message, the time the command was sent, and the time its
+        # response started arriving. If a response does not arrive in time
+        # its message is "No response message available..." and its ack time
+        # is the time the wait ended.
+        # Messages that do not belong to any of the commands, such as button
+        # presses, are kept and returned by later calls to "fetch_response".
+        
+        with self._cmd_lock:
+            return self._pipeline(commands, timeout, ttl_length, parsed, priority)
+    
+    def _pipeline(self, commands, timeout, ttl_length, parsed, priority=None):
+        results = []
+        unmatched = []
+        for cmd in commands:
+            if isinstance(cmd, str):
+                cmd = bytes(cmd, 'utf-8')
+            echo = cmd[:1]
+            
+            written = self._now()
+            ts = self._write(cmd, priority)
+            
+            start = time.time()
+            response = None
+            while response is None:
+                remaining = timeout - (time.time() - start)
+                frame = self._read_frame(remaining) if remaining > 0 else None
+                if frame is None:
+                    print("[Error]: No response to '"+cmd.decode(errors='replace')+"' after the specified timeout.")
+                    response = None if parsed else "No response message available..."
+                    ack = datetime.datetime.now()
+                    break
+                # Only messages that started arriving after the command was
+                # sent can be its response.
+                elif frame[0][:1] == echo and frame[1] >= written:
+                    if parsed:
+                        response = parse(frame[0], frame[1])
+                    else:
+                        response = frame[0].decode(errors='replace').replace('\r', '').replace('\n', '')
+                    ack = frame[1]
+                    if echo in BUSY_AFTER_RESPONSE:
+                        time.sleep(ttl_length)
+                else:
+                    unmatched.append(frame)
+            
+            if self.verbose: print("  ", response)
+            results.append((response, ts, ack))
+        
+        self._frames.frames.extendleft(reversed(unmatched))
+        
+        return results
+    
+    def safe_state(self, ttl_length=0.1, timeout=0.3, tries=5):
+        # Brings the microcontroller to a safe state as fast as possible, for
+        # a KeyboardInterrupt handler or a "finally" block ending a session:
+        # commands still waiting to be written are dropped, 'R' (lights,
+        # relays and trial indicator off) is written ahead of anything else,
+        # and then 'T' if the output TTL is known to be high in toggle mode.
+        # The microcontroller ignores what it receives while it is busy (a
+        # relay or a TTL signal still on), so each command is written again
+        # until its response arrives, at most "tries" times waiting "timeout"
+        # seconds each.
+        # Returns 0 and the time the answered 'R' was sent, or -1 and the
+        # time of the last attempt if a response never arrived.
+        self.queue.drop()
+        ts = datetime.datetime.now()
+        # Not kept waiting by a command from another thread for longer than
+        # a response would be.
+        locked = self._cmd_lock.acquire(timeout=timeout * tries)
+        try:
+            ts = self._confirm(b'R', timeout, tries, ttl_length)
+            if ts is None:
+                return -1, datetime.datetime.now()
+            # "state" has followed every message up to the 'R' response.
+            if self.state.ttl_out and self.state.ttl_mode == 'TOGGLE':
+                if self._confirm(b'T', timeout, tries, ttl_length) is None:
+                    return -1, ts
+            
+            return 0, ts
+        except:
+            return -1, ts
+        finally:
+            if locked:
+                self._cmd_lock.release()
+    
+    def _confirm(self, command, timeout, tries, ttl_length):
+        # Writes "command" at safety priority until its response arrives, at
+        # most "tries" times. Returns the time the answered write was sent,
+        # or None.
+        for i in range(tries):
+            resp, ts, ack = self._pipeline([command], timeout, ttl_length, True, SAFETY)[0]
+            if resp is not None:
+                return ts
+        
+        return None
+    
     # Utility methods:
+    def _send(self, data, delay, enforce_delay=True):
+        # Writes "data" and, with enforce_delay, waits "delay" seconds for the
+        # microcontroller to execute it. The command lock is held throughout,
+        # so a command from another thread (e.g. ClockSync's 'W') is not
+        # written while the microcontroller is still busy and ignores it.
+        # Returns the time "data" was written.
+        with self._cmd_lock:
+            ts = self._write(data)
+            if enforce_delay:
+                # Wait for TTL signal and for the microcontroller to execute command.
+                time.sleep(delay)
+        
+        return ts
+    
+    def _write(self, data, priority=None):
+        # Writes "data" through the command queue and returns the time it was
+        # written. Waits for the queue, not for the microcontroller.
+        if priority is None:
+            return self.queue.send(data)
+        return self.queue.send(data, priority)
+    
+    def start_reader(self):
+        # Starts a background thread that reads the serial port continuously
+        # and timestamps every message from the microcontroller the moment
+        # its first byte arrives. Once started, "fetch_response" takes
+        # messages from this thread instead of reading the port itself, so
+        # acknowledgement times are accurate even if the response is fetched
+        # long after it arrived. Call after opening the serial session.
+        if self._reader is not None and self._reader.is_alive():
+            return self._reader
+        
+        self._reader = SerialReader(self.session, eol=self._frames.eol, on_frame=self._on_frame)
+        # Hand over any partial message already read from the port.
+        self._reader.feed(self._frames.pending())
+        self._frames.clear_pending()
+        self._reader.start()
+        
+        return self._reader
+    
+    def stop_reader(self):
+        # Stops the background reader thread. Call before closing the serial
+        # session.
+        if self._reader is not None:
+            self._reader.stop()
+            # Keep messages the thread received but nobody has fetched yet.
+            while True:
+                frame = self._reader.get(timeout=0)
+                if frame is None:
+                    break
+                self._frames.frames.append((frame[0], self._reader.to_datetime(frame[1])))
+            # And the start of a message still arriving, e.g. a menu prompt.
+            self._frames.feed(self._reader._parser.pending())
+            self._reader = None
+    
+    def add_listener(self, listener):
+        # Calls "listener" with every message received, as bytes, and the
+        # time it started arriving, as a datetime, e.g. to follow messages
+        # nobody asked for such as external TTLs (see ttlcapture.py).
+        # Listeners are called from whichever thread reads the message (the
+        # background reader once started), so they must return quickly. A
+        # listener returning True takes the message: it is not kept for
+        # "fetch_response" (nor for "pipeline").
+        self._listeners.append(listener)
+    
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def _on_frame(self, frame, ts):
+        # Called with every message received, before it is queued. Returns
+        # True if a listener took it.
+        self.state.feed(frame)
+        taken = False
+        if self._listeners:
+            if not isinstance(ts, datetime.datetime):
+                # A perf_counter_ns() reading of the background reader.
+                ts = self._reader.to_datetime(ts)
+            for listener in list(self._listeners):
+                taken = bool(listener(frame, ts)) or taken
+        
+        return taken
+    
+    def _delay(self, name, default):
+        # The delay enforced after command method "name": the learned one if
+        # a DelayCalibrator has been set and has measured it, otherwise the
+        # fixed default.
+        if self.delays is None:
+            return default
+        return self.delays.delay(name, default)
+    
+    def _now(self):
+        # The current time, on the same clock as the message timestamps.
+        if self._reader is not None:
+            return self._reader.to_datetime(time.perf_counter_ns())
+        return datetime.datetime.now()
+    
+    def _read_frame(self, timeout=1):
+        # Returns the next message as a (bytes, datetime) tuple from whichever
+        # source is active, or None after "timeout" seconds.
+        if self._frames.frames:
+            # Messages read before the background reader was started, or put
+            # back by "pipeline".
+            return self._frames.frames.popleft()
+        elif self._reader is not None:
+            frame = self._reader.get(timeout)
+            if frame is not None:
+                frame = (frame[0], self._reader.to_datetime(frame[1]))
+            return frame
+        else:
+            return self._frames.read_frame(timeout)
+    
     def fetch_response(self, timeout=1, cleanup=True, eol="\r\n\n"):
-        # Returns any bytes available in the serial I/O pipe. This is useful
-        # for retreiving microcontroller responses and using them later. It is
-        # possible that, when a command is issued to the microcontroller and 
-        # no response is retreivd by this method, not enough time has been
-        # given to the microcontroller to respond with a full message. Consider
-        # using delays in-between commands.
-        # Also returns the time at which either bytes were found in the buffer
-        # or when the method timed out.
+        # Returns the next complete message sent by the microcontroller. This
+        # is useful for retreiving microcontroller responses and using them
+        # later. Everything waiting in the serial buffer is read at once and
+        # split into messages on the end-of-line string (eol); any messages or
+        # partial messages read along with this one are kept for the next
+        # call instead of being discarded.
+        # Also returns the time at which the first byte of the message was
+        # received, or the time the method timed out.
         # Parameters:
-        #    1. timeout: The seconds to wait for bytes to be available in the
-        #       buffer. If no bytes are avaiable after timeout, the method will
-        #       return "No response message available...".
-        
-        # Start with an empty response message and byte to not confuse our
-        # while loop.
-        response = ""
-        byte = b''
-        
-        # Take the time when you started this function, will be useful for
-        # implementing a timeout
-        start = time.time()
-        
-        # While the end-of-line string (eol) is not contained in the response
-        # keep reading bytes one by one, decoding them, and adding them to the
-        # response message. If the timeout elapses, break the loop and let the
-        # user know there was nothing in the buffer.
-        while not eol in response:
-            if (time.time() - start >= timeout):
-                print("[Error]: No bytes found in the serial buffer after the specified timeout.")
-                response = "No response message available..."
-                ts = datetime.datetime.now()
-                break
-            byte = self.session.read(1)
-            # Receiving the ':' character indicates the closest time at which
-            # the micrcontroller executed the command, so save this time.
-            if byte == b':':
-                ts = datetime.datetime.now()
-            response += byte.decode()
-        
-        if cleanup:
-            response = response.replace('\n', '')
-            response = response.replace('\r', '')
-        # Precautionary measure to clear the buffer from any stray characters
-        # possibly left from the process above.
-        self.session.flushOutput()
+        #    1. timeout: The seconds to wait for a complete message to be
+        #       available in the buffer. If no message is avaiable after
+        #       timeout, the method will return "No response message
+        #       available...".
+        
+        self._frames.eol = bytes(eol, 'utf-8')
+        # Not while "pipeline" is matching responses in another thread.
+        with self._cmd_lock:
+            frame = self._read_frame(timeout)
+        
+        if frame is None:
+            print("[Error]: No bytes found in the serial buffer after the specified timeout.")
+            response = "No response message available..."
+            ts = datetime.datetime.now()
+        else:
+            data, ts = frame
+            response = data.decode(errors='replace')
+            if cleanup:
+                response = response.replace('\n', '')
+                response = response.replace('\r', '')
+            else:
+                response += eol
         
         if self.verbose: print("  ", response)
         
         return response, ts
     
+    def fetch_parsed(self, timeout=1):
+        # Like "fetch_response", but returns the message as an McuResponse,
+        # with the command it answers, what it reports and the
+        # microcontroller's timestamp already parsed. Returns None if no
+        # message arrives within "timeout" seconds.
+        with self._cmd_lock:
+            frame = self._read_frame(timeout)
+        
+        if frame is None:
+            print("[Error]: No bytes found in the serial buffer after the specified timeout.")
+            return None
+        
+        response = parse(*frame)
+        if self.verbose: print("  ", response.message)
+        
+        return response
+    
+    def request_info(self, timeout=2):
+        # Sends '?' and returns the device information the microcontroller
+        # reports (device ID, firmware version, TTL length, relay active time,
+        # CCR values...) as a dictionary, see response.parse_info. The
+        # firmware then waits for a key before going back to normal
+        # operation, so Enter is sent to skip the long help text. Returns an
+        # empty dictionary if the information does not arrive in time.
+        with self._cmd_lock:
+            written = self._now()
+            self._write(b'?')
+            info = {}
+            unmatched = []
+            start = time.time()
+            while time.time() - start < timeout:
+                frame = self._read_frame(timeout - (time.time() - start))
+                if frame is None:
+                    break
+                if frame[1] < written:
+                    unmatched.append(frame)
+                elif b'Device ID:' in frame[0]:
+                    info = parse_info(frame[0])
+                    self.state.update_info(info)
+                elif frame[0].startswith(b'For additional help'):
+                    break
+                else:
+                    unmatched.append(frame)
+            # Leave the information prompt, even if the prompt was missed.
+            self._write(b'\r')
+            start = time.time()
+            while time.time() - start < timeout:
+                frame = self._read_frame(timeout - (time.time() - start))
+                if frame is None or frame[0].startswith(b'?:'):
+                    break
+                unmatched.append(frame)
+            # Keep messages that were not part of the information, such as
+            # button presses, for "fetch_response".
+            self._frames.frames.extendleft(reversed(unmatched))
+        
+        if self.verbose: print("  ", info)
+        
+        return info
+    
     def feeder_reconfig(self,fdr,lvl,val,
                         test_new=True,
                         firm_version="2.1.1+"):
         # A scripted reconfiguration of any one particular feeder light at some
         # indicated level. This can be useful for reconfiguring things quickly
-        # without the need to manually connect to the serial interface.
+        # without the need to manually connect to the serial interface. Every
+        # key is sent as soon as the microcontroller prompts for it, see
+        # config.ConfigSession.
         # Arguments:
         #   - fdr: The feeder to be reconfigured (1, 2, 3, or 4).
         #   - lvl: The level to modify (1, 2, or 3).
@@ -473,51 +790,28 @@ class RECORD:
         #     number between 0 and 8000).
         #   - test_new: Whether or not all the cost lights should turn on using
         #     the new configured value (True or False)
+        # Returns 0 if the microcontroller confirmed the new value, otherwise
+        # returns 1.
         
         # Preprocess and validate inputs.
-        if fdr in range(1, 4, 1):
-            fdr = str(fdr)
-        else:
+        if fdr not in range(1, 5, 1):
             print("'fdr' must be either 1, 2, 3, or 4.")
             return 1
         
-        if lvl in range(1, 3, 1):
-            lvl = str(lvl)
-        else:
+        if lvl not in range(1, 4, 1):
             print("'lvl' must be either 1, 2, or 3.")
             return 1
         
-        if val in range(-1, 8001, 1):
-            val = str(val)+'\r'
-        else:
+        if val not in range(0, 8001, 1):
             print("'val' must be a whole number between 0 and 8000.")
             return 1
         
-        # How to script reconfiguration of feeders:        
-        self.send_cmd('$',enforce_delay=False)
-        time.sleep(0.5)
-        if firm_version == "2.1.1+":
-            # Firmware v2.1.1 introduced configuration of relay active time and
-            # ttl length, this modified the microcontroller's configuration
-            # mode to have a menu at the time it is called, thus we select the
-            # correct item here.
-            self.send_cmd('A',enforce_delay=False)
-            time.sleep(0.15)
-        self.send_cmd(lvl,enforce_delay=False)
-        time.sleep(0.15)
-        self.send_cmd(fdr,enforce_delay=False)
-        time.sleep(0.3)
-        self.send_cmd(val,enforce_delay=False)
-        time.sleep(0.15)
-        
-        if test_new:
-            self.send_cmd('y',enforce_delay=False)
-        else:
-            self.send_cmd('n',enforce_delay=False)
-        time.sleep(0.15)
-        #print(self.fetch_response())
+        # Firmware v2.1.1 introduced configuration of relay active time and
+        # ttl length, this modified the microcontroller's configuration mode
+        # to have a menu at the time it is called.
+        config = ConfigSession(self, menu=(firm_version == "2.1.1+"), verbose=self.verbose)
         
-        return 0
+        return 0 if config.feeder(fdr, lvl, val, test_new) else 1
     
     def valve_reconfig(self,val):
         # A scripted reconfiguration of all valves connected to the system.
@@ -529,24 +823,17 @@ class RECORD:
         #   - val: The new value to be written to memory, corresponds to the
         #     amount of milliseconds to keep a valve open to deliver food.
         #     Maximum of 9999 milliseconds (9.999 seconds).
+        # Returns 0 if the microcontroller confirmed the new value, otherwise
+        # returns 1.
         
         # Preprocess and validate inputs.
-        if val in range(-1, 10000, 1):
-            val = str(val)+'\r'
-        else:
+        if val not in range(0, 10000, 1):
             print("'val' must not exceed 9999 milliseconds.")
             return 1
         
-        # How to script reconfiguration of feeders:        
-        self.send_cmd('$',enforce_delay=False)
-        time.sleep(0.5)
-        self.send_cmd('B',enforce_delay=False)
-        time.sleep(0.15)
-        self.send_cmd(val,enforce_delay=False)
-        time.sleep(0.15)
-        #print(self.fetch_response())
+        config = ConfigSession(self, verbose=self.verbose)
         
-        return 0
+        return 0 if config.relay_ontime(val) else 1
     
     def ttl_length_reconfig(self,val):
         # A scripted reconfiguration of all ttls coming in and out of the
@@ -559,24 +846,17 @@ class RECORD:
         #   - val: The new value to be written to memory, corresponds to the
         #     amount of milliseconds to keep a ttl signal on.
         #     Maximum of 9999 milliseconds (9.999 seconds).
+        # Returns 0 if the microcontroller confirmed the new value, otherwise
+        # returns 1.
         
         # Preprocess and validate inputs.
-        if val in range(-1, 10000, 1):
-            val = str(val)+'\r'
-        else:
+        if val not in range(0, 10000, 1):
             print("'val' must not exceed 9999 milliseconds.")
             return 1
         
-        # How to script reconfiguration of feeders:        
-        self.send_cmd('$',enforce_delay=False)
-        time.sleep(0.5)
-        self.send_cmd('C',enforce_delay=False)
-        time.sleep(0.15)
-        self.send_cmd(val,enforce_delay=False)
-        time.sleep(0.15)
-        #print(self.fetch_response())
+        config = ConfigSession(self, verbose=self.verbose)
         
-        return 0
+        return 0 if config.ttl_length(val) else 1
     
     def ttl_mode_reconfig(self,mode):
         # A scripted reconfiguration of the operation mode of outgoing TTLs.
@@ -591,45 +871,89 @@ class RECORD:
         #        2: PULSE mode, upon request TTL will pulse on for the length
         #           indicated by TTL_LENGTH.
         #        3: OFF mode, outgoing TTL requests are not serviced.
+        # Returns 0 if the microcontroller confirmed the new mode, otherwise
+        # returns 1.
         
         # Preprocess and validate inputs.
-        if mode in range(0, 4):
-            mode = str(mode)+'\r'
-        else:
+        if mode not in range(1, 4):
             print("'mode' must be 1, 2, or 3.")
             return 1
         
-        # How to script reconfiguration of feeders:        
-        self.send_cmd('$',enforce_delay=False)
-        time.sleep(0.5)
-        self.send_cmd('D',enforce_delay=False)
-        time.sleep(0.15)
-        self.send_cmd(mode,enforce_delay=False)
-        time.sleep(0.15)
-        #print(self.fetch_response())
+        config = ConfigSession(self, verbose=self.verbose)
         
-        return 0
+        return 0 if config.ttl_mode(mode) else 1
+    
+    def apply_profile(self, profile, only_changed=True):
+        # Applies a whole configuration profile (CCR values of every feeder
+        # and level, relay active time, TTL length and TTL mode) from a
+        # dictionary or JSON file, skipping settings the microcontroller
+        # already has. See config.ConfigSession.apply_profile.
+        # Returns a dictionary with the settings that could not be applied,
+        # empty if the whole profile is in place.
+        config = ConfigSession(self, verbose=self.verbose)
+        
+        return config.apply_profile(profile, only_changed)
     
-    def request_ttl_state(self):
+    def request_ttl_state(self, max_age=0, timeout=1):
         # Requests the TTL state by sending the 't' command. Response is then
         # parsed and the state is reported either True for HIGH or False for 
-        # LOW.
+        # LOW. The response is told from the replies other commands left
+        # unread by its echo and arrival time, and waited for in full, so
+        # the microcontroller is ready for the next command on return.
+        # Arguments:
+        #    - max_age: Return the level in "state" instead, without asking
+        #      the microcontroller, if it is known and the state was
+        #      reconciled less than "max_age" seconds ago. None accepts any
+        #      known level. With the default 0 the microcontroller is always
+        #      asked.
+        #    - timeout: Seconds to wait for the response. Default 1.
+        if self.state.ttl_out is not None and max_age != 0:
+            age = self.state.age()
+            if max_age is None or (age is not None and age < max_age):
+                return self.state.ttl_out, datetime.datetime.now()
+        
+        ts = datetime.datetime.now()
         try:
-            self.session.write(b't')
-            ts = datetime.datetime.now()
-            resp, _ = self.fetch_response()
-            # Precautionary measure to clear the buffer from any stray characters
-            self.session.flushOutput()
-            if resp.split('is ',1)[1] == 'HIGH':
-                return True, ts
-            elif resp.split('is ',1)[1] == 'LOW':
-                return False, ts
-            else:
+            with self._cmd_lock:
+                resp, ts, ack = self._pipeline([b't'], timeout, 0, True)[0]
+            if resp is None or resp.kind != 'ttl_state':
                 return None, ts
             
+            return resp.value, ts
+            
         except Exception as e:
             print(e)
             return -1, ts
+    
+    def reconcile(self):
+        # Checks the shadow model ("state") against the microcontroller. The
+        # device information ('?') reports external TTL servicing and the TTL
+        # mode, and 't' the output TTL level; the light levels, the trial
+        # indicator and the timer cannot be asked for and stay as followed
+        # from the messages received. Returns "state".
+        self.request_info()
+        self.pipeline(['t'])
+        self.state.reconciled = time.time()
+        
+        return self.state
+    
+    @property
+    def ttlin_state(self):
+        # Whether incoming TTLs are serviced, or "Unknown".
+        return "Unknown" if self.state.exttl is None else self.state.exttl
+    
+    @ttlin_state.setter
+    def ttlin_state(self, value):
+        self.state.exttl = value if isinstance(value, bool) else None
+    
+    @property
+    def ttlout_state(self):
+        # The output TTL level, True for HIGH (False while unknown).
+        return bool(self.state.ttl_out)
+    
+    @ttlout_state.setter
+    def ttlout_state(self, value):
+        self.state.ttl_out = value
         
 if __name__ == "__main__":
     
@@ -0,0 +1,487 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Replays a recorded RECORD session. A recording is turned into a timeline of
+steps (when each command was sent, the messages it got back and how long they
+took) and the commands are sent again to the simulator or a real
+microcontroller, either at the original pace (or "speed" times faster) or as
+fast as the microcontroller can take them. Every difference in the messages
+received and every latency that changed by more than "timing_tolerance"
+seconds is reported as a divergence, so changes to record_lib, the firmware
+or a trial script can be checked against a known-good session without an
+arena.
+
+Recordings can be:
+    - Serial journals written by RECORD (see journal.py), which have every
+      byte sent and received and when.
+    - Output logs of the batch scripts ("Log Files/<device>_output.log"),
+      which only have the messages received. Commands are worked out from
+      the messages and assumed to be "interval" seconds apart, as sent by
+      system_check.bat.
+    - Event logs of the MATLAB app ("<device>_eventlog.log"), which only
+      have the commands sent and when.
+
+    python -m record_lib.replay ~/.record_lib/journals/record_... --speed 10
+    python -m record_lib.replay FR2355_Dev_eventlog.log --port COM4 --speed 1
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from record_lib.journal import read_journal, SENT
+from record_lib.record import RECORD, BUSY_AFTER_RESPONSE
+
+EOL = b"\r\n\n"
+
+class Step:
+    # One command of a recording.
+    #    - t: Seconds from the start of the recording it was sent.
+    #    - command: The bytes sent.
+    #    - responses: Messages received for it (bytes, without terminator),
+    #      or None if the recording has no responses.
+    #    - prompt: Bytes received after the last complete message, such as
+    #      a menu prompt waiting for the next key.
+    #    - latency: Seconds from sending it to its last message (or prompt)
+    #      being complete, or None if unknown.
+    #    - echo: Whether the microcontroller answers it with a message
+    #      echoing it. Keys sent in a menu are not echoed.
+    __slots__ = ('t', 'command', 'responses', 'prompt', 'latency', 'echo')
+
+    def __init__(self, t, command, responses=None, prompt=b'', latency=None, echo=None):
+        self.t = t
+        self.command = command
+        self.responses = responses
+        self.prompt = prompt
+        self.latency = latency
+        self.echo = _echoes(command) if echo is None else echo
+
+    def __repr__(self):
+        return ("Step(t=%r, command=%r, responses=%r, latency=%r)"
+                % (self.t, self.command, self.responses, self.latency))
+
+def _is_event(frame):
+    # Button presses and external TTLs are not answers to commands.
+    return frame[:1] == b' ' and not frame.startswith(b' Entering')
+
+# Commands that enter a menu, answered with " Entering ... mode".
+MENUS = (b'$', b'%')
+
+def _echoes(command):
+    # Whether the microcontroller answers the command with a message
+    # starting with its first byte. Enter and spaces (menu keys, the end of
+    # an LED command) are not echoed.
+    return bool(command[:1].strip())
+
+def _answers(frame, command):
+    # Whether the message is the one echoing the command.
+    if frame.startswith(b' Entering'):
+        return command[:1] in MENUS
+    return frame[:1] == command[:1]
+
+def load_journal(path):
+    # Builds the steps of a serial journal. A message belongs to the latest
+    # command sent before it started arriving. Messages are read late as
+    # often as not, though (the command methods leave them for
+    # fetch_response), so one that does not echo that command goes to the
+    # latest earlier command it echoes that has no echo yet, as in
+    # RECORD._pipeline. Messages that echo nothing sent (the device
+    # information after '?', the menus) stay with the latest command, and
+    # keys sent in a menu echo nothing.
+    # A step's prompt is what was left incomplete
+    # when the next command was sent. Its latency is only known if its
+    # messages were read before the next command was sent.
+    records, payload = read_journal(path)
+    steps = []
+    sent = []       # Time every step was sent
+    last = []       # Time every step last received something it kept
+    late = []       # Whether it received something after the next step was sent
+    buffer = bytearray()
+    arrived = []    # [Time, bytes] of the chunks still in "buffer"
+    menu = False    # Whether the microcontroller is in a menu
+    t0 = None
+    for i in range(len(records)):
+        start = int(records['offset'][i])
+        data = payload[start:start + int(records['length'][i])].tobytes()
+        t = int(records['host_ns'][i]) / 1e9
+        if records['direction'][i] == SENT:
+            if t0 is None:
+                t0 = t
+                buffer.clear()
+                arrived.clear()
+            if steps:
+                steps[-1].prompt = bytes(buffer)
+            steps.append(Step(t - t0, data, [], echo=False if menu else None))
+            sent.append(t)
+            last.append(None)
+            late.append(False)
+            continue
+        if not steps or not data:
+            continue
+        buffer += data
+        arrived.append([t, len(data)])
+        while True:
+            end = buffer.find(EOL)
+            if end < 0:
+                break
+            frame = bytes(buffer[:end])
+            begun = arrived[0][0]
+            del buffer[:end + len(EOL)]
+            used = end + len(EOL)
+            while used:
+                take = min(used, arrived[0][1])
+                arrived[0][1] -= take
+                used -= take
+                if not arrived[0][1]:
+                    arrived.pop(0)
+            if _is_event(frame):
+                continue
+            before = [k for k in range(len(steps)) if sent[k] <= begun] or [0]
+            owner = before[-1]
+            if steps[owner].echo and not _answers(frame, steps[owner].command):
+                owner = next((k for k in reversed(before) if steps[k].echo and _answers(frame, steps[k].command)
+                              and not any(r[:1] == frame[:1] for r in steps[k].responses)), owner)
+            steps[owner].responses.append(frame)
+            if frame.startswith(b' Entering'):
+                menu = True
+                for step in steps[owner + 1:]:
+                    step.echo = False
+            elif frame[:1] in MENUS:
+                menu = False
+            last[owner] = t
+            late[owner] |= owner < len(steps) - 1
+        if buffer:
+            last[-1] = t
+    if steps:
+        steps[-1].prompt = bytes(buffer)
+    for step, when, final, read_late in zip(steps, sent, last, late):
+        if final is not None and not read_late:
+            step.latency = final - when
+
+    return steps
+
+_OUTPUT_HEADER = re.compile(r'^(\d{1,2}:\d{2}:\d{2}\.\d+)\s*$')
+_OUTPUT_DATE = re.compile(r'^(\d{2}-[A-Za-z]{3}-\d{2})\s*$')
+_OUTPUT_RESPONSE = re.compile(r'^(\S): ')
+_OUTPUT_LED = re.compile(r'^(?:> )?F?(\d)L(\d)\s*$')
+
+def load_output_log(path, interval=2.0):
+    # Builds the steps of a batch script output log. Every block starts at
+    # the time and date in its header, and its commands are "interval"
+    # seconds apart. The LED command of a '#' message is taken from the
+    # "F1L3"-style line next to it.
+    with open(path, 'rb') as f:
+        lines = f.read().decode(errors='replace').replace('\r', '').split('\n')
+    # Messages are separated by empty lines.
+    lines = [line for line in lines if line.strip()]
+    steps = []
+    t0 = None
+    block = None
+    when = None
+    used = set()
+    for n, line in enumerate(lines):
+        match = _OUTPUT_HEADER.match(line)
+        if match:
+            when = match.group(1)
+            continue
+        match = _OUTPUT_DATE.match(line)
+        if match and when is not None:
+            block = datetime.datetime.strptime(match.group(1) + " " + when[:15], "%d-%b-%y %H:%M:%S.%f")
+            if t0 is None:
+                t0 = block
+            count = 0
+            when = None
+            continue
+        match = _OUTPUT_RESPONSE.match(line)
+        if not match or block is None:
+            continue
+        command = match.group(1).encode()
+        if command == b'#':
+            led = None
+            for m in (n - 1, n + 1):
+                if 0 <= m < len(lines) and m not in used and _OUTPUT_LED.match(lines[m]):
+                    led = _OUTPUT_LED.match(lines[m])
+                    used.add(m)
+                    break
+            if led is None:
+                continue
+            command = ('#F' + led.group(1) + 'L' + led.group(2) + ' ').encode()
+        t = (block - t0).total_seconds() + count * interval
+        steps.append(Step(t, command, [line.rstrip().encode()]))
+        count += 1
+
+    return steps
+
+_EVENT_DATE = re.compile(r'^(\d{2}-\d{2}-\d{2})\s*$')
+_EVENT_COMMAND = re.compile(r'^(\d{1,2}):(\d{2}):(\d{2}(?:\.\d+)?) - SENDING COMMAND "([^"]*)"')
+
+def load_event_log(path):
+    # Builds the steps of a MATLAB app event log. It has no responses.
+    with open(path, 'rb') as f:
+        lines = f.read().decode(errors='replace').replace('\r', '').split('\n')
+    steps = []
+    t0 = None
+    day = None
+    for line in lines:
+        match = _EVENT_DATE.match(line)
+        if match:
+            day = datetime.datetime.strptime(match.group(1), "%d-%m-%y")
+            continue
+        match = _EVENT_COMMAND.match(line)
+        if not match or day is None:
+            continue
+        h, m, s, command = match.groups()
+        when = day + datetime.timedelta(hours=int(h), minutes=int(m), seconds=float(s))
+        if t0 is None:
+            t0 = when
+        command = command.encode()
+        if command[:1] == b'#' and command[-1:] not in (b' ', b'\r'):
+            # The LED command is finished with a space or Enter.
+            command += b' '
+        steps.append(Step((when - t0).total_seconds(), command))
+
+    return steps
+
+def load(path, **kwargs):
+    # Loads any recording, telling them apart by their contents.
+    if os.path.exists(os.path.expanduser(path) + '.idx'):
+        return load_journal(path)
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+    if b'SENDING COMMAND' in head or b'LOG CREATED' in head:
+        return load_event_log(path)
+    return load_output_log(path, **kwargs)
+
+class Replayer:
+    def __init__(self, mcu, steps, **kwargs):
+        # Arguments:
+        #    - mcu: A RECORD object with an open serial session. Its
+        #      background reader is paused during the replay, the replay
+        #      reads the port itself.
+        #    - steps: The steps to replay, or the path to a recording.
+        #    - speed: How many times faster than recorded to send the
+        #      commands, or None to send each one as soon as the
+        #      microcontroller is ready. Default None.
+        #    - max_gap: Longest pause between two commands in seconds, so
+        #      recordings spanning several sessions do not replay their
+        #      breaks. Default 10.
+        #    - timeout: Seconds to wait for the responses of every command.
+        #      Default 2.
+        #    - ttl_length: The TTL length configured on the microcontroller,
+        #      in seconds. Default 0.1.
+        #    - timing_tolerance: Seconds a latency can change by without
+        #      being reported. Default 0.05.
+        #    - compare_timestamps: Also compare the microcontroller's "at
+        #      sc.ms" timestamps, which only match if the timer was started
+        #      at the same point. Default False, messages are compared
+        #      without them.
+        self.mcu = mcu
+        self.steps = load(steps) if isinstance(steps, str) else steps
+        self.verbose = kwargs.get('verbose', 0)
+        self.speed = kwargs.get('speed', None)
+        self.max_gap = kwargs.get('max_gap', 10)
+        self.timeout = kwargs.get('timeout', 2)
+        self.ttl_length = kwargs.get('ttl_length', 0.1)
+        self.timing_tolerance = kwargs.get('timing_tolerance', 0.05)
+        self.compare_timestamps = kwargs.get('compare_timestamps', False)
+        self.results = []       # Per step: (t, latency, responses, prompt)
+        self.divergences = []
+        self.duration = None
+
+    def _timeline(self):
+        # Time of every step from the start of the recording, with breaks
+        # longer than "max_gap" shortened.
+        times = np.array([step.t for step in self.steps], dtype=float)
+        gaps = np.clip(np.diff(times, prepend=times[:1]), 0, self.max_gap)
+
+        return np.cumsum(gaps)
+
+    def _done(self, step, responses, buffer):
+        # Whether everything the step should get back has arrived.
+        if step.responses is None or (not step.responses and step.echo):
+            # Nothing recorded: wait for the message echoing the command,
+            # the microcontroller is busy until it has sent it.
+            return any(_answers(r, step.command) for r in responses)
+        if len(responses) < len(step.responses):
+            return False
+        return not step.prompt or bytes(buffer).endswith(step.prompt[-2:])
+
+    def run(self):
+        # Replays every step. Returns the divergences found.
+        mcu = self.mcu
+        session = mcu.session
+        # Commands from other threads (e.g. a ClockSync) wait until the
+        # replay is over, its responses are read here.
+        mcu._cmd_lock.acquire()
+        reader = mcu._reader is not None
+        if reader:
+            mcu.stop_reader()
+        self.results = []
+        self.divergences = []
+        schedule = self._timeline() / self.speed if self.speed else None
+        buffer = bytearray()
+        try:
+            session.reset_input_buffer()
+            start = time.perf_counter()
+            ready = start
+            for i, step in enumerate(self.steps):
+                send_at = ready if schedule is None else max(ready, start + schedule[i])
+                time.sleep(max(0, send_at - time.perf_counter()))
+                # Through the command queue, like every other command.
+                mcu._write(step.command)
+                sent = time.perf_counter()
+                responses = []
+                last = None
+                while time.perf_counter() - sent < self.timeout and not self._done(step, responses, buffer):
+                    data = session.read(max(1, session.in_waiting))
+                    if not data:
+                        continue
+                    now = time.perf_counter()
+                    buffer += data
+                    while True:
+                        end = buffer.find(EOL)
+                        if end < 0:
+                            break
+                        frame = bytes(buffer[:end])
+                        del buffer[:end + len(EOL)]
+                        if not _is_event(frame):
+                            responses.append(frame)
+                            last = now
+                    if buffer:
+                        last = now
+                latency = None if last is None else last - sent
+                prompt = bytes(buffer)
+                self.results.append((sent - start, latency, responses, prompt))
+                self._compare(i, step, latency, responses, prompt)
+                if self.verbose: print("  ", step.command, responses, latency)
+
+                ready = time.perf_counter()
+                if responses and responses[-1][:1] in BUSY_AFTER_RESPONSE:
+                    # Still sending its ACK signal.
+                    ready += self.ttl_length
+            self.duration = time.perf_counter() - start
+        finally:
+            # Messages read here were not followed by the shadow model.
+            mcu.state.clear()
+            if reader:
+                mcu.start_reader()
+            mcu._cmd_lock.release()
+
+        return self.divergences
+
+    def _normalize(self, frame):
+        if self.compare_timestamps:
+            return frame
+        # Older firmware did not add the timestamp at all.
+        return re.sub(rb' at \d+\.\d+', b'', frame)
+
+    def _diverge(self, i, step, kind, expected, actual):
+        self.divergences.append({'step'     : i,
+                                 'command'  : step.command.decode(errors='replace'),
+                                 'type'     : kind,
+                                 'expected' : expected,
+                                 'actual'   : actual})
+
+    def _compare(self, i, step, latency, responses, prompt):
+        # A command that is answered but got nothing in the recording had
+        # its messages left unread when the recording ended.
+        if step.responses is not None and (step.responses or not step.echo):
+            for expected, actual in zip(step.responses, responses):
+                if self._normalize(expected) != self._normalize(actual):
+                    self._diverge(i, step, 'response', expected.decode(errors='replace'), actual.decode(errors='replace'))
+            for expected in step.responses[len(responses):]:
+                self._diverge(i, step, 'missing', expected.decode(errors='replace'), None)
+            for actual in responses[len(step.responses):]:
+                self._diverge(i, step, 'extra', None, actual.decode(errors='replace'))
+            if step.prompt != prompt:
+                self._diverge(i, step, 'prompt', step.prompt.decode(errors='replace'), prompt.decode(errors='replace'))
+        elif not responses:
+            self._diverge(i, step, 'missing', None, None)
+        if step.latency is not None and latency is not None and abs(latency - step.latency) > self.timing_tolerance:
+            self._diverge(i, step, 'timing', step.latency, latency)
+
+    def summary(self):
+        # Returns a dictionary with the number of steps, divergences of
+        # every type, how long the recording (with breaks shortened to
+        # "max_gap") and the replay took and the change in latency (replayed
+        # minus recorded, milliseconds).
+        types = {}
+        for d in self.divergences:
+            types[d['type']] = types.get(d['type'], 0) + 1
+        recorded = float(self._timeline()[-1]) if self.steps else 0
+        summary = {'steps'       : len(self.steps),
+                   'divergences' : types,
+                   'recorded_s'  : recorded,
+                   'replayed_s'  : self.duration,
+                   'speedup'     : recorded / self.duration if self.duration else None}
+        diffs = [(latency - step.latency) * 1000
+                 for step, (t, latency, responses, prompt) in zip(self.steps, self.results)
+                 if step.latency is not None and latency is not None]
+        if diffs:
+            summary['latency_change_ms'] = {'mean' : float(np.mean(diffs)),
+                                            'p5'   : float(np.percentile(diffs, 5)),
+                                            'p95'  : float(np.percentile(diffs, 95))}
+
+        return summary
+
+    def report(self, limit=20):
+        # Returns the summary and the first "limit" divergences as text.
+        summary = self.summary()
+        lines = [str(summary['steps']) + " steps replayed in " + format(summary['replayed_s'] or 0, '.2f')
+                 + " s (recorded over " + format(summary['recorded_s'], '.2f') + " s)"]
+        if 'latency_change_ms' in summary:
+            change = summary['latency_change_ms']
+            lines.append("   latency change: mean " + format(change['mean'], '+.1f') + " ms, p5 "
+                         + format(change['p5'], '+.1f') + " ms, p95 " + format(change['p95'], '+.1f') + " ms")
+        if not self.divergences:
+            lines.append("   no divergences")
+        for kind, count in summary['divergences'].items():
+            lines.append("   " + kind + ": " + str(count))
+        for d in self.divergences[:limit]:
+            lines.append("   [" + str(d['step']) + "] " + repr(d['command']) + " " + d['type'] + ": expected "
+                         + repr(d['expected']) + ", got " + repr(d['actual']))
+
+        return "\n".join(lines)
+
+    def save_json(self, path):
+        # Writes the summary and every divergence.
+        with open(path, 'w') as f:
+            json.dump({'summary': self.summary(), 'divergences': self.divergences}, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded RECORD session.")
+    parser.add_argument('recording', help="Serial journal (without extension), output log or event log")
+    parser.add_argument('--port', default="recordsim://", help="Serial port or URL, e.g. COM4 or recordsim://")
+    parser.add_argument('--baud-rate', type=int, default=9600)
+    parser.add_argument('--speed', default='fast', help="Times faster than recorded, or 'fast' for as fast as possible")
+    parser.add_argument('--max-gap', type=float, default=10)
+    parser.add_argument('--ttl-length', type=float, default=0.1, help="TTL length configured on the microcontroller, in seconds")
+    parser.add_argument('--tolerance', type=float, default=0.05, help="Latency change reported, in seconds")
+    parser.add_argument('--json', help="Save the summary and divergences to this JSON file")
+    args = parser.parse_args()
+
+    mcu = RECORD()
+    session = mcu.createSS(com_port=args.port, baud_rate=args.baud_rate, timeout=0.05, journal=False)
+    session.open()
+    replayer = Replayer(mcu, args.recording,
+                        speed=None if args.speed == 'fast' else float(args.speed),
+                        max_gap=args.max_gap, ttl_length=args.ttl_length,
+                        timing_tolerance=args.tolerance)
+    try:
+        replayer.run()
+    finally:
+        session.close()
+
+    print(replayer.report())
+    if args.json:
+        replayer.save_json(args.json)
+    if replayer.divergences:
+        raise SystemExit(1)
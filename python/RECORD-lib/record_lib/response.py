@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Parsed microcontroller responses. Every message the RECORD firmware sends
+starts with the character of the command it answers (or a space for events
+such as button presses), so the message is parsed with one precompiled
+pattern picked by that character instead of repeated string splitting. The
+timestamp the firmware appends as "sc.ms" is kept as two integers.
+"""
+
+import datetime
+import re
+
+class McuResponse:
+    # A single message from the microcontroller.
+    #    - command: The command character the message answers, e.g. 'K', or
+    #      None for unsolicited messages.
+    #    - kind: What the message reports, see KINDS.
+    #    - sc, ms: The microcontroller's timer when the command was received,
+    #      None if the message does not include it.
+    #    - value: Anything else the message reports, e.g. True/False for the
+    #      TTL state or the trial indicator, the relay number, or the LED
+    #      command for feeder messages.
+    #    - host_ns: Host time the message started arriving, in nanoseconds
+    #      since the epoch.
+    #    - raw: The message as received, without its terminator.
+    __slots__ = ('command', 'kind', 'sc', 'ms', 'value', 'host_ns', 'raw')
+
+    def __init__(self, command, kind, sc=None, ms=None, value=None, host_ns=None, raw=b''):
+        self.command = command
+        self.kind = kind
+        self.sc = sc
+        self.ms = ms
+        self.value = value
+        self.host_ns = host_ns
+        self.raw = raw
+
+    @property
+    def message(self):
+        # The message as text, the way fetch_response returns it.
+        return self.raw.decode(errors='replace').replace('\r', '').replace('\n', '')
+
+    @property
+    def ticks(self):
+        # The microcontroller timestamp as a single count of timer ticks
+        # ("ms" rolls over into "sc" after 999 ticks), or None.
+        if self.sc is None:
+            return None
+        return self.sc * 999 + self.ms
+
+    @property
+    def host_time(self):
+        # Host time the message started arriving, as a datetime.
+        if self.host_ns is None:
+            return None
+        return datetime.datetime.fromtimestamp(self.host_ns / 1e9)
+
+    def __repr__(self):
+        return ("McuResponse(command=%r, kind=%r, sc=%r, ms=%r, value=%r)"
+                % (self.command, self.kind, self.sc, self.ms, self.value))
+
+# Every message format, keyed by its first byte. Each entry is a list of
+# (pattern, kind, value) tuples tried in order, where "value" is a function
+# of the match giving the response value, or None. Patterns with "sc" and
+# "ms" groups capture the timestamp.
+_TS = rb' at (?P<sc>\d+)\.(?P<ms>\d+)'
+_FORMATS = {
+    b'#': [(rb'#(?P<value>\S*): feeder configured' + _TS, 'feeder', lambda m: m['value'].decode()),
+           (rb'#(?P<value>\S*)\s*\[ERROR\]: LED command must be 4, 8, 12, or 16 characters long', 'led_error', lambda m: m['value'].decode())],
+    b'R': [(rb'R: reset all peripherals' + _TS, 'reset', None)],
+    b'K': [(rb'K: trial indication (?P<value>on|off)' + _TS, 'indicator', lambda m: m['value'] == b'on')],
+    b'A': [(rb'A: all on', 'all_on', None)],
+    b'g': [(rb'g: green toggled', 'green', None)],
+    b'r': [(rb'r: red toggled', 'red', None)],
+    b'Q': [(rb'Q: timer started', 'timer_start', None)],
+    b'W': [(rb'W: time requested' + _TS, 'timer', None)],
+    b'E': [(rb'E: timer stopped' + _TS, 'timer_stop', None)],
+    b'T': [(rb'T: TTL (?P<value>toggled|requested but not serviced|requested)' + _TS, 'ttl', lambda m: m['value'].decode())],
+    b't': [(rb't: TTL is (?P<value>HIGH|LOW)', 'ttl_state', lambda m: m['value'] == b'HIGH')],
+    b'Y': [(rb'Y: external TTLs toggled (?P<value>on|off)', 'exttl', lambda m: m['value'] == b'on')],
+    b'?': [(rb'\?: Information', 'info', None)],
+    b'$': [(rb'\$: (?P<value>.*)', 'config', lambda m: m['value'].decode(errors='replace'))],
+    b'%': [(rb'%: (?P<value>.*)', 'calibration', lambda m: m['value'].decode(errors='replace'))],
+    b' ': [(rb' External TTL detected', 'external_ttl', None),
+           (rb' Button (?P<value>\d) pushed', 'button', lambda m: int(m['value'])),
+           (rb' Entering (?:configuration|calibration) mode', 'menu', None)],
+    }
+for c in b'FGHJ':
+    _FORMATS[bytes((c,))] = [(bytes((c,)) + rb': relay(?P<value>\d) toggled' + _TS, 'relay', lambda m: int(m['value']))]
+_FORMATS = {key: [(re.compile(p, re.S), kind, value) for p, kind, value in formats]
+            for key, formats in _FORMATS.items()}
+_UNRECOGNIZED = re.compile(rb'(.): I cannot recognize that command', re.S)
+
+KINDS = ('feeder', 'led_error', 'reset', 'indicator', 'all_on', 'green', 'red',
+         'timer_start', 'timer', 'timer_stop', 'ttl', 'ttl_state', 'exttl',
+         'relay', 'info', 'config', 'calibration', 'external_ttl', 'button',
+         'menu', 'unrecognized', 'other')
+
+def parse(frame, host_ns=None):
+    # Parses one message from the microcontroller into an McuResponse.
+    # Arguments:
+    #    - frame: The message as bytes (or text), with or without its
+    #      "\r\n\n" terminator.
+    #    - host_ns: Host time the message arrived, in nanoseconds since the
+    #      epoch, or a datetime.
+    # Messages in no known format are returned with kind 'other'.
+    if isinstance(frame, str):
+        frame = frame.encode('utf-8')
+    frame = frame.rstrip(b'\r\n')
+    if isinstance(host_ns, datetime.datetime):
+        host_ns = int(host_ns.timestamp() * 1e9)
+
+    key = frame[:1]
+    command = None if key == b' ' or not key else key.decode(errors='replace')
+    for pattern, kind, value in _FORMATS.get(key, ()):
+        match = pattern.match(frame)
+        if match is None:
+            continue
+        sc = ms = None
+        if 'sc' in pattern.groupindex:
+            sc = int(match['sc'])
+            ms = int(match['ms'])
+        return McuResponse(command, kind, sc, ms,
+                           None if value is None else value(match),
+                           host_ns, frame)
+
+    match = _UNRECOGNIZED.match(frame)
+    if match is not None:
+        return McuResponse(command, 'unrecognized', host_ns=host_ns, raw=frame)
+
+    return McuResponse(command, 'other', host_ns=host_ns, raw=frame)
+
+_INFO_LINE = re.compile(r'^[ \t]*(?P<key>[^:\r\n]+): (?P<value>[^\r\n]*)', re.M)
+_INFO_CCR = re.compile(r'^[ \t]*(?:L(?P<lvl>\d)[ \t]*\r?$|Feeder (?P<fdr>\d): (?P<ccr>\d+))', re.M)
+_INFO_KEYS = {'Device ID'                   : 'device_id',
+              'Date of last firmware flash' : 'updated',
+              'Firmware version'            : 'firm_ver',
+              'RECORD library version'      : 'lib_ver',
+              'Arena settings version'      : 'cfg_ver',
+              'Device'                      : 'device',
+              'External TTL servicing'      : 'exttl',
+              'Output TTL operation mode'   : 'ttl_mode',
+              'Relay active time'           : 'relay_ontime',
+              'TTL active time'             : 'ttl_length'}
+
+def parse_info(text):
+    # Parses the device information the firmware prints for '?'. Returns a
+    # dictionary with the keys in _INFO_KEYS that were found ("relay_ontime"
+    # and "ttl_length" in milliseconds, "exttl" as True/False) and "ccr",
+    # the CCR value of every feeder for levels 1 through 3, e.g.
+    # {'1': [7700, 7700, 7700, 7700], ...}.
+    if isinstance(text, bytes):
+        text = text.decode(errors='replace')
+    info = {}
+    for match in _INFO_LINE.finditer(text):
+        key = _INFO_KEYS.get(match['key'].strip())
+        if key is not None:
+            info[key] = match['value'].strip()
+    for key in ('relay_ontime', 'ttl_length'):
+        if key in info:
+            info[key] = int(info[key].split()[0])
+    if 'exttl' in info:
+        info['exttl'] = info['exttl'] == 'Active'
+    ccr = {}
+    level = None
+    for match in _INFO_CCR.finditer(text):
+        if match['lvl'] is not None:
+            level = ccr.setdefault(match['lvl'], [])
+        elif level is not None:
+            level.append(int(match['ccr']))
+    if ccr:
+        info['ccr'] = ccr
+
+    return info
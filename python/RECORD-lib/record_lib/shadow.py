@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Shadow model of the state of a RECORD microcontroller. Every message the
+microcontroller sends says what it just did ("K: trial indication on ...",
+"T: TTL toggled ...", "#F1L2: feeder configured ..."), so following the
+messages as they arrive is enough to know the output TTL level, the TTL
+operation mode, whether external TTLs are serviced, the trial indicator, the
+level of every feeder light and whether the timer runs, without asking the
+microcontroller with 't' or '?'. RECORD keeps one in "state" and updates it
+from every message it receives; RECORD.reconcile asks the microcontroller
+for what it can report when the model has to be checked.
+
+Values are None until a message (or a reconciliation) reveals them.
+"""
+
+import time
+
+from record_lib.response import parse
+
+class DeviceState:
+    def __init__(self):
+        self.ttl_out = None     # Output TTL level, True for HIGH
+        self.ttl_mode = None    # 'TOGGLE', 'PULSE' or 'OFF'
+        self.exttl = None       # External TTLs serviced
+        self.indicator = None   # Trial indicator on
+        self.lights = [None, None, None, None]  # Level (0-3) of feeders 1-4
+        self.timer = None       # Timer running
+        self.updated = None     # time.time() of the last change
+        self.reconciled = None  # time.time() of the last reconciliation
+
+    def clear(self):
+        # Forgets everything, e.g. after the microcontroller was talked to
+        # without following its messages.
+        self.__init__()
+
+    def age(self):
+        # Seconds since the last reconciliation, or None if there was none.
+        if self.reconciled is None:
+            return None
+        return time.time() - self.reconciled
+
+    def feed(self, frame, ts=None):
+        # Updates the model from a message received as bytes. Used as the
+        # "on_frame" callback of frames.FrameReader.
+        self.update(parse(frame))
+
+    def update(self, resp):
+        # Updates the model from a parsed message (a response.McuResponse)
+        # following the firmware's behavior.
+        kind = resp.kind
+        if kind == 'feeder':
+            led = resp.value
+            for i in range(0, len(led) - 3, 4):
+                fdr, lvl = led[i+1], led[i+3]
+                if fdr in '1234' and lvl in '0123':
+                    self.lights[int(fdr) - 1] = int(lvl)
+        elif kind == 'reset':
+            # 'R' turns every light off but leaves the TTLs and timer alone.
+            self.lights = [0, 0, 0, 0]
+            self.indicator = False
+        elif kind == 'all_on':
+            self.lights = [3, 3, 3, 3]
+        elif kind == 'indicator':
+            self.indicator = resp.value
+        elif kind == 'timer_start':
+            self.timer = True
+        elif kind == 'timer_stop':
+            self.timer = False
+        elif kind == 'ttl':
+            if resp.value == 'toggled':
+                self.ttl_mode = 'TOGGLE'
+                if self.ttl_out is not None:
+                    self.ttl_out = not self.ttl_out
+            elif resp.value == 'requested':
+                # A pulse, over by the time the next command is read.
+                self.ttl_mode = 'PULSE'
+                self.ttl_out = False
+            else:
+                self.ttl_mode = 'OFF'
+        elif kind == 'ttl_state':
+            self.ttl_out = resp.value
+        elif kind == 'exttl':
+            self.exttl = resp.value
+        elif kind in ('external_ttl', 'button'):
+            # Both are answered with a pulse on the output TTL that leaves it
+            # low.
+            self.ttl_out = False
+        elif kind == 'config' and 'TTL output operation mode applied' in resp.value:
+            self.ttl_out = False
+        else:
+            return
+        self.updated = time.time()
+
+    def update_info(self, info):
+        # Updates the model from the device information returned by
+        # RECORD.request_info.
+        if 'exttl' in info:
+            self.exttl = info['exttl']
+        if 'ttl_mode' in info:
+            self.ttl_mode = info['ttl_mode']
+        self.updated = time.time()
+
+    def __repr__(self):
+        return ("DeviceState(ttl_out=%r, ttl_mode=%r, exttl=%r, indicator=%r, lights=%r, timer=%r)"
+                % (self.ttl_out, self.ttl_mode, self.exttl, self.indicator, self.lights, self.timer))
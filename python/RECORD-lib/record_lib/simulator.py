@@ -0,0 +1,650 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+A software stand-in for an MSP430-FR2355 running the RECORD firmware
+(microcontroller/main__v2_2_1.c). It reproduces the firmware's command set and
+response text, its sc.ms timer, the TTL_LENGTH and RELAY_ONTIME delays, the
+serial transfer time at the configured baud rate, and the fact that bytes
+received while the firmware is not waiting for input are ignored. Optional
+jitter can be added to every delay.
+
+The simulator can be reached in two ways:
+    1. Through a pseudo-terminal (Linux/macOS), see RECORDSimulator.open_pty:
+           sim = RECORDSimulator()
+           port = sim.open_pty()
+           session = RECORD().createSS(com_port=port)
+    2. Through pyserial's URL handlers, with no operating system support
+       needed:
+           session = RECORD().createSS(com_port="recordsim://?jitter=0.002")
+       The simulator behind a "recordsim://" session is available as
+       session.simulator.
+"""
+
+import collections
+import os
+import random
+import threading
+import time
+
+class RECORDSimulator:
+    def __init__(self, **kwargs):
+        # Arguments:
+        #    - ttl_length: TTL_LENGTH, in milliseconds. Default 100.
+        #    - relay_ontime: RELAY_ONTIME, in milliseconds. Default 500.
+        #    - baud_rate: Serial speed used to compute how long every byte
+        #      takes to transfer. 0 or None transfers bytes instantly.
+        #      Default 9600.
+        #    - jitter: Maximum random time, in seconds, added to every delay.
+        #      Default 0.
+        #    - seed: Seed for the jitter's random number generator.
+        #    - drop_when_busy: Ignore bytes received while the firmware is not
+        #      waiting for input (executing a command or printing a prompt),
+        #      like the firmware does. Default True.
+        #    - device_id, firm_ver, lib_ver, cfg_ver, updated, device: Device
+        #      information reported by '?'.
+        self.verbose        = kwargs.get('verbose', 0)
+        self.ttl_length     = int(kwargs.get('ttl_length', 100))
+        self.relay_ontime   = int(kwargs.get('relay_ontime', 500))
+        self.baud_rate      = kwargs.get('baud_rate', 9600)
+        self.jitter         = float(kwargs.get('jitter', 0))
+        self.drop_when_busy = kwargs.get('drop_when_busy', True)
+        self.info = {'device'    : kwargs.get('device', "MSP-EXP430FR2355 Rev. A"),
+                     'device_id' : kwargs.get('device_id', "FR2355_Sim"),
+                     'firm_ver'  : kwargs.get('firm_ver', "v2.2.1"),
+                     'lib_ver'   : kwargs.get('lib_ver', "v1.2"),
+                     'cfg_ver'   : kwargs.get('cfg_ver', "v0.2"),
+                     'updated'   : kwargs.get('updated', "Simulated")}
+        self._rng = random.Random(kwargs.get('seed'))
+
+        # CCR values for every light level and feeder, as in mcucfg_dev1.h.
+        self.levels = {'0': [8000, 8000, 8000, 8000],
+                       '1': [7700, 7700, 7700, 7700],
+                       '2': [3500, 3500, 3500, 3500],
+                       '3': [ 250,  250,  250,  250]}
+
+        # Peripheral state.
+        self.ccr     = [8000, 8000, 8000, 8000, 8000]   # TB3CCR1-4 (feeders), TB3CCR5 (cue)
+        self.relays  = [False, False, False, False]     # True while a valve is open
+        self.ack     = False    # ACK line (P3.0)
+        self.ttl_out = False    # TTL_OUT line (P3.6)
+        self.blink   = 0        # _BLINK, trial indicator on
+        self.exttl   = 0        # _EXTTL, external TTLs serviced
+        self.ttlop   = 0        # _TTLOP, 0 toggle, 1 pulse, 2 off
+        self.dropped = 0        # Number of bytes ignored while busy
+
+        # Timer: ticks counted while running, plus the time it was started.
+        self._ticks_base = 0
+        self._run_start  = None
+
+        self._input   = collections.deque()  # (arrival time, byte) received from the host
+        self._irq     = collections.deque()  # Pending interrupt service routines
+        self._cond    = threading.Condition()
+        self._rx_free = 0       # Time the receive line is free for the next byte
+        self._listen_since = 0  # Time the firmware last started waiting for input
+        self._last_rx = 0       # Arrival time of the last byte read
+        self._busy = False      # Whether the firmware did any work since then
+        self._output  = None
+        self._thread  = None
+        self._running = False
+        self._pty     = None
+
+    # ------ Transport ------
+    def attach(self, output):
+        # Sets the function that receives every byte string the simulated
+        # microcontroller sends to the host.
+        self._output = output
+
+    def receive(self, data):
+        # Called with bytes sent by the host. Every byte is given the time it
+        # will have finished arriving at the configured baud rate.
+        now = time.perf_counter()
+        byte_time = self._byte_time()
+        with self._cond:
+            t = max(now, self._rx_free)
+            for b in data:
+                t += byte_time
+                self._input.append((t, bytes((b,))))
+            self._rx_free = t
+            self._cond.notify_all()
+
+        return len(data)
+
+    def start(self):
+        # Starts running the firmware in a background thread.
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._main, daemon=True, name="RECORD-simulator")
+        self._thread.start()
+
+    def stop(self):
+        # Stops the firmware thread and closes the pseudo-terminal, if any.
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(2)
+            self._thread = None
+        if self._pty is not None:
+            for fd in self._pty:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            self._pty = None
+
+    def open_pty(self):
+        # Creates a pseudo-terminal pair, connects the simulator to one end
+        # and returns the device name of the other end (e.g. "/dev/pts/3"),
+        # which can be passed to RECORD.createSS as the "com_port". Only
+        # available on POSIX systems.
+        import tty
+
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        self._pty = (master, slave)
+        self.attach(lambda data: os.write(master, data))
+
+        def _pump():
+            while True:
+                try:
+                    data = os.read(master, 1024)
+                except OSError:
+                    break
+                if not data:
+                    break
+                self.receive(data)
+
+        threading.Thread(target=_pump, daemon=True, name="RECORD-simulator-pty").start()
+        self.start()
+
+        return os.ttyname(slave)
+
+    # ------ External inputs ------
+    def press_button(self):
+        # Simulates pressing on-board button S1 (P4.1).
+        self._interrupt(self._port4_isr)
+
+    def pulse_ttl_in(self):
+        # Simulates a rising edge on TTL_IN (P3.5). Only serviced after
+        # external TTLs have been turned on with 'Y'.
+        if self.exttl:
+            self._interrupt(self._port3_isr)
+
+    def _interrupt(self, isr):
+        with self._cond:
+            self._irq.append(isr)
+            self._cond.notify_all()
+
+    # ------ Timing helpers ------
+    def _byte_time(self):
+        # Start bit, 8 data bits and one stop bit per byte.
+        return 10 / self.baud_rate if self.baud_rate else 0
+
+    def _jitter(self):
+        return self._rng.uniform(0, self.jitter) if self.jitter else 0
+
+    def _ticks(self):
+        # Milliseconds counted by the RTC since the timer was last cleared.
+        if self._run_start is None:
+            return self._ticks_base
+        return self._ticks_base + int((time.perf_counter() - self._run_start) * 1000)
+
+    def _timestamp(self):
+        # The firmware's "sc" and "ms" counters. "ms" rolls over into "sc"
+        # after 999 ticks and "sc" is a 16-bit counter.
+        ticks = self._ticks()
+        return (ticks // 999) & 0xFFFF, ticks % 999
+
+    def delay_ms(self, d_ms):
+        # Sleeps like the firmware's delay_ms, servicing interrupts meanwhile.
+        self._busy = True
+        end = time.perf_counter() + d_ms / 1000 + self._jitter()
+        while True:
+            with self._cond:
+                remaining = end - time.perf_counter()
+                if remaining <= 0 or not self._running:
+                    break
+                if not self._irq:
+                    self._cond.wait(remaining)
+                irq = self._irq.popleft() if self._irq else None
+            if irq is not None:
+                irq()
+
+    def send(self, text):
+        # UARTsendMsg: transmits a string, taking as long as the transfer
+        # takes at the configured baud rate.
+        self._busy = True
+        data = text.encode('latin-1')
+        byte_time = self._byte_time()
+        if not byte_time:
+            if self._output is not None: self._output(data)
+            return
+        # Send in chunks of about 2 ms worth of bytes, each after it has had
+        # the time to go out on the wire.
+        chunk = max(1, int(0.002 / byte_time))
+        for i in range(0, len(data), chunk):
+            piece = data[i:i+chunk]
+            time.sleep(len(piece) * byte_time)
+            if self._output is not None: self._output(piece)
+
+    def echo(self, c):
+        # UCA0TXBUF = c: hands one character to the UART without waiting for
+        # it to go out.
+        if self._output is not None: self._output(c.encode('latin-1'))
+
+    def getc(self):
+        # Waits for the next character from the host, servicing interrupts
+        # meanwhile. Bytes that arrived before the firmware started waiting
+        # (while it was executing a command or printing a prompt) are
+        # ignored, since it only reads UCA0RXBUF after a receive interrupt
+        # wakes it from low power mode. Reading a character and echoing it
+        # takes the firmware microseconds, so after doing only that it is
+        # considered to have been waiting since the last byte arrived.
+        self._listen_since = time.perf_counter() if self._busy else self._last_rx
+        self._busy = False
+        while True:
+            irq = None
+            with self._cond:
+                while self._running and not self._input and not self._irq:
+                    self._cond.wait()
+                if not self._running:
+                    return None
+                if self._irq:
+                    irq = self._irq.popleft()
+                else:
+                    t, c = self._input.popleft()
+            if irq is not None:
+                irq()
+                continue
+            if self.drop_when_busy and t < self._listen_since:
+                self.dropped += 1
+                if self.verbose: print("[Simulator]: dropped", c, "received while busy")
+                continue
+            wait = t - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_rx = t
+            return c.decode('latin-1')
+
+    # ------ Firmware ------
+    def _main(self):
+        while self._running:
+            c = self.getc()
+            if c is None:
+                break
+            self.ack = False
+            handler = self._commands.get(c, RECORDSimulator._unknown)
+            handler(self, c)
+
+    def _report(self, ts):
+        # Reports a time stamp as "sc.ms" and ends the message.
+        self.send(str(ts[0]))
+        self.send('.')
+        self.send(str(ts[1]))
+        self.send("\r\n\n")
+
+    def _ack_message(self, c, message, ts=None):
+        # Acknowledge with TTL first, then message, then (optionally) report
+        # the time stamp, as most commands do.
+        self.ack = True
+        self.send(c)
+        self.send(message)
+        self.delay_ms(self.ttl_length)
+        self.ack = False
+        if ts is not None:
+            self._report(ts)
+
+    def set_brightness(self, led, brightness):
+        # SetBrightness: applies a level's CCR value to a feeder.
+        if brightness not in self.levels or led not in '1234' or len(led) != 1:
+            return 1
+        self.ccr[int(led) - 1] = self.levels[brightness][int(led) - 1]
+        return 0
+
+    def _led(self, c):
+        self.echo(c)
+        rxstring = ''
+        while len(rxstring) <= 15:
+            ch = self.getc()
+            if ch is None:
+                return
+            if ch == '\r' or ch == ' ':
+                break
+            rxstring += ch
+            self.echo(ch)
+        ts = self._timestamp()
+        if len(rxstring) in (4, 8, 12, 16):
+            for i in range(0, len(rxstring), 4):
+                self.set_brightness(rxstring[i+1], rxstring[i+3])
+            self.ack = True
+            self.send(": feeder configured at ")
+            self.delay_ms(self.ttl_length)
+            self.ack = False
+            self._report(ts)
+        else:
+            self.send("  [ERROR]: LED command must be 4, 8, 12, or 16 characters long. Current length is ")
+            self.send(str(len(rxstring)))
+            self.send(".\r\n\n")
+
+    def _read_value(self, length=4, echo=True):
+        # Reads up to "length" characters, or fewer if Enter is pressed.
+        value = ''
+        while len(value) <= length - 1:
+            ch = self.getc()
+            if ch is None or ch == '\r':
+                break
+            value += ch
+            if echo: self.echo(ch)
+        return value
+
+    def _config(self, c):
+        self.send(" Entering configuration mode...\r\n Keep in mind any configuration done here will be lost when the system is powered off. Commit these changes as default by changing the system's code.\r\n\n")
+        self.send(" A.........Configure feeder LED brightness\r\n B.........Configure relay active time\r\n C.........Configure TTL length\r\n D.........TTL operating mode\r\n>")
+        item = self.getc()
+        if item is None:
+            return
+        self.echo(item)
+        if item == 'A':
+            self.send("\r\n Please enter the level to reconfigure (1, 2, or 3).\r\n> ")
+            lvl = self.getc()
+            if lvl is None:
+                return
+            self.echo(lvl)
+            self.send("\r\n Please enter the feeder to reconfigure (1, 2, 3, or 4).\r\n> ")
+            fdr = self.getc()
+            if fdr is None:
+                return
+            self.echo(fdr)
+            self.send("\r\n Please enter the new integer CCR value for this level and feeder (0 through 8000, whole numbers only).\r\n Enter up to 4 characters or press enter if you're entering less than 4 characters.\r\n> ")
+            value = _atoi(self._read_value())
+            self.send("\r\n")
+            error = value > 8000
+            if not error and (lvl not in '123' or len(lvl) != 1):
+                self.send(" Error: CCR value should not exceed 8000 or LEVEL should not exceed 3. Configuration not set.\r\n")
+                error = True
+            if not error:
+                if fdr in ('1', '2', '3', '4'):
+                    self.levels[lvl][int(fdr) - 1] = value
+                self.send(" Would you like to test the new value? [y/n]\r\n> ")
+                answer = self.getc()
+                if answer is None:
+                    return
+                self.echo(answer)
+                self.send("\r\n\n")
+                if answer in 'yY':
+                    for led in '1234':
+                        self.set_brightness(led, lvl)
+                    self.send("$: New settings applied! Entering low power mode...\r\n\n")
+                else:
+                    self.send("$: Configuration applied! Feeders reset, changes will be reflected upon turning them back on. Entering low power mode...\r\n\n")
+            else:
+                self.send("$: Configuration aborted due to error, try again. Entering low power mode...\r\n\n")
+            return
+        elif item == 'B' or item == 'C':
+            if item == 'B':
+                self.send("\r\n Please enter the desired relay active time in milliseconds (whole numbers only, maximum of 9999 milliseconds).\r\n Enter up to 4 characters or press enter if you're entering less than 4 characters.\r\n> ")
+            else:
+                self.send("\r\n Please enter the TTL length in milliseconds (whole numbers only, maximum of 9999 milliseconds).\r\n Enter a 4-character number or press enter if you're entering less than 4 characters.\r\n> ")
+            value = _atoi(self._read_value())
+            self.send("\r\n\n")
+            if value > 9999 or value < 0:
+                self.send("$: Invalid input, value exceeds 9999 or is negative. Loading previous values and aborting configuration.\r\n\n")
+            elif item == 'B':
+                self.relay_ontime = value
+                self.send("$: Configuration applied! Relay active time has been configured. Entering low power mode...\r\n\n")
+            else:
+                self.ttl_length = value
+                self.send("$: Configuration applied! TTL length has been configured. Entering low power mode...\r\n\n")
+            return
+        elif item == 'D':
+            self.send("\r\n\n Please enter the desired TTL operating mode from the list below:")
+            self.send("\r\n\n 1.........Toggle (TTL stays on/off until the next request) - " + ("Active" if self.ttlop == 0 else "Inactive"))
+            self.send("\r\n 2.........Pulse (TTL goes high upon request and goes low after [TTL length]) - " + ("Active" if self.ttlop == 1 else "Inactive"))
+            self.send("\r\n 3.........Off (TTL requests are ignored) - " + ("Active\r\n>" if self.ttlop == 2 else "Inactive\r\n>"))
+            mode = self.getc()
+            if mode is None:
+                return
+            self.echo(mode)
+            if mode in ('1', '2', '3'):
+                self.ttlop = int(mode) - 1
+            else:
+                self.send("Error: Invalid input. Exiting...")
+            self.send("\r\n\n")
+        else:
+            self.send("\r\n\n$: Input unrecognized, exiting configuration mode.\r\n\n")
+        self.ttl_out = False
+        self.send("$: TTL output operation mode applied. Entering low power mode...\r\n\n")
+
+    def _calibrate(self, c):
+        self.send(" Entering calibration mode...\r\n Keep in mind any configuration done here will be lost when the system is powered off. Commit these changes as default by changing the system's code.\r\n\n")
+        self.send(" Please enter the level to reconfigure (1, 2, or 3).\r\n> ")
+        lvl = self.getc()
+        if lvl is None:
+            return
+        self.echo(lvl)
+        self.send("\r\n")
+        error = lvl not in ('1', '2', '3')
+        if error:
+            self.send("Error: Invalid input. Exiting...")
+        self.send(" Please enter the feeder to reconfigure (1, 2, 3, or 4).\r\n> ")
+        fdr = self.getc()
+        if fdr is None:
+            return
+        self.echo(fdr)
+        self.send("\r\n")
+        if fdr not in ('1', '2', '3', '4'):
+            error = True
+            self.send("Error: Invalid input. Exiting...")
+        if error:
+            self.send(c)
+            self.send(": Cannot continue due to error. Check that both level and feeder values are between their respective ranges. Calibration aborted.\r\n\n")
+            return
+        reg = int(fdr) - 1
+        self.set_brightness(fdr, lvl)
+        temp = self.ccr[reg]
+        self.send(" Use '[' and ']' to decrease or increase the CCR value for the selected feeder. Press 'Enter' when done.\r\n")
+        key = ' '
+        while key != '\r':
+            self.send("> CCR value is currently: " + str(temp) + "\r\n")
+            key = self.getc()
+            if key is None:
+                return
+            if key == '[':
+                temp = (temp + 50) & 0xFFFF
+                if temp > 8000:
+                    temp = 0
+                    self.send(" CCR value upper limit reached, looped back to 0.\r\n")
+            elif key == ']':
+                temp = (temp - 50) & 0xFFFF
+                if temp > 8000:
+                    temp = 8000
+                    self.send(" CCR value lower limit reached, looped back to 8000.\r\n")
+            elif key != '\r':
+                self.send(" Please only use '[' or ']'. Press 'Enter' to exit calibration mode.\r\n")
+            self.ccr[reg] = temp
+        self.send(" Would you like to apply these changes? [y/n]\r\n> ")
+        answer = self.getc()
+        if answer is None:
+            return
+        self.echo(answer)
+        self.send("\r\n\n")
+        if answer in 'yY':
+            self.levels[lvl][reg] = temp
+        for led in '1234':
+            self.set_brightness(led, lvl)
+        self.send(c)
+        if answer in 'yY':
+            self.send(": New settings applied! Resuming previous operations...\r\n\n")
+        else:
+            self.send(": Rolled back to previous configuration. Resuming previous operations...\r\n\n")
+
+    def _all_on(self, c):
+        for led in '1234':
+            self.set_brightness(led, '3')
+        self._ack_message(c, ": all on\r\n\n")
+
+    def _green(self, c):
+        self._ack_message(c, ": green toggled\r\n\n")
+
+    def _red(self, c):
+        self._ack_message(c, ": red toggled\r\n\n")
+
+    def _indicator(self, c):
+        ts = self._timestamp()
+        if self.blink:
+            self.blink = 0
+            self.ccr[4] = 8000
+            message = ": trial indication off at "
+        else:
+            self.blink = 1
+            self.ccr[4] = 6000
+            message = ": trial indication on at "
+        self._ack_message(c, message, ts)
+
+    def _reset(self, c):
+        ts = self._timestamp()
+        self.relays = [False, False, False, False]
+        self.ccr = [8000, 8000, 8000, 8000, 8000]
+        self.blink = 0
+        self._ack_message(c, ": reset all peripherals at ", ts)
+
+    def _relay(self, c):
+        ts = self._timestamp()
+        n = 'FGHJ'.index(c)
+        self.relays[n] = True
+        self.delay_ms(self.relay_ontime)
+        self.relays[n] = False
+        self._ack_message(c, ": relay" + str(n + 1) + " toggled at ", ts)
+
+    def _help(self, c):
+        info = self.info
+        levels = ''
+        for lvl in '123':
+            levels += ("CCR values:\r\n" if lvl == '1' else '') + "  L" + lvl + "\r\n"
+            for fdr in range(4):
+                levels += "  Feeder " + str(fdr + 1) + ": " + str(self.levels[lvl][fdr]) + "\r\n"
+        self.send("-------------------------------------------------------------------------------------------------\r\n"
+                  "Device ID: " + info['device_id'] + "\r\n"
+                  "Date of last firmware flash: " + info['updated'] + "\r\n"
+                  "Firmware version: " + info['firm_ver'] + "\r\n"
+                  "RECORD library version: " + info['lib_ver'] + "\r\n"
+                  "Arena settings version: " + info['cfg_ver'] + "\r\n"
+                  "Device: " + info['device'] + "\r\n"
+                  "External TTL servicing: " + ("Active\r\n" if self.exttl else "Inactive\r\n") +
+                  "Output TTL operation mode: " + ("TOGGLE\r\n", "PULSE\r\n", "OFF\r\n")[self.ttlop] +
+                  levels +
+                  "Relay active time: " + str(self.relay_ontime) + " milliseconds.\r\n"
+                  "TTL active time: " + str(self.ttl_length) + " milliseconds.\r\n"
+                  "-------------------------------------------------------------------------------------------------\r\n\n")
+        self.send("For additional help, enter 'H', otherwise use Enter key to exit\r\n\n")
+        answer = self.getc()
+        if answer is None:
+            return
+        if answer in 'Hh':
+            self.send(_ABOUT)
+        self.send(c)
+        self.send(": Information.\r\n\n")
+
+    def _timer_start(self, c):
+        if self._run_start is None:
+            self._run_start = time.perf_counter()
+        self._ack_message(c, ": timer started.\r\n\n")
+
+    def _timer_fetch(self, c):
+        self._ack_message(c, ": time requested at ", self._timestamp())
+
+    def _timer_stop(self, c):
+        ts = self._timestamp()
+        self._run_start = None
+        self._ticks_base = 0
+        self._ack_message(c, ": timer stopped at ", ts)
+
+    def _ttl(self, c):
+        ts = self._timestamp()
+        if self.ttlop == 0:
+            self.ttl_out = not self.ttl_out
+            self.send(c)
+            self.send(": TTL toggled at ")
+        elif self.ttlop == 1:
+            self.ttl_out = True
+            self.send(c)
+            self.send(": TTL requested at ")
+            self.delay_ms(self.ttl_length)
+            self.ttl_out = False
+        else:
+            self.send(c)
+            self.send(": TTL requested but not serviced at ")
+        self._report(ts)
+
+    def _ttl_state(self, c):
+        self.send("t: TTL is HIGH" if self.ttl_out else "t: TTL is LOW")
+        self.send("\r\n\n")
+
+    def _toggle_exttl(self, c):
+        if self.exttl:
+            self.exttl = 0
+            message = ": external TTLs toggled off.\r\n\n"
+        else:
+            self.exttl = 1
+            message = ": external TTLs toggled on.\r\n\n"
+        self._ack_message(c, message)
+
+    def _unknown(self, c):
+        self.send(c)
+        self.send(": I cannot recognize that command. Send me a '?' for a list of commands.\r\n\n")
+
+    def _port4_isr(self):
+        self.send(" Button 1 pushed...\r\n\n")
+        self._isr_pulse()
+
+    def _port3_isr(self):
+        self.send(" External TTL detected...\r\n\n")
+        self._isr_pulse()
+
+    def _isr_pulse(self):
+        # ACK and TTL_OUT go high for TTL_LENGTH and are both left low.
+        self.ack = True
+        self.ttl_out = True
+        time.sleep(self.ttl_length / 1000)
+        self.ack = False
+        self.ttl_out = False
+
+    _commands = {'#': _led, '$': _config, '%': _calibrate, 'A': _all_on,
+                 'g': _green, 'r': _red, 'K': _indicator, 'R': _reset,
+                 'F': _relay, 'G': _relay, 'H': _relay, 'J': _relay,
+                 '?': _help, 'Q': _timer_start, 'W': _timer_fetch,
+                 'E': _timer_stop, 'T': _ttl, 't': _ttl_state,
+                 'Y': _toggle_exttl}
+
+def _atoi(value):
+    # C's atoi: the leading integer in a string, 0 if there is none.
+    digits = ''
+    for i, ch in enumerate(value.strip()):
+        if ch.isdigit() or (i == 0 and ch in '+-'):
+            digits += ch
+        else:
+            break
+    try:
+        return int(digits)
+    except ValueError:
+        return 0
+
+_ABOUT = (" Welcome to the about section! I will list all the commands I have available for you to use and will give you a short description of what each of them does.\r\n\n"
+          " 1.  '#': Turn on a specific feeder LED ring at a specified level.\r\nI will quietly wait for your input and only execute it once you're done.\r\nPlease format your input like this: FxLy. X is the feeder you want to activate, and Y is the brightness level you want to set it to.\r\n\n"
+          " 2.  '$': Starts configuration mode. Instructions will pop up as soon as you input this command.\r\nThis will allow you to reconfigure how bright feeder LEDs should be, how long valves stay open, how long TTL pulses are, amongst other settings.\r\n\n"
+          " 3.  'K': Toggles the 'trial in progress' light.\r\n\n"
+          " 4.  'R': Resets everything. All LEDs are turned off and relays are opened.\r\n\n"
+          " 5.  'F': Toggles relay 1, which will open and close valve 1.\r\nThe amount of time that the relay will be closed can be configured at the beginning of the code I'm executing.\r\nYou'll need to edit that yourself.\r\n\n"
+          " 6.  'G': Toggles relay 2, which will open and close valve 2.\r\nThe amount of time that the relay will be closed can be configured at the beginning of the code I'm executing.\r\nYou'll need to edit that yourself.\r\n\n"
+          " 7.  'H': Toggles relay 3, which will open and close valve 3.\r\nThe amount of time that the relay will be closed can be configured at the beginning of the code I'm executing.\r\nYou'll need to edit that yourself.\r\n\n"
+          " 8.  'J': Toggles relay 4, which will open and close valve 4.\r\nThe amount of time that the relay will be closed can be configured at the beginning of the code I'm executing.\r\nYou'll need to edit that yourself.\r\n\n"
+          " 9.  'Q': Starts the internal timer. This timer counts seconds and milliseconds.\r\n\n"
+          " 10. 'W': Gets the current time from internal timer. Time will be formatted as [seconds].[milliseconds]\r\n\n"
+          " 11. 'E': Stops the internal timer.\r\n\n"
+          " 12. 'T': Send a TTL out through port 3.6.\r\n\n"
+          " 13. 'Y': Allows the system to respond to external TTLs received through P3.5.\r\n\n"
+          " All commands (with the exception of 'T') will be acknowledged with the ACK signal through port 3.0 upon execution.\r\n\n")
@@ -8,16 +8,18 @@ v0.3.2
 """
 
 import datetime
+import itertools
 import pytz
 import time
 import numpy as np
-import random as rand
 import csv
 from os.path import exists
 
+from record_lib.zones import ROIS, ZoneTracker
+
 class TRIALS:
     def __init__ (self):
-        pass
+        self._zones = {}    # Bonsai tracking file -> ZoneTracker
     
     def create_trial_session(self, **kwargs):
         # Initialize all trial variables: 
@@ -32,6 +34,9 @@ class TRIALS:
         #       list, position-sensitive. Reads as: P[lvl0], P[lvl1], P[lvl2], P[lvl3].
         #    8. fdr_probs: (List) Probability for each feeder to appear in a trial
         #       list, position sensitive. Reads as: P[fdr1], P[fdr2], P[fdr3], P[fdr4].
+        #    9. seed: Seed of the random generator shuffling the trial lists, so
+        #       a session's lists can be generated again. Default None (fresh
+        #       lists every time).
         #       
         #    The sum of elements in lvl_probs must equal 1.
         #    The sum of elements in fdr_probs must also equal 1.
@@ -57,6 +62,7 @@ class TRIALS:
         self.rew_volume   = kwargs.get('reward_volume', 'Undefined')
         self.created      = self.timezone.localize(now).strftime("%Y-%m-%dT%H:%M:%S.%f%z")
         self.rectype      = kwargs.get('rectype', 'Undefined')
+        self.seed         = kwargs.get('seed', None)
         
         metadata = {'sessionstart'        : self.created,
                     'sessionduration'     : "",
@@ -75,6 +81,7 @@ class TRIALS:
                     'subjecthealth'       : self.subj_health,
                     'subjectweight'       : self.subj_weight,
                     'recordingtype'       : self.rectype,
+                    'seed'                : self.seed,
                     'notes'               : ""
                     }
         
@@ -91,6 +98,8 @@ class TRIALS:
         #    3. a list of integers of available feeders on the arena.
         #    4. a list of floats with probabilities for each feeder to appear, 
         #       position sensitive. P[F0], P[F1], P[F2], ..., P[Fn] = 1
+        #    5. seed: a seed (or numpy Generator) for the shuffle. The same
+        #       seed and parameters always give the same lists.
         #
         # The lengths of all lists must match. Ideally, the parameters
         # dictionary should be created by the "create_trial_session" method in
@@ -99,87 +108,163 @@ class TRIALS:
         #
         # Returns tuple of a list of feeders and a list of cost levels
         
-        dist_lvls = []
-        dist_fdrs = []
+        lists = self.create_trial_lists(sessions=1, **kwargs)
+        if type(lists) is int:
+            return lists
+        
+        return lists[0][0].tolist(), lists[1][0].tolist()
+    
+    def create_trial_lists(self, sessions=1, **kwargs):
+        # Create the trial lists of many sessions at once, e.g. to plan or
+        # simulate thousands of sessions. Takes the same parameters as
+        # "create_trial_list".
+        #
+        # Every list holds exactly the number of appearances of each level
+        # (and each feeder) its probability asks for. Probabilities times the
+        # number of trials are rounded down, and the trials left over go to
+        # the largest remainders. Each session's list is then shuffled with
+        # one random permutation.
+        #
+        # Returns tuple of two arrays of shape (sessions, trials), feeders
+        # and cost levels, or -1 if the parameters are invalid.
         
         # Parse incoming trial parameters...
         trials = kwargs.get('trials', self.trials)
-        lvls= kwargs.get('avail_lvls', self .avail_lvls)
+        lvls = kwargs.get('avail_lvls', self.avail_lvls)
         feeders = kwargs.get('avail_fdrs', self.avail_fdrs)
         lvl_probs = kwargs.get('P_lvls', self.P_lvls)
         fdr_probs = kwargs.get('P_fdrs', self.P_fdrs)
+        seed = kwargs.get('seed', getattr(self, 'seed', None))
         
-        if np.sum(lvl_probs) != 1:
-            print("Sum of cost level probabilities does not equal 1. Exiting.")
-            return -1
-        elif np.sum(fdr_probs) != 1:
-            print("Sum of feeder probabilities does not equal 1. Exiting.")
+        if not check_probs(lvls, lvl_probs, feeders, fdr_probs):
             return -1
+        
+        # Ordered lists with n repetitions of each level and feeder, e.g.
+        # [1,1,1,...,1, 2,2,2,...,2, 3,3,3,...,3], the same for every session,
+        # then shuffled row by row.
+        rng = np.random.default_rng(seed)
+        dist_lvls = np.repeat(np.asarray(lvls), _allocate(lvl_probs, trials))
+        dist_fdrs = np.repeat(np.asarray(feeders), _allocate(fdr_probs, trials))
+        dist_fdrs = rng.permuted(np.broadcast_to(dist_fdrs, (sessions, trials)), axis=1)
+        dist_lvls = rng.permuted(np.broadcast_to(dist_lvls, (sessions, trials)), axis=1)
+        
+        return dist_fdrs, dist_lvls
     
-        # Multiply the probabilistic distribution list by the total number of trials
-        # to find out how many aprearances of each level should be found in the trial
-        # list...
-        lvl_num = list(np.array(lvl_probs) * trials)
-    
-        for i in range(len(lvl_num)):
-            lvl_num[i] = int(lvl_num[i])
-            # Begin generating the levels in the trial list...
-            for _ in range(lvl_num[i]):
-                dist_lvls.append(lvls[i])
-    
-        # At this point you will have a list of n repetitions of each number
-        # representation of every level in the list, however all numbers will be in
-        # order; for example, if your probability distribution (lvl_probs) looked like
-        # "[0, 0.25, 0.25, 0.25, 0.25]", meaning equal probabilities for every level
-        # except for level 0, and you wish to generate 40 trials, then the dist_lvls
-        # list will have 0 repetitions of the number 0, 10 repetitions of the number
-        # 1, 10 repetitions of the number 2, and so on, like so:
-        # [1,1,1,1,...1, 2,2,2,2,...,2, 3,3,3,3,...,3].
-    
-        # Repeat the process above for the list of feeders...
-        fdr_num = list(np.array(fdr_probs) * trials)
-
-        for i in range(len(fdr_num)):
-            fdr_num[i] = int(fdr_num[i])
-            # Begin generating the levels in the trial list...
-            for _ in range(fdr_num[i]):
-                dist_fdrs.append(feeders[i])
-    
-        # The lists now need to be shuffled to make the order of these numbers appear
-        # as random as possible...
-        rand.shuffle(dist_fdrs)
-        rand.shuffle(dist_lvls)
+    def create_constrained_trial_list(self, **kwargs):
+        # Create a trial list like "create_trial_list", with the same
+        # parameters, under constraints on the order of the trials:
+        #    1. max_run_fdrs: the most trials in a row at the same feeder.
+        #       Default None (no limit).
+        #    2. max_run_lvls: the most trials in a row at the same cost level.
+        #       Default None (no limit).
+        #    3. block: number of trials per block. Every block holds each
+        #       feeder and each level in proportion to its probability, within
+        #       one trial. Default None (the whole session is one block).
+        #    4. avoid: list of (feeder, level) pairs that never make a trial.
+        #    5. session: index of this session among the sessions of a
+        #       subject, all given the subject's seed. Every session gets its
+        #       own order, and the feeders and levels a block has no room for
+        #       in proportion rotate from one session to the next. Default 0.
+        #    6. seed: an integer seed, or a numpy Generator (used as it is,
+        #       so "session" does not change its order).
+        #
+        # The list is built block by block: the feeders and levels of the
+        # block are paired up at random, avoiding the pairs in "avoid", and
+        # put in order by a randomised depth-first search that backtracks
+        # out of dead ends, so no list is ever generated and thrown away.
+        # A block that cannot follow the one before it (e.g. its first trial
+        # would make a run too long) sends the search back to that block,
+        # for another order or for another choice of which feeders and
+        # levels get the extra trial of their share.
+        #
+        # Returns tuple of a list of feeders and a list of cost levels, or -1
+        # if the parameters are invalid or the constraints cannot be met.
         
-        # Check that the lists are good to be shipped out...
-        if len(dist_lvls) < trials:     # Check for shorter-than-needed lists
-            while(len(dist_lvls) < trials):
-            # Create numbers from the levels list using the probabilities
-            # given by lvl_probs. This will generate an individual number with
-            # probability P[Lvlx].
-                rmn = np.random.choice(np.arange(lvls[0],(lvls[len(lvls)-1]+1)), p=lvl_probs)
-                dist_lvls.append(rmn)
-        elif len(dist_lvls) > trials:
-            for i in range(trials - len(dist_lvls)):
-            # Generate a random number with probability given by the lvl_probs
-            # list and remove the first occurance of it. Repeat until the list
-            # is of appropriate length.
-                rmv = np.random.choice(np.arange(lvls[0],(lvls[len(lvls)-1]+1)), p=lvl_probs)
-                dist_lvls.remove(rmv)
+        # Parse incoming trial parameters...
+        trials = kwargs.get('trials', self.trials)
+        lvls = list(kwargs.get('avail_lvls', self.avail_lvls))
+        feeders = list(kwargs.get('avail_fdrs', self.avail_fdrs))
+        lvl_probs = kwargs.get('P_lvls', self.P_lvls)
+        fdr_probs = kwargs.get('P_fdrs', self.P_fdrs)
+        seed = kwargs.get('seed', getattr(self, 'seed', None))
+        caps = (kwargs.get('max_run_fdrs', None), kwargs.get('max_run_lvls', None))
+        block = kwargs.get('block', None) or trials
+        avoid = kwargs.get('avoid', [])
+        session = kwargs.get('session', 0)
         
-        if len(dist_fdrs) < trials:
-            for i in range(trials - len(dist_fdrs)):
-            # Create numbers from the levels list using the probabilities
-            # given by fdr_probs. This will generate an individual number with
-            # probability P[Fdrx].
-                rmn = np.random.choice(np.arange(feeders[0],(feeders[len(feeders)-1]+1)), p=fdr_probs)
-                dist_fdrs.append(rmn)
-        elif len(dist_fdrs) > trials:
-            for i in range(trials - len(dist_fdrs)):
-            # Generate a random number with probability given by the fdr_probs
-            # list and remove the first occurance of it. Repeat until the list
-            # is of appropriate length.
-                rmv = np.random.choice(np.arange(feeders[0],(feeders[len(feeders)-1]+1)), p=fdr_probs)
-                dist_fdrs.remove(rmv)
+        if not check_probs(lvls, lvl_probs, feeders, fdr_probs):
+            return -1
+        allowed = np.ones((len(feeders), len(lvls)), dtype=bool)
+        for feeder, level in avoid:
+            if feeder not in feeders or level not in lvls:
+                print("Pair", (feeder, level), "to avoid is not an available feeder and level. Exiting.")
+                return -1
+            allowed[feeders.index(feeder), lvls.index(level)] = False
+        
+        # Feeders and levels of the session, in the order that shares them
+        # out between blocks, which gives every block the share it tries
+        # first.
+        fdr_total = _allocate(fdr_probs, trials, session)
+        lvl_total = _allocate(lvl_probs, trials, session)
+        fdr_seq = _spread(fdr_total, session)
+        lvl_seq = _spread(lvl_total, session)
+        if isinstance(seed, np.random.Generator):
+            rng = seed
+        else:
+            rng = np.random.default_rng(seed if seed is None else [seed, session])
+        
+        sizes = [min(block, trials - start) for start in range(0, trials, block)]
+        
+        def candidates(b, left):
+            # (Feeder counts, level counts, orders left to try) of block b,
+            # the one to try first last.
+            start = sum(sizes[:b])
+            shares = [_shares(probs, sizes[b], total, sizes[b + 1:],
+                              np.bincount(seq[start:start + sizes[b]], minlength=len(probs)), rng)
+                      for probs, total, seq in ((fdr_probs, left[0], fdr_seq), (lvl_probs, left[1], lvl_seq))]
+            return [(f, l, retries) for f, l in itertools.product(*shares)][::-1]
+        
+        # Depth-first over the blocks. Counts that cannot be put in order
+        # after the previous block are dropped; counts that can are tried
+        # again, in another order, when the search comes back to their
+        # block, at most "retries" times. At most "budget" attempts in all.
+        retries = 3
+        budget = 200 * len(sizes)
+        runs = ((-1, 0), (-1, 0))   # (Value, length) of the feeder and level runs
+        left = (fdr_total, lvl_total)
+        placed = []                 # (Ordered pairs, runs and counts left before)
+        stack = [candidates(0, left)]
+        while len(placed) < len(sizes):
+            if not stack[-1] or budget <= 0:
+                stack.pop()
+                if not placed or budget <= 0:
+                    print("No trial list meets these constraints. Exiting.")
+                    return -1
+                _, runs, left = placed.pop()
+                continue
+            budget -= 1
+            fdr_counts, lvl_counts, tries = stack[-1].pop()
+            fdrs = np.repeat(np.arange(len(feeders)), fdr_counts)
+            for _ in range(retries):
+                paired = _pair(fdrs, np.repeat(np.arange(len(lvls)), lvl_counts), allowed, rng)
+                if paired is not None:
+                    break
+            else:
+                continue
+            after = (left[0] - fdr_counts, left[1] - lvl_counts)
+            ordered = _order(list(zip(fdrs.tolist(), paired.tolist())), caps, runs, rng, after=after)
+            if ordered is None:
+                continue
+            if tries > 1:
+                stack[-1].append((fdr_counts, lvl_counts, tries - 1))
+            placed.append((ordered[0], runs, left))
+            runs = ordered[1]
+            left = after
+            if len(placed) < len(sizes):
+                stack.append(candidates(len(placed), left))
+        
+        dist_fdrs = [feeders[f] for ordered, _, _ in placed for f, _ in ordered]
+        dist_lvls = [lvls[l] for ordered, _, _ in placed for _, l in ordered]
         
         return dist_fdrs, dist_lvls
     
@@ -245,7 +330,7 @@ class TRIALS:
                     roi_index = 3
                 elif 'radi' in roi:
                     roi_index = 4
-                else:
+                elif roi != 'all':
                     raise InvalidROIError(roi)
             elif type(roi) is int and roi in expect_zones:
                 roi_index = roi
@@ -258,76 +343,165 @@ class TRIALS:
             print("Invalid filepath, please check that the following path contains the Bonsai rat tracking file:'", fileerror.value, "'")
             return -1
         else:
-            # Open the CSV file...
-            filename = open(filepath, 'r')
-            print("hewwooo")
-            # Create dictreader object to read CSV file using the headers.
-            file = csv.DictReader(filename)
-             
-            # Create empty lists to store the read values into depending on
-            # what the region of interest (roi) is, then...
-            # Use the dict reader object to iterate through every row in the CSV
-            # file and create dictionary objects out of each. The key on each
-            # dictionary will correspond to the header in the CSV file, which we
-            # define in the "row['XXX']" segment.
-            # At the same time, fetch and convert each dictionary entry to a string
-            # (in case it isn't a string already), and convert it to a boolean
-            # if that string matches any of the expected values.
-            # Finally, append the resulting bollean to the empty lists defined
-            # above.
-            list_index = 0
-            if roi_index == 1:
-                IsInDIAG = []
-                for row in file:
-                    IsInDIAG.append(str(row['IsInDIAG']).lower() in ['true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh'])
-                    list_index += 1
-                if return_last:
-                    return IsInDIAG[list_index-1]
-                else:
-                    return IsInDIAG
-            elif roi_index == 2:
-                IsInGRID = []
-                for row in file:
-                    IsInGRID.append(str(row['IsInGRID']).lower() in ['true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh'])
-                    list_index += 1
-                if return_last:
-                    return IsInGRID[list_index-1]
-                else:
-                    return IsInGRID
-            elif roi_index == 3:
-                IsInHORI = []
-                for row in file:
-                    IsInHORI.append(str(row['IsInHORI']).lower() in ['true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh'])
-                    list_index += 1
-                if return_last:
-                    return IsInHORI[list_index-1]
-                else:
-                    return IsInHORI
-            elif roi_index == 4:
-                IsInRADI = []
-                for row in file:
-                    IsInRADI.append(str(row['IsInRADI']).lower() in ['true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh'])
-                    list_index += 1
-                if return_last:
-                    return IsInRADI[list_index-1]
-                else:
-                    return IsInRADI
+            # The file is read incrementally: every call only parses the rows
+            # Bonsai appended since the previous call on the same file.
+            tracker = self._zones.get(filepath)
+            if tracker is None:
+                tracker = self._zones[filepath] = ZoneTracker(filepath)
+            if return_last:
+                if roi_index == 0:
+                    return tracker.current('all')
+                return tracker.current(ROIS[roi_index])
             else:
-                IsInDIAG = []
-                IsInGRID = []
-                IsInHORI = []
-                IsInRADI = []
-                for row in file:
-                    IsInDIAG.append(str(row['IsInDIAG']).lower() in ['true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh'])
-                    IsInGRID.append(str(row['IsInGRID']).lower() in ['true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh'])
-                    IsInHORI.append(str(row['IsInHORI']).lower() in ['true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh'])
-                    IsInRADI.append(str(row['IsInRADI']).lower() in ['true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh'])
-                    list_index += 1  # Will give the length of the whole dataset
-                if return_last:
-                    return [IsInDIAG[list_index-1], IsInGRID[list_index-1], IsInHORI[list_index-1], IsInRADI[list_index-1]]
-                else:
-                    return [IsInDIAG, IsInGRID, IsInHORI, IsInRADI]
+                if roi_index == 0:
+                    return tracker.rows_of('all')
+                return tracker.rows_of(ROIS[roi_index])
+    
+def _allocate(probs, trials, first=0):
+    # Number of appearances of each item in a list of "trials", by largest
+    # remainder: the exact shares rounded down, plus one for the items with
+    # the largest fractional parts until the counts add up to "trials".
+    # Ties go to the items in order, starting at "first".
+    exact = np.round(np.asarray(probs, dtype=float) * trials, 9)
+    counts = np.floor(exact).astype(int)
+    order = np.lexsort(((np.arange(len(counts)) - first) % len(counts), counts - exact))
+    counts[order[:trials - counts.sum()]] += 1
+    
+    return counts
+
+def _shares(probs, n, left, rest, first, rng):
+    # Every way a block of "n" trials can hold each item in proportion to
+    # its probability, within one (its exact share rounded down or up),
+    # adding up to "n" and leaving counts "left" that the blocks of sizes
+    # "rest" can still share out in proportion. The counts "first" come
+    # first if they are one of them, the others in random order.
+    probs = np.asarray(probs, dtype=float)
+    exact = np.round(probs * n, 9)
+    low = np.floor(exact).astype(int)
+    rest_low = sum((np.floor(np.round(probs * m, 9)).astype(int) for m in rest), np.zeros(len(probs), dtype=int))
+    rest_high = sum((np.ceil(np.round(probs * m, 9)).astype(int) for m in rest), np.zeros(len(probs), dtype=int))
+    shares = []
+    for extra in itertools.combinations(np.flatnonzero(exact > low), n - low.sum()):
+        counts = low.copy()
+        counts[list(extra)] += 1
+        after = left - counts
+        if (after >= rest_low).all() and (after <= rest_high).all():
+            shares.append(counts)
+    order = rng.permutation(len(shares)).tolist()
+    order.sort(key=lambda i: not np.array_equal(shares[i], first))
+    
+    return [shares[i] for i in order]
+
+def check_probs(lvls, lvl_probs, feeders, fdr_probs):
+    # Whether cost levels "lvls" and feeders "feeders" can be drawn with
+    # probabilities "lvl_probs" and "fdr_probs": each set adds up to 1 and
+    # has one probability per level or feeder. Prints why not otherwise.
+    if not np.isclose(np.sum(lvl_probs), 1):
+        print("Sum of cost level probabilities does not equal 1. Exiting.")
+        return False
+    elif not np.isclose(np.sum(fdr_probs), 1):
+        print("Sum of feeder probabilities does not equal 1. Exiting.")
+        return False
+    elif len(lvls) != len(lvl_probs) or len(feeders) != len(fdr_probs):
+        print("Each level and feeder needs one probability. Exiting.")
+        return False
     
+    return True
+
+def _spread(counts, first=0):
+    # Every item (index into "counts") counts[i] times, ordered so that
+    # every stretch of the sequence holds each item in proportion to its
+    # count, within one: copy j of item i sits at (j + 0.5) / counts[i].
+    # Ties go to the items in order, starting at "first".
+    counts = np.asarray(counts)
+    items = np.repeat(np.arange(len(counts)), counts)
+    copy = np.arange(len(items)) - np.repeat(np.cumsum(counts) - counts, counts)
+    tie = (items - first) % len(counts)
+    
+    return items[np.lexsort((tie, (copy + 0.5) / counts[items]))]
+
+def _pair(fdrs, lvls, allowed, rng):
+    # The levels shuffled to pair up with "fdrs" (both index arrays), each
+    # pair allowed by the "allowed" matrix, or None. A pair that is not
+    # allowed swaps its level with another pair's where both pairs then are.
+    lvls = rng.permutation(lvls)
+    for i in np.flatnonzero(~allowed[fdrs, lvls]):
+        if allowed[fdrs[i], lvls[i]]:
+            continue
+        swap = np.flatnonzero(allowed[fdrs[i], lvls] & allowed[fdrs, lvls[i]])
+        if len(swap) == 0:
+            return None
+        j = rng.choice(swap)
+        lvls[i], lvls[j] = lvls[j], lvls[i]
+    
+    return lvls
+
+def _order(pairs, caps, runs, rng, budget=50, after=((), ())):
+    # Puts the (feeder, level) pairs of a block in random order with no
+    # feeder more than caps[0] times in a row and no level more than
+    # caps[1] (None for no limit), following the runs of the previous block.
+    # Depth-first: every step picks a pair at random among those that break
+    # no run, weighted by how many are left, and backs out of a step after
+    # which the remaining pairs, with the feeder and level counts "after"
+    # of the blocks still to come, cannot be put in order for either limit.
+    # Returns the ordered pairs and the runs at the end, or None if the
+    # search took "budget" steps per pair.
+    types = sorted(set(pairs))
+    left = [pairs.count(t) for t in types]
+    rest = int(np.sum(after[0]))
+    steps = budget * len(pairs)
+    
+    def options(runs):
+        # Pairs that can come next, the ones to try first last.
+        keys = []
+        for k, t in enumerate(types):
+            if left[k] and all(cap is None or t[d] != runs[d][0] or runs[d][1] < cap
+                               for d, cap in enumerate(caps)):
+                keys.append((rng.random() ** (1 / left[k]), k))
+        return [k for _, k in sorted(keys)]
+    
+    def feasible(runs):
+        # Whether every value fits into the runs the other values leave for
+        # it: m copies need m <= cap * (others + 1), less the current run.
+        n = sum(left) + rest
+        for d, cap in enumerate(caps):
+            if cap is None:
+                continue
+            totals = {value: int(m) for value, m in enumerate(after[d])}
+            for k, t in enumerate(types):
+                totals[t[d]] = totals.get(t[d], 0) + left[k]
+            for value, m in totals.items():
+                if m > cap * (n - m + 1) - (runs[d][1] if runs[d][0] == value else 0):
+                    return False
+        return True
+    
+    order = []
+    history = [runs]
+    stack = [options(runs)]
+    while len(order) < len(pairs):
+        steps -= 1
+        if steps < 0:
+            return None
+        if not stack[-1]:
+            if not order:
+                return None
+            left[order.pop()] += 1
+            history.pop()
+            stack.pop()
+            continue
+        k = stack[-1].pop()
+        t = types[k]
+        runs = tuple((t[d], history[-1][d][1] + 1 if history[-1][d][0] == t[d] else 1) for d in range(2))
+        left[k] -= 1
+        if not feasible(runs):
+            left[k] += 1
+            continue
+        order.append(k)
+        history.append(runs)
+        stack.append(options(runs))
+    
+    return [types[k] for k in order], history[-1]
+
 class InvalidROIError(Exception):
     def __init__(self, value):
         self.value = value
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Capture of incoming TTL pulses. With external TTL servicing on
+(RECORD.toggle_ttlin), the firmware answers every pulse on TTL_IN (P3.5, from
+Noldus or another external system) with " External TTL detected..." and a
+pulse on TTL_OUT. TTLCapture listens to every message RECORD receives, from
+whichever thread reads it, and appends each pulse to NumPy arrays (grown by
+doubling) with the host time its message started arriving and the
+microcontroller's timer at that moment. Pulses can be read as an array at any
+time, or followed as they arrive with "events", so they can serve as sync
+anchors between the trial events and the Inscopix and camera recordings.
+Captured messages are taken off RECORD's queue, so a pulse arriving while a
+command waits for its response is never returned by fetch_response in its
+place.
+
+The firmware (v2.2.1) does not timestamp the message, so the timer reading
+is estimated from the host time through a ClockSync fit ("estimated" is then
+True). A reading the firmware reports as " at sc.ms" is used as is.
+
+    capture = TTLCapture(mcu, clock=clock).start()
+    ...
+    pulses = capture.pulses     # Fields host_ns, sc, ms, ticks, estimated, kind
+    capture.save_csv("session_ttl")
+"""
+
+import csv
+import datetime
+import re
+import threading
+import time
+
+import numpy as np
+
+from record_lib.response import parse
+
+PULSE_DTYPE = np.dtype([('host_ns', '<i8'), ('sc', '<i4'), ('ms', '<i4'),
+                        ('ticks', '<i8'), ('estimated', '?'), ('kind', 'u1')])
+EXTERNAL_TTL = 0
+BUTTON = 1
+_KINDS = {'external_ttl': EXTERNAL_TTL, 'button': BUTTON}
+_TS = re.compile(rb' at (\d+)\.(\d+)')
+
+class TTLCapture:
+    def __init__(self, mcu, **kwargs):
+        # Arguments:
+        #    - mcu: A RECORD (or ResilientRECORD) object.
+        #    - clock: A ClockSync with samples, used for the timer readings
+        #      of pulses. Without one, "sc", "ms" and "ticks" are -1.
+        #    - buttons: Also capture button presses, which the firmware
+        #      answers with the same TTL_OUT pulse. Default False.
+        #    - capacity: Pulses allocated for at first. Default 1024.
+        #    - reader: Start RECORD's background reader, so pulses are
+        #      stamped when they arrive instead of when the port is next
+        #      read. Default True.
+        #    - consume: Take the captured messages, so fetch_response does
+        #      not return them. Default True.
+        self.mcu = mcu
+        self.verbose = kwargs.get('verbose', 0)
+        self.clock = kwargs.get('clock', None)
+        self.buttons = kwargs.get('buttons', False)
+        self.reader = kwargs.get('reader', True)
+        self.consume = kwargs.get('consume', True)
+        self._data = np.zeros(kwargs.get('capacity', 1024), dtype=PULSE_DTYPE)
+        self.count = 0
+        self.running = False
+        self._cond = threading.Condition()
+
+    def start(self):
+        # Starts capturing. Returns the capture.
+        if not self.running:
+            self.mcu.add_listener(self._on_frame)
+            self.running = True
+        if self.reader:
+            self.mcu.start_reader()
+
+        return self
+
+    def stop(self):
+        if self.running:
+            self.mcu.remove_listener(self._on_frame)
+            self.running = False
+        with self._cond:
+            self._cond.notify_all()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __len__(self):
+        return self.count
+
+    def _on_frame(self, frame, ts):
+        # Called by RECORD with every message and the time it started
+        # arriving (a datetime). Returns True to take a captured message.
+        if not frame.startswith(b' '):
+            return False
+        kind = _KINDS.get(parse(frame).kind)
+        if kind is None or (kind == BUTTON and not self.buttons):
+            return False
+        sc = ms = ticks = -1
+        estimated = False
+        match = _TS.search(frame)
+        if match is not None:
+            sc, ms = int(match[1]), int(match[2])
+        elif self.clock is not None and self.clock.samples:
+            sc, ms = self.clock.host_to_mcu(ts)
+            estimated = True
+        if sc >= 0 and self.clock is not None:
+            ticks = self.clock.unwrap(sc, ms)
+        self.add(int(ts.timestamp() * 1e9), sc, ms, ticks, estimated, kind)
+
+        return self.consume
+
+    def add(self, host_ns, sc=-1, ms=-1, ticks=-1, estimated=False, kind=EXTERNAL_TTL):
+        # Appends a pulse, e.g. one captured some other way.
+        with self._cond:
+            if self.count == len(self._data):
+                self._data = np.resize(self._data, 2 * len(self._data))
+            self._data[self.count] = (host_ns, sc, ms, ticks, estimated, kind)
+            self.count += 1
+            self._cond.notify_all()
+        if self.verbose: print("   TTL pulse at", datetime.datetime.fromtimestamp(host_ns / 1e9))
+
+    @property
+    def pulses(self):
+        # Copy of every pulse captured so far, as a structured array.
+        with self._cond:
+            return self._data[:self.count].copy()
+
+    @property
+    def host_times(self):
+        # Host time of every pulse, in seconds since the epoch.
+        return self.pulses['host_ns'] / 1e9
+
+    def wait(self, n=1, timeout=None):
+        # Waits until "n" pulses have been captured in total. Returns True if
+        # they were, False after "timeout" seconds or if capturing stopped.
+        end = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self.count < n:
+                remaining = None if end is None else end - time.time()
+                if not self.running or (remaining is not None and remaining <= 0):
+                    return False
+                self._cond.wait(remaining)
+
+        return True
+
+    def events(self, start=0, timeout=None):
+        # Generator yielding every pulse (a record of "pulses") from index
+        # "start" on, waiting for new ones as they arrive. Ends when
+        # capturing stops, or when no pulse arrives for "timeout" seconds.
+        i = start
+        while True:
+            if i >= self.count and not self.wait(i + 1, timeout):
+                return
+            with self._cond:
+                pulse = self._data[i].copy()
+            i += 1
+            yield pulse
+
+    def match(self, times, tolerance=0.05):
+        # Pairs the pulses with the same pulses as recorded by another system
+        # (e.g. the GPIO events of an Inscopix recording), given as times in
+        # seconds on that system's clock, in increasing order. Every shift of one pulse train
+        # against the other proposes an offset between both clocks, and the
+        # offset pairing the most pulses within "tolerance" seconds of each
+        # other wins, so pulses missing from either side are allowed.
+        # Returns an array of (pulse index, index in "times") pairs, empty if
+        # fewer than two pulses could be paired.
+        host = self.host_times
+        times = np.asarray(times, dtype=float)
+        best = np.zeros((0, 2), dtype=int)
+        if len(host) < 2 or len(times) < 2:
+            return best
+        for lag in range(-(len(times) - 2), len(host) - 1):
+            i = np.arange(max(0, lag), min(len(host), len(times) + lag))
+            pairs = _nearest(host, times + np.median(host[i] - times[i - lag]), tolerance)
+            if len(pairs) > len(best):
+                best = pairs
+
+        return best if len(best) >= 2 else np.zeros((0, 2), dtype=int)
+
+    def save_csv(self, filename):
+        # Saves every pulse to "filename".csv, one row per pulse with its
+        # host time as text and in nanoseconds and the timer reading.
+        pulses = self.pulses
+        with open(filename + ".csv", 'w', encoding='UTF8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['host_time', 'host_ns', 'sc', 'ms', 'ticks', 'estimated', 'kind'])
+            for p in pulses:
+                writer.writerow([datetime.datetime.fromtimestamp(p['host_ns'] / 1e9).isoformat(),
+                                 int(p['host_ns']), int(p['sc']), int(p['ms']), int(p['ticks']),
+                                 bool(p['estimated']), 'button' if p['kind'] == BUTTON else 'external_ttl'])
+
+def _nearest(a, b, tolerance):
+    # (index in a, index in b) pairs of the closest values of sorted arrays
+    # "a" and "b" within "tolerance", each index used once.
+    k = np.clip(np.searchsorted(b, a), 1, len(b) - 1)
+    k -= np.abs(a - b[k - 1]) < np.abs(a - b[k])
+    i = np.flatnonzero(np.abs(a - b[k]) <= tolerance)
+    j, first = np.unique(k[i], return_index=True)
+
+    return np.column_stack((i[first], j))
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Heartbeat for a RECORD microcontroller. The watchdog sends 't' (which only
+reports the output TTL level) and expects "t: TTL is ..." back within "bound"
+seconds. A board that answers anything else is waiting in a menu ('$', '%' or
+the '?' prompt) for a key, and is walked out of it by answering every prompt
+with a key that aborts it without changing any setting; a board that answers
+nothing is unresponsive. Either is reported as an event, so a trial script
+finds out with one bounded check during an idle period instead of through a
+timeout on every later command.
+
+A prompt for a number (LED brightness, relay active time, TTL length) cannot
+be aborted once anything was typed into it: atoi reads the digits typed, or 0
+after the ping. Such prompts are escaped before pinging when their text is
+still waiting to be read. A board that only echoes the ping, or has digits
+typed at the prompt, is reported and sent nothing more (see "held") instead
+of committing a value.
+
+    watchdog = Watchdog(mcu, on_event=print)
+    ...
+    watchdog.wait(inter_trial_interval)     # Checks the board while waiting
+"""
+
+import datetime
+import re
+import threading
+import time
+
+from record_lib.config import ConfigSession
+
+# Key that aborts each prompt, found by a phrase in its last lines. The
+# invalid values make the firmware drop the change: CCR values over 8000 and
+# negative relay active times or TTL lengths are rejected.
+_ESCAPES = [(b'[y/n]', b'n'),
+            (b'CCR value is currently', b'\r'),             # '%' adjustment loop
+            (b'new integer CCR value', b'9999'),            # '$' A
+            (b'relay active time in milliseconds', b'-1\r'), # '$' B
+            (b'TTL length in milliseconds', b'-1\r'),       # '$' C
+            (b'level to reconfigure', b'x'),
+            (b'feeder to reconfigure', b'x'),
+            (b'TTL requests are ignored', b'x'),             # '$' D
+            (b'TTL operating mode', b'x'),                   # '$' menu
+            (b'use Enter key to exit', b'\r')]               # '?'
+_NUMBER_KEYS = (b'9999', b'-1\r')
+_PING_REPLY = re.compile(rb't: TTL is (?:HIGH|LOW)\r\n\n')
+_CLOSED = re.compile(rb'(?:^|\n)\s*[$%?]:[^\n]*\r\n\n')
+
+class McuStalledError(Exception):
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+    # Prints the error value
+        return(repr(self.value))
+
+class Watchdog:
+    def __init__(self, mcu, **kwargs):
+        # Arguments:
+        #    - mcu: A RECORD object with an open serial session.
+        #    - bound: Seconds within which the board must answer a ping.
+        #      Default 0.5.
+        #    - interval: Seconds between pings in "wait" and in the
+        #      background thread. Default 1.
+        #    - escape: Walk the board out of menus it is waiting in. Default
+        #      True.
+        #    - max_keys: Most keys sent to get out of a menu. Default 8.
+        #    - on_event: Function called with every event dictionary.
+        self.mcu = mcu
+        self.verbose = kwargs.get('verbose', 0)
+        self.bound = kwargs.get('bound', 0.5)
+        self.interval = kwargs.get('interval', 1)
+        self.escape = kwargs.get('escape', True)
+        self.max_keys = kwargs.get('max_keys', 8)
+        self.on_event = kwargs.get('on_event', None)
+        self.events = []
+        self.held = False       # Left in a number prompt, see check
+        self.last_ok = None     # time.time() of the last answered ping
+        self.latency = None     # Seconds the last answered ping took
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _event(self, event, **details):
+        details.update(time=datetime.datetime.now(), event=event)
+        self.events.append(details)
+        if self.verbose: print("  ", details)
+        if self.on_event is not None:
+            self.on_event(details)
+
+        return details
+
+    def _read(self, session, deadline, quiet=0.03):
+        # Reads until the board has been quiet for "quiet" seconds after
+        # sending something (it is waiting for input) or "deadline" passes.
+        data = bytearray()
+        last = None
+        while time.time() < deadline:
+            waiting = session.in_waiting
+            if waiting:
+                data += session.read(waiting)
+                last = time.time()
+            elif last is not None and time.time() - last > quiet:
+                break
+            else:
+                time.sleep(0.002)
+
+        return bytes(data)
+
+    def _ping(self, session):
+        # Sends 't' and returns what came back within "bound" seconds. A 't'
+        # sent while the board is still busy with an earlier command is
+        # dropped, so it is sent again halfway through.
+        start = time.time()
+        self.mcu._write(b't')
+        reply = self._read(session, start + self.bound / 2)
+        if not reply:
+            self.mcu._write(b't')
+            reply = self._read(session, start + self.bound)
+        match = _PING_REPLY.search(reply)
+        if match:
+            self.latency = time.time() - start
+            self.last_ok = time.time()
+
+        return reply, match
+
+    def _key(self, text):
+        # Key that aborts the prompt "text" ends with, None if there is none.
+        tail = b'\n'.join(text.rstrip(b'\r\n> ').split(b'\n')[-3:])
+        return next((key for phrase, key in _ESCAPES if phrase in tail), None)
+
+    def _keep(self, data, match):
+        # Hands everything received around the ping reply (button presses,
+        # late responses) back to RECORD. The reply itself only updates the
+        # shadow model.
+        self.mcu.state.feed(match.group())
+        self.mcu._frames.feed(data.replace(match.group(), b'', 1))
+
+    def _follow(self, transcript):
+        # Updates the shadow model from the messages closing a menu.
+        for frame in transcript.split(b'\r\n\n'):
+            frame = frame.strip()
+            if frame[:2] in (b'$:', b'%:'):
+                self.mcu.state.feed(frame)
+
+    def check(self, raise_error=False):
+        # Pings the board once, getting it out of a menu if needed. Returns
+        # True if it answers (again), False otherwise, after reporting an
+        # event: 'menu_escaped', 'stuck_in_menu' or 'unresponsive'. With
+        # "raise_error", a McuStalledError carrying the event is raised
+        # instead of returning False.
+        # A board that only echoed the ping is typing it into a number
+        # prompt. It is reported once with "held" set, and nothing is sent
+        # to it until "held" is cleared (after resetting the board, or
+        # finishing the prompt by hand).
+        if self.held:
+            if raise_error:
+                raise McuStalledError(self.events[-1])
+            return False
+        with ConfigSession(self.mcu) as cfg:
+            session = self.mcu.session
+            # Anything already read of a prompt the board is waiting at.
+            pending = bytes(cfg._buffer)
+            cfg._buffer.clear()
+            if session.in_waiting:
+                pending += session.read(session.in_waiting)
+            if self.escape and self._key(pending) is not None:
+                # Before pinging, which a number prompt would take as input.
+                event = self._escape(session, pending)
+                if event['event'] == 'menu_escaped':
+                    return True
+            else:
+                reply, match = self._ping(session)
+                if match:
+                    self._keep(pending + reply, match)
+                    return True
+                transcript = (pending + reply).decode(errors='replace')
+                if not reply:
+                    event = self._event('unresponsive', bound=self.bound, transcript=transcript)
+                elif not reply.strip(b't\r\n'):
+                    self.held = True
+                    event = self._event('stuck_in_menu', transcript=transcript, held=True)
+                elif not self.escape:
+                    event = self._event('stuck_in_menu', transcript=transcript)
+                else:
+                    event = self._escape(session, pending + reply)
+                    if event['event'] == 'menu_escaped':
+                        return True
+        if raise_error:
+            raise McuStalledError(event)
+
+        return False
+
+    def _escape(self, session, transcript):
+        # Answers every prompt until the menu is closed, then pings again.
+        text = transcript
+        keys = []
+        while len(keys) < self.max_keys and not _CLOSED.search(text):
+            key = self._key(text)
+            if key is None:
+                # Still printing the prompt, or not in a menu at all.
+                more = self._read(session, time.time() + self.bound)
+                if not more:
+                    break
+                text += more
+                transcript += more
+                continue
+            if key in _NUMBER_KEYS and text.rstrip(b'\r\n').rpartition(b'>')[2].strip():
+                self.held = True
+                return self._event('stuck_in_menu', keys=keys, held=True,
+                                   transcript=transcript.decode(errors='replace'))
+            self.mcu._write(key)
+            keys.append(key.decode())
+            text = self._read(session, time.time() + self.bound + 1)
+            transcript += text
+        self._follow(transcript)
+        reply, match = self._ping(session)
+        transcript += reply
+        if match:
+            self.mcu.state.feed(match.group())
+            return self._event('menu_escaped', keys=keys, transcript=transcript.decode(errors='replace'))
+
+        return self._event('stuck_in_menu', keys=keys, transcript=transcript.decode(errors='replace'))
+
+    def wait(self, seconds):
+        # Waits "seconds" (e.g. the inter-trial interval), checking the board
+        # every "interval" seconds. Returns True if the board answered every
+        # check, which it does again after a menu was escaped.
+        end = time.time() + seconds
+        healthy = True
+        while True:
+            healthy = self.check() and healthy
+            remaining = end - time.time()
+            if remaining <= 0:
+                break
+            time.sleep(min(self.interval, remaining))
+
+        return healthy
+
+    def start(self):
+        # Checks the board every "interval" seconds from a background thread.
+        # Checks are skipped while another thread is sending commands.
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="RECORD-watchdog")
+        self._thread.start()
+
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.mcu._cmd_lock.acquire(blocking=False):
+                continue
+            try:
+                self.check()
+            except Exception as e:
+                self._event('error', error=str(e))
+            finally:
+                self.mcu._cmd_lock.release()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
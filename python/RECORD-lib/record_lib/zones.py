@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+RECORD-lib
+
+Live reading of the zone status CSV written by the Bonsai rat tracking
+workflow (bonsai_workflows/Live_rat_tracking__v1_2.bonsai), with columns
+PositionX, PositionY, Orientation, IsInGRID, IsInHORI, IsInRADI, IsInDIAG and
+Timestamp. Bonsai appends about 30 rows per second during a session.
+ZoneTracker remembers how far it has read the file and only parses the rows
+appended since, so asking for the rat's current zone costs the same at any
+point of the session: a stat of the file when nothing was written, and the
+new rows otherwise.
+
+    zones = ZoneTracker("Session Data/Bonsai_zone_status.csv")
+    if zones.current('diag'):
+        ...
+
+Archived files are loaded for analysis with load_occupancy. It reads only the
+four ROI columns, straight from the file's bytes, and keeps them as bits, so
+the occupancy of an hour-long recording (about 100k rows) takes 50 kB. The
+result is cached next to the CSV and memory-mapped on the next load.
+
+    occupancy = load_occupancy("Bonsai_zone_status.csv")
+    occupancy['diag']           # Boolean array, one entry per row
+    occupancy.fraction()        # Fraction of rows in each ROI
+"""
+
+import csv
+import os
+
+import numpy as np
+
+# ROI columns, by the ROI numbers TRIALS.zone_status takes.
+ROIS = {1: 'IsInDIAG', 2: 'IsInGRID', 3: 'IsInHORI', 4: 'IsInRADI'}
+_TRUE = ('true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh')
+
+class ZoneTracker:
+    def __init__(self, filepath, **kwargs):
+        # Arguments:
+        #    - filepath: Path to the Bonsai tracking CSV. It does not need to
+        #      exist yet.
+        #    - history: Keep the status of every row, for "rows_of". With
+        #      False, only the latest row is parsed on every update.
+        #      Default True.
+        self.filepath = filepath
+        self.keep_history = kwargs.get('history', True)
+        self.reset()
+
+    def reset(self):
+        # Forgets everything read, e.g. when Bonsai starts the file again.
+        self._offset = 0
+        self._partial = b''
+        self.header = None
+        self.rows = 0
+        self.last = None        # Column -> text of the latest row
+        self.history = {column: [] for column in ROIS.values()}
+
+    def update(self):
+        # Reads the rows appended since the last update. Returns the number
+        # of new rows.
+        try:
+            size = os.stat(self.filepath).st_size
+        except OSError:
+            return 0
+        if size < self._offset:
+            # Overwritten by a new recording.
+            self.reset()
+        if size == self._offset:
+            return 0
+        with open(self.filepath, 'rb') as file:
+            file.seek(self._offset)
+            data = self._partial + file.read(size - self._offset)
+        self._offset = size
+        # A row is only read once its line is complete.
+        lines = data.split(b'\n')
+        self._partial = lines.pop()
+        lines = [line for line in lines if line.strip()]
+        if self.header is None and lines:
+            self.header = next(csv.reader([lines.pop(0).decode('utf-8-sig')]))
+        if not lines:
+            return 0
+        if self.keep_history:
+            rows = list(csv.DictReader([line.decode() for line in lines], fieldnames=self.header))
+            for column, values in self.history.items():
+                if column in self.header:
+                    values.extend(str(row[column]).strip().lower() in _TRUE for row in rows)
+            self.last = rows[-1]
+        else:
+            self.last = next(csv.DictReader([lines[-1].decode()], fieldnames=self.header))
+        self.rows += len(lines)
+
+        return len(lines)
+
+    def current(self, roi='all'):
+        # Whether the rat is in "roi" (a column such as 'IsInDIAG', a name
+        # such as 'diag', or a ROI number) in the latest row, after reading
+        # any new rows. With 'all', a list for [DIAG, GRID, HORI, RADI].
+        # None before the first row.
+        self.update()
+        if self.last is None:
+            return None
+        if roi == 'all':
+            return [self._is_in(column) for column in ROIS.values()]
+
+        return self._is_in(_column(roi))
+
+    def rows_of(self, roi='all'):
+        # Status of every row read so far, as a new list (or a list of four
+        # for 'all'). Needs "history".
+        self.update()
+        if roi == 'all':
+            return [list(values) for values in self.history.values()]
+
+        return list(self.history[_column(roi)])
+
+    def _is_in(self, column):
+        return str(self.last[column]).strip().lower() in _TRUE
+
+def _column(roi):
+    # Column of a ROI given as a number, a name such as 'diag' or a column.
+    if roi in ROIS:
+        return ROIS[roi]
+    for column in ROIS.values():
+        if str(roi).lower() in (column.lower(), column[4:].lower()):
+            return column
+    raise KeyError(roi)
+
+class Occupancy:
+    def __init__(self, bits, rows):
+        # Arguments:
+        #    - bits: Packed bits (np.packbits) of every row, shape (4, bytes),
+        #      one row per ROI in the order of ROIS.
+        #    - rows: Number of rows of the CSV.
+        self.bits = bits
+        self.rows = rows
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, roi):
+        # Whether the rat is in "roi" (a column, a name such as 'diag' or a
+        # ROI number) in every row, as a boolean array.
+        return np.unpackbits(self.packed(roi), count=self.rows).view(bool)
+
+    def packed(self, roi):
+        return self.bits[list(ROIS.values()).index(_column(roi))]
+
+    def counts(self):
+        # Rows in each ROI, in the order of ROIS.
+        return _POPCOUNT[self.bits].sum(axis=1)
+
+    def fraction(self):
+        # Fraction of rows in each ROI, in the order of ROIS.
+        return self.counts() / max(self.rows, 1)
+
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+def load_occupancy(filepath, **kwargs):
+    # Loads the ROI columns of a Bonsai tracking CSV as an Occupancy.
+    # Arguments:
+    #    - cache: Save the result to filepath + ".zones.npy" (when the
+    #      folder is writable) and load it from there while the CSV is
+    #      unchanged. Default True.
+    #    - mmap: Memory-map the cached result instead of reading it.
+    #      Default True.
+    cache = filepath + ".zones.npy" if kwargs.get('cache', True) else None
+    mmap = kwargs.get('mmap', True)
+    size = os.stat(filepath).st_size
+    if cache is not None and os.path.exists(cache) and os.stat(cache).st_mtime >= os.stat(filepath).st_mtime:
+        stored = np.load(cache, mmap_mode='r' if mmap else None)
+        if stored['size'][0] == size:
+            return Occupancy(stored['bits'][0], int(stored['rows'][0]))
+
+    bits, rows = _read_bits(filepath)
+    if cache is not None:
+        stored = np.zeros(1, dtype=[('rows', '<i8'), ('size', '<i8'), ('bits', 'u1', bits.shape)])
+        stored['rows'], stored['size'], stored['bits'] = rows, size, bits
+        try:
+            np.save(cache, stored)
+        except OSError:
+            # E.g. a read-only share or a full disk: the result is simply not
+            # cached, and a partly written file is not left behind.
+            if os.path.exists(cache):
+                try:
+                    os.remove(cache)
+                except OSError:
+                    pass
+
+    return Occupancy(bits, rows)
+
+def _read_bits(filepath):
+    # Packed ROI bits and number of rows of a Bonsai tracking CSV. Every
+    # row's fields are found from the positions of its commas, and a field is
+    # true when it starts with 't', 'y' or '1' (True, yes, 1). Rows without
+    # the header's number of fields (quoted commas) are read with csv.
+    buf = np.fromfile(filepath, dtype=np.uint8)
+    first = np.flatnonzero(buf == 10)
+    end = first[0] if len(first) else len(buf)
+    header = next(csv.reader([buf[:end].tobytes().decode('utf-8-sig').strip()]))
+    ends = np.r_[first[1:], len(buf)] if len(first) else np.zeros(0, dtype=np.int64)
+    starts = first + 1 if len(first) else np.zeros(0, dtype=np.int64)
+    # Without blank lines (the "\r\n" of the last row, or a final "\n").
+    keep = (ends - starts) > 1
+    starts, ends = starts[keep], ends[keep]
+    rows = len(starts)
+
+    commas = np.flatnonzero(buf == 44)
+    before = np.searchsorted(commas, starts)
+    regular = (np.searchsorted(commas, ends) - before == len(header) - 1).all()
+    status = np.zeros((len(ROIS), rows), dtype=bool)
+    for i, column in enumerate(ROIS.values()):
+        if column not in header:
+            continue
+        k = header.index(column)
+        if regular:
+            at = starts if k == 0 else commas[before + k - 1] + 1
+            c = buf[np.minimum(at, len(buf) - 1)] | 0x20
+            status[i] = (c == ord('t')) | (c == ord('y')) | (c == ord('1'))
+        else:
+            lines = buf[starts[0]:].tobytes().decode().splitlines() if rows else []
+            values = [row[k] for row in csv.reader(line for line in lines if line.strip())]
+            status[i] = [str(value).strip().lower() in _TRUE for value in values]
+
+    return np.packbits(status, axis=1), rows
@@ -242,6 +242,9 @@ MCU = RECORD()
 print("\nOpening serial port. Interrupt execution of all trials with keyboard interrupt (Ctrl + C)")
 session = MCU.createSS(com_port=mcu_com_port)
 session.open()      # Open the serial interface
+# Read the microcontroller's responses in the background so that the "_ack"
+# timestamps are taken when each response arrives, not when we fetch it.
+MCU.start_reader()
 
 # Timestamp when the session starts. We'll use this later.
 session_start = timezone.localize(datetime.datetime.now())
@@ -312,7 +315,9 @@ try:
         this_trial.update({"extsys_on_ack" : timezone.localize(ts).strftime("%Y-%m-%dT%H:%M:%S.%f%z")})
         # (Optional) Display the microcontroller's response in the console.
         print("  ", resp)
-        TTL_ON, _ = MCU.request_ttl_state()
+        # The level follows from the response just fetched, so the
+        # microcontroller is only asked while it is still unknown.
+        TTL_ON, _ = MCU.request_ttl_state(max_age=None)
         
         mytrials.wait(1)
         
@@ -320,41 +325,20 @@ try:
         trial_start = timezone.localize(datetime.datetime.now())
         this_trial.update({"trial_start": trial_start.strftime("%Y-%m-%dT%H:%M:%S.%f%z")})
         
-        ## Start microcontroller's internal trial timer
-        print("\nStarting MCU timer...")
-        status, ts = MCU.timer_start(enforce_delay=True)
-       
-        if status == 0: # Check if communication with MCU returned no problems.
-            this_trial.update({"mcu_timer_start": timezone.localize(ts).strftime("%Y-%m-%dT%H:%M:%S.%f%z")})
-        resp, ts = MCU.fetch_response()
-        this_trial.update({"mcu_timer_start_resp": resp})
-        this_trial.update({"mcu_timer_start_ack" : timezone.localize(ts).strftime("%Y-%m-%dT%H:%M:%S.%f%z")})
-        # (Optional) Display the microcontroller's response in the console.
-        print("  ", resp)
-        
-        # Perform first reset
-        print("\nPerforming first reset before starting next trial...")
-        status, ts = MCU.all_inactive(enforce_delay=False)
-       
-        if status == 0: # Check if communication with MCU returned no problems.
-            this_trial.update({"first_reset": timezone.localize(ts).strftime("%Y-%m-%dT%H:%M:%S.%f%z")})
-        resp, ts = MCU.fetch_response()
-        this_trial.update({"first_reset_resp": resp})
-        this_trial.update({"first_reset_ack" : timezone.localize(ts).strftime("%Y-%m-%dT%H:%M:%S.%f%z")})
-        # (Optional) Display the microcontroller's response in the console.
-        print("  ", resp)
+        ## Start microcontroller's internal trial timer, perform the first
+        ## reset and indicate the start of the trial. The three commands are
+        ## sent back to back, each one as soon as the previous one has been
+        ## acknowledged, and every response is matched to its command.
+        print("\nStarting MCU timer, performing first reset and turning indicator on to indicate ongoing trial...")
+        trial_start_events = ["mcu_timer_start", "first_reset", "trial_start_cue"]
+        responses = MCU.pipeline(['Q', 'R', 'K'])
         
-        ## Indicate start of trial
-        print("\nTurning indicator on to indicate ongoing trial...")
-        status, ts = MCU.indicator_toggle(enforce_delay=False)
-       
-        if status == 0: # Check if communication with MCU returned no problems.
-            this_trial.update({"trial_start_cue": timezone.localize(ts).strftime("%Y-%m-%dT%H:%M:%S.%f%z")})
-        resp, ts = MCU.fetch_response(timeout=2)
-        this_trial.update({"trial_start_cue_resp": resp})
-        this_trial.update({"trial_start_cue_ack" : timezone.localize(ts).strftime("%Y-%m-%dT%H:%M:%S.%f%z")})
-        # (Optional) Display the microcontroller's response in the console.
-        print("  ", resp)
+        for event, (resp, ts, ack) in zip(trial_start_events, responses):
+            this_trial.update({event: timezone.localize(ts).strftime("%Y-%m-%dT%H:%M:%S.%f%z")})
+            this_trial.update({event+"_resp": resp})
+            this_trial.update({event+"_ack" : timezone.localize(ack).strftime("%Y-%m-%dT%H:%M:%S.%f%z")})
+            # (Optional) Display the microcontroller's response in the console.
+            print("  ", resp)
         
         # Play trial tone
         print("\n♪♪ Playing trial start tone ♪♪")
@@ -457,7 +441,9 @@ try:
         this_trial.update({"extsys_off_ack" : timezone.localize(ts).strftime("%Y-%m-%dT%H:%M:%S.%f%z")})
         # (Optional) Display the microcontroller's response in the console.
         print("  ", resp)
-        TTL_ON, _ = MCU.request_ttl_state()
+        # The level follows from the response just fetched, so the
+        # microcontroller is only asked while it is still unknown.
+        TTL_ON, _ = MCU.request_ttl_state(max_age=None)
         
         # Save the rest of the trail data into structure
         trial_elapsed = trial_end - trial_start
@@ -478,6 +464,9 @@ except KeyboardInterrupt:
     # If the user enters a keyboard interrupt, i.e. Ctrl+C, you have to do
     # some cleanup if you started a serial session.
     print("\n\n[KeyboardInterrupt detected!]")
+    # Turn everything off first, ahead of any command still waiting to be
+    # sent, before taking the time to export the data.
+    MCU.safe_state()
     print("\nAttempting to export session data...")
 
 except Exception as e:
@@ -588,6 +577,7 @@ finally:
     
     # Make sure serial session is closed
     print("\nClosing serial session and exiting...")
+    MCU.stop_reader()
     session.close()
     print("\n\nClosing Spyder is no longer required, but make sure to stop Bonsai!")
     sys.exit()
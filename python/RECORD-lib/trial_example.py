@@ -11,6 +11,7 @@ multi-level decision-making task", a.k.a. "Phase 2" or "P2" task.
 ## A "phase 2" trial example:
     
 from record_lib import RECORD
+from record_lib import Watchdog
 import time
 
 # For timing Wall time of this script.
@@ -27,7 +28,11 @@ session.open()      # Open the serial interface
 ## Inter-trial interval
 print("Starting trial with inter-trial interval of 5 seconds...\r\n")
 MCU.all_inactive()  # Reset the microcontroller to its idle state, just in case.
-time.sleep(5)
+# Check the microcontroller is still answering (and not left in a menu) while
+# waiting, instead of finding out through timeouts during the trial.
+watchdog = Watchdog(MCU, on_event=print)
+if not watchdog.wait(5):
+    print("[Error]: The microcontroller did not answer, check the connection before continuing.")
 
 ## Start trial timer
 MCU.timer_start()